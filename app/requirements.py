@@ -1 +1,2 @@
-discord.py>=2.0.0 
\ No newline at end of file
+discord.py>=2.0.0
+tzdata
@@ -0,0 +1,82 @@
+"""バースト的なタスク指示の書き込みベンチマーク
+
+多数のサーバーから複数担当者宛てのタスク指示が同時に届く状況を再現し、
+DatabaseManager.create_task_if_not_duplicate で作成したタスクの行数/秒と指示ごとの所要時間を、
+呼び出しごとにコミットする場合とグループコミット（db.write）の場合で比較する。
+
+使い方: python -m bench.bench_burst [--guilds 50] [--assignees 10] [--bursts 20] [--gap 0.05]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+import mybot
+
+
+async def prepare(path: str, grouped: bool) -> mybot.Database:
+    """WALを有効にしたマイグレーション済みのデータベースを作成"""
+    database = mybot.Database(path)
+    if not grouped:
+        database.write = database.run_in_transaction  # 1呼び出し = 1コミット
+    mybot.db = database
+    await database.run_in_transaction(mybot._configure_database)
+    await mybot.run_migrations()
+    await mybot.build_task_indexes()
+    return database
+
+
+async def run(guilds: int, assignees: int, bursts: int, gap: float) -> tuple:
+    """bursts回、全サーバーから同時に指示を送り、(行数/秒, 指示ごとの所要時間のリスト) を返す"""
+    due_date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    latencies = []
+
+    async def instruction(burst: int, guild_id: int):
+        # 1つの指示メッセージで担当者ごとにタスクを作成（handle_task_instructionと同じく並行に待つ）
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            mybot.DatabaseManager.create_task_if_not_duplicate(
+                guild_id, 1, assignee_id, f"task {burst}", due_date, burst, 1
+            )
+            for assignee_id in range(assignees)
+        ))
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    pending = []
+    for burst in range(bursts):
+        pending.extend(asyncio.create_task(instruction(burst, guild_id)) for guild_id in range(guilds))
+        await asyncio.sleep(gap)
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+    return guilds * assignees * bursts / elapsed, latencies
+
+
+async def main(guilds: int, assignees: int, bursts: int, gap: float):
+    print(f"{bursts} bursts x {guilds} guilds x {assignees} assignees, {gap * 1000:.0f} ms between bursts")
+    for grouped in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            database = await prepare(os.path.join(directory, 'bench.db'), grouped)
+            try:
+                rate, latencies = await run(guilds, assignees, bursts, gap)
+                commits = database.write_stats() if grouped else "commit per call"
+            finally:
+                database.close()
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        mode = "group commit   " if grouped else "commit per call"
+        print(f"{mode} | {rate:8.0f} rows/s | p50 {p50:7.1f} ms | p95 {p95:7.1f} ms | {commits}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=50)
+    parser.add_argument('--assignees', type=int, default=10)
+    parser.add_argument('--bursts', type=int, default=20)
+    parser.add_argument('--gap', type=float, default=0.05, help="バースト間の秒数")
+    args = parser.parse_args()
+    asyncio.run(main(args.guilds, args.assignees, args.bursts, args.gap))
@@ -0,0 +1,89 @@
+"""タスク検索の応答時間ベンチマーク
+
+大量のタスクを登録した一時データベースで search_tasks を実行し、検索語の長さごと
+（2文字・3文字以上・組み合わせ）の所要時間を測る。
+
+使い方: python -m bench.bench_search [--rows 1000000] [--guilds 100] [--repeat 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import mybot
+
+WORDS = [
+    '会議', '資料', '作成', '準備', '報告', '確認', '提出', 'レビュー', '週次', '月次',
+    '予算', '契約書', '議事録', 'デザイン', 'テスト', '見積', '請求書', '面談', '採用', '研修',
+]
+
+SEARCHES = [
+    ('2文字', ['資料']),
+    ('2文字 該当なし', ['存在']),
+    ('2文字 x2', ['会議', '資料']),
+    ('3文字以上', ['議事録']),
+    ('3文字以上 該当なし', ['存在しない']),
+    ('長い語', ['契約書議事録']),
+    ('3文字以上 + 2文字', ['レビュー', '資料']),
+    ('2文字 + 状態', ['資料'], {'status': 'accepted'}),
+]
+
+
+def populate(conn, rows: int, guilds: int):
+    """ランダムなタスク名のタスクをrows件登録（task_bigramsも_insert_taskと同じく同時に更新する）"""
+    rng = random.Random(0)
+    now_ts = int(time.time())
+    statuses = ('pending', 'accepted', 'completed')
+    batch = []
+    for i in range(rows):
+        name = ''.join(rng.sample(WORDS, rng.randint(2, 3))) + f"#{i}"
+        due_ts = now_ts + rng.randint(-30, 90) * 86400
+        batch.append((i + 1, i % guilds, 1, rng.randint(1, 200), name, rng.choice(statuses), due_ts, now_ts, now_ts))
+        if len(batch) == 10000 or i == rows - 1:
+            conn.executemany(
+                "INSERT INTO tasks (id, guild_id, instructor_id, assignee_id, task_name, status, due_ts, created_ts, updated_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch
+            )
+            mybot.insert_task_bigrams(conn, [(row[1], row[0], row[4]) for row in batch])
+            batch.clear()
+    conn.execute("ANALYZE")
+
+
+async def main(rows: int, guilds: int, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        database = mybot.Database(os.path.join(directory, 'bench.db'))
+        mybot.db = database
+        try:
+            await database.run_in_transaction(mybot._configure_database)
+            await mybot.run_migrations()
+            await mybot.build_task_indexes()
+            await mybot.run_backfills()  # 空のテーブルで完了させる（以降はpopulateで同時に更新）
+            started = time.perf_counter()
+            await database.run_in_transaction(populate, rows, guilds)
+            print(f"{rows} tasks in {guilds} guilds (populated in {time.perf_counter() - started:.0f}s)")
+            
+            for label, keywords, *filters in SEARCHES:
+                timings = []
+                found = 0
+                for i in range(repeat):
+                    started = time.perf_counter()
+                    result = await mybot.search_tasks(i % guilds, keywords, **(filters[0] if filters else {}))
+                    timings.append((time.perf_counter() - started) * 1000)
+                    found += len(result)
+                timings.sort()
+                print(f"{label:<16} {' '.join(keywords):<12} | p50 {statistics.median(timings):6.1f} ms | "
+                      f"max {timings[-1]:6.1f} ms | {found / repeat:.0f} rows/query")
+        finally:
+            database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--guilds', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.guilds, args.repeat))
@@ -0,0 +1,77 @@
+"""書き込みスループットのベンチマーク
+
+一時データベースに対して、1件のタスク追加と1件の一覧読み取りからなる操作を同時に実行し、
+以下の組み合わせで操作数/秒を比較する。
+
+- ジャーナル設定: 既定（ロールバックジャーナル・PRAGMA未調整）/ WAL + DB_CONNECTION_PRAGMAS
+- 書き込み方法: 呼び出しごとにコミット（run_in_transaction）/ グループコミット（db.write）
+
+使い方: python -m bench.bench_writes [--operations 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+
+import mybot
+
+TUNED_PRAGMAS = mybot.DB_CONNECTION_PRAGMAS
+BASELINE_PRAGMAS = [('busy_timeout', 30000)]
+
+
+async def prepare(path: str, tuned: bool) -> mybot.Database:
+    """マイグレーション済みのデータベースを作成（tunedならWALと本番向けPRAGMAを適用）"""
+    mybot.DB_CONNECTION_PRAGMAS = TUNED_PRAGMAS if tuned else BASELINE_PRAGMAS
+    database = mybot.Database(path)
+    mybot.db = database
+    if tuned:
+        await database.run_in_transaction(mybot._configure_database)
+    await mybot.run_migrations()
+    await mybot.build_task_indexes()
+    return database
+
+
+async def run(database: mybot.Database, operations: int, concurrency: int, grouped: bool) -> float:
+    """operations件の操作をconcurrency並列で実行し、1秒あたりの操作数を返す"""
+    due_date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    page_query = mybot.SQL_TASK_PAGES[('tasks', 'guild', 'next')]
+    write = database.write if grouped else database.run_in_transaction
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def interaction(i: int):
+        guild_id = i % 20
+        async with semaphore:
+            await write(
+                mybot.DatabaseManager._insert_task, guild_id, 1, i, f"task {i}", due_date, i, 1
+            )
+            await database.fetch(page_query, (guild_id, 0, 0, 10))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(interaction(i) for i in range(operations)))
+    return operations / (time.perf_counter() - started)
+
+
+async def main(operations: int, concurrency: int):
+    print(f"{operations} interactions, concurrency {concurrency}")
+    for tuned in (False, True):
+        for grouped in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                database = await prepare(os.path.join(directory, 'bench.db'), tuned)
+                try:
+                    rate = await run(database, operations, concurrency, grouped)
+                    commits = database.write_stats() if grouped else "commit per call"
+                finally:
+                    database.close()
+            journal = "WAL + tuned pragmas" if tuned else "rollback journal   "
+            mode = "group commit   " if grouped else "commit per call"
+            print(f"{journal} | {mode} | {rate:8.0f} ops/s | {commits}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--operations', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.operations, args.concurrency))
@@ -4,10 +4,19 @@ import sqlite3
 import asyncio
 import datetime
 import re
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, NamedTuple
 import json
 import logging
 import os
+import threading
+import time
+import heapq
+import contextlib
+import contextvars
+import random
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
 
 # ログ設定
 logging.basicConfig(
@@ -26,6 +35,25 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
+# RouteRateLimiter.call中のAPI呼び出しが使うトークンバケット（成功レスポンスのレート制限ヘッダーの反映先）
+current_rate_limit_bucket = contextvars.ContextVar('current_rate_limit_bucket', default=None)
+
+async def _on_request_end(session, context, params):
+    """X-RateLimit-Remaining / X-RateLimit-Reset-After を呼び出し元のバケットに反映し、429になる前に待機させる"""
+    bucket = current_rate_limit_bucket.get()
+    if bucket is None:
+        return
+    headers = params.response.headers
+    try:
+        remaining = int(headers['X-RateLimit-Remaining'])
+        reset_after = float(headers['X-RateLimit-Reset-After'])
+    except (KeyError, TypeError, ValueError):
+        return
+    bucket.limit(remaining, reset_after)
+
+rate_limit_trace = aiohttp.TraceConfig()
+rate_limit_trace.on_request_end.append(_on_request_end)
+
 # 24時間稼働のための最適化設定
 bot = commands.Bot(
     command_prefix='!', 
@@ -36,14 +64,112 @@ bot = commands.Bot(
     enable_debug_events=False,  # デバッグイベントを無効化
     activity=discord.Activity(type=discord.ActivityType.watching, name="タスク管理"),  # アクティビティ表示
     heartbeat_timeout=60.0,  # ハートビートタイムアウトを延長
-    max_ratelimit_timeout=300.0  # レート制限タイムアウトを延長
+    max_ratelimit_timeout=300.0,  # レート制限タイムアウトを延長
+    http_trace=rate_limit_trace  # レスポンスのレート制限ヘッダーをRouteRateLimiterに反映
 )
 
 # 重複実行防止用のセット
 executing_commands = set()
 
-# リマインダー送信済みタスクを記録するセット（メモリ内）
-reminded_tasks = set()
+# 結果を待たずに実行中のタスク（イベントループは弱参照しか持たないため、完了まで参照を保持する）
+background_tasks = set()
+
+def spawn_background(coro) -> asyncio.Task:
+    """コルーチンをバックグラウンドで実行（例外はログに記録）"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+def _background_task_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_coro().__qualname__} failed: {task.exception()}")
+
+# 起動後に実行するバックフィルのタスク
+backfill_task = None
+
+# リマインダースケジューラを起動済みか（on_readyは再接続時にも呼ばれる）
+reminder_scheduler_started = False
+
+# 終了済み（完了・辞退・問題発生）タスクをアーカイブするまでの日数
+TASK_ARCHIVE_AFTER_DAYS = int(os.getenv("TASK_ARCHIVE_AFTER_DAYS", "30"))
+TASK_ARCHIVE_BATCH_SIZE = 200
+TASK_ARCHIVE_PAUSE_SECONDS = 0.5
+
+# サーバーにタイムゾーンが設定されていない場合に使うタイムゾーン（IANA名）
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Tokyo")
+
+# リマインダー（期日の何秒前に通知するか。サーバー・タスクごとに変更可能）
+REMINDER_DEFAULT_OFFSETS = (3600,)
+REMINDER_MAX_OFFSETS = 5
+REMINDER_MAX_OFFSET_SECONDS = 30 * 86400
+# スケジューラのヒープに読み込む範囲（これより先のジョブはDBのインデックスから順次読み込む）
+REMINDER_HORIZON_SECONDS = 6 * 3600
+# 停止中に送信時刻を過ぎたリマインダーの扱い: late（遅れて送信）/ digest（担当者ごとにまとめて送信）/ drop（送信しない）
+REMINDER_CATCHUP_POLICY = os.getenv("REMINDER_CATCHUP_POLICY", "late")
+REMINDER_CATCHUP_MAX_AGE_SECONDS = 24 * 3600  # これより前に送信予定だったものは送らない
+REMINDER_CATCHUP_BATCH_SIZE = 50
+REMINDER_CATCHUP_PAUSE_SECONDS = 1.0
+
+# リマインダーのスヌーズ（カスタムID -> (ボタン表示, 秒数。Noneは翌朝)）
+SNOOZE_ACTIONS = {
+    'snooze_15m': ("15分後", 15 * 60),
+    'snooze_1h': ("1時間後", 3600),
+    'snooze_morning': ("明日の朝", None),
+}
+SNOOZE_MORNING_HOUR = 9
+
+# まとめ通知: 同じ担当者のリマインダーを集めて1通で送る（サーバー・ユーザーごとに設定）
+REMINDER_DIGEST_DEFAULT = False
+REMINDER_DIGEST_WAIT_SECONDS = 60  # 最初のリマインダーから送信までに待つ時間
+REMINDER_DIGEST_LOOKAHEAD_SECONDS = 300  # この時間内に送信予定のリマインダーも前倒しでまとめる
+REMINDER_DIGEST_PAGE_SIZE = 10
+
+# 期限超過のエスカレーション: 期日から何時間後に 担当者 → 指示者 → タスク管理チャンネル へ通知するか（空で無効）
+ESCALATION_RECIPIENTS = ('assignee', 'instructor', 'channel')
+OVERDUE_ESCALATION_DELAYS = [
+    int(float(hours) * 3600)
+    for hours in os.getenv("OVERDUE_ESCALATION_HOURS", "0,24,72").split(',') if hours.strip()
+][:len(ESCALATION_RECIPIENTS)]
+ESCALATION_BATCH_SIZE = 200
+ESCALATION_MAX_LINES = 20  # 1通に載せるタスク数
+# 未終了（エスカレーション対象）のステータス
+OPEN_TASK_STATUSES = ('pending', 'accepted')
+
+# 繰り返しタスク（次回分のみtasksに作成し、完了または期日経過時に次を作成）
+RECURRENCE_BATCH_SIZE = 100
+RECURRENCE_MAX_INTERVAL = 12
+
+# 通知アウトボックス（失敗時は指数バックオフで再送し、上限に達したらdeadとして残す）
+OUTBOX_WORKERS = 4
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_BACKOFF_BASE_SECONDS = 5
+OUTBOX_BACKOFF_MAX_SECONDS = 3600
+OUTBOX_LEASE_SECONDS = 300  # 配送中の通知を他のワーカーが取らないようにする時間（クラッシュ時はこの後に再送）
+OUTBOX_LEASE_RENEW_SECONDS = 100  # 配送中の通知のリースを延長する間隔
+OUTBOX_IDLE_SECONDS = 60
+
+# 通知のAPI呼び出し（チャンネル作成・送信・スレッド作成）をサーバーごとに毎秒RATE件、最大BURST件まで連続
+NOTIFICATION_API_RATE = 5.0
+NOTIFICATION_API_BURST = 10
+
+# 状態変更の通知先（サーバーごとに !設定 通知先 で変更。未設定なら既定値）
+NOTIFICATION_TARGETS = {
+    'management': 'タスク管理',
+    'personal': '個人チャンネル',
+    'dm': 'DM',
+}
+DEFAULT_NOTIFICATION_TARGETS = ('management', 'personal', 'dm')
+STATUS_HISTORY_LINES = 10  # 状態メッセージに残す履歴の行数
+
+# タスク指示への返信を配送結果で更新するまで待つ最大秒数
+INSTRUCTION_DELIVERY_TIMEOUT_SECONDS = 120
+
+# スレッドへのメンバー招待（サーバーごとに毎秒RATE件、最大BURST件まで連続）
+THREAD_INVITE_RATE = 5.0
+THREAD_INVITE_BURST = 5
 
 # メモリ管理用の定期的なクリーンアップ
 @tasks.loop(hours=1)
@@ -54,16 +180,206 @@ async def cleanup_memory():
         if hasattr(bot, '_connection') and hasattr(bot._connection, '_messages'):
             bot._connection._messages.clear()
         
-        # リマインダータスクセットをクリア
-        reminded_tasks.clear()
-        
         logger.info("Memory cleanup completed")
     except Exception as e:
         logger.error(f"Memory cleanup error: {e}")
 
-# データベース初期化
-def init_database():
-    conn = sqlite3.connect('reminder_bot.db')
+# データベース設定
+DB_PATH = 'reminder_bot.db'
+DB_READER_THREADS = 4
+DB_STATEMENT_CACHE_SIZE = 256  # 接続ごとに保持するプリペアドステートメント数
+
+# 接続ごとに適用するPRAGMA（本番向けチューニング）
+DB_CONNECTION_PRAGMAS = [
+    ('synchronous', 'NORMAL'),   # WALモードではNORMALでもコミット済みデータは破損しない
+    ('cache_size', -16000),      # ページキャッシュ約16MB
+    ('mmap_size', 268435456),    # 256MBまでメモリマップI/Oで読み取り
+    ('temp_store', 'MEMORY'),    # ソート・一時テーブルをメモリ上で処理
+    ('busy_timeout', 30000),
+]
+
+# グループコミット（短時間に集まった書き込みを1トランザクションでコミット）
+# 待ち時間0はイベントループを1回譲るだけで、前のコミット中に溜まった書き込みをまとめる
+# （WAL + synchronous=NORMALではコミットが軽く、固定の待ち時間はそのまま遅延になるため）
+WRITE_BATCH_WINDOW = 0.0  # 最初の書き込みから待つ時間（秒）
+WRITE_BATCH_MAX_OPS = 64    # 1トランザクションにまとめる最大件数
+
+# データベース接続プール
+class Database:
+    """イベントループ外の専用スレッドで動作する永続的なSQLite接続プール"""
+
+    def __init__(self, path: str, reader_threads: int = DB_READER_THREADS):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # 書き込みは単一スレッドに直列化し、読み取りは複数スレッドで並行実行
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=reader_threads, thread_name_prefix='db-reader')
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._batch_writer_task: Optional[asyncio.Task] = None
+        self.write_ops = 0
+        self.write_commits = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """スレッドごとに保持している接続を取得（初回のみ接続）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False,
+                cached_statements=DB_STATEMENT_CACHE_SIZE
+            )
+            for name, value in DB_CONNECTION_PRAGMAS:
+                conn.execute(f"PRAGMA {name} = {value}")
+            with self._connections_lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def _fetch(self, query: str, params: tuple = None):
+        # SELECTは暗黙のトランザクションを開始しないためコミット不要
+        cursor = self._connection().execute(query, params or ())
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _transaction(self, func, *args):
+        conn = self._connection()
+        try:
+            result = func(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def _apply_batch(conn: sqlite3.Connection, operations: list) -> list:
+        """複数の書き込みを1トランザクションで実行（失敗した操作のみセーブポイントで取り消す）"""
+        conn.execute("BEGIN")
+        results = []
+        for func, args in operations:
+            conn.execute("SAVEPOINT batch_op")
+            try:
+                results.append((True, func(conn, *args)))
+            except Exception as e:
+                conn.execute("ROLLBACK TO batch_op")
+                results.append((False, e))
+            conn.execute("RELEASE batch_op")
+        return results
+
+    @staticmethod
+    def _execute(conn: sqlite3.Connection, query: str, params: tuple = None):
+        cursor = conn.execute(query, params or ())
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    async def fetch(self, query: str, params: tuple = None):
+        """読み取り専用クエリを読み取りスレッドで実行"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._fetch, query, params)
+
+    async def execute(self, query: str, params: tuple = None):
+        """書き込みクエリをグループコミットで実行"""
+        return await self.write(self._execute, query, params)
+
+    async def write(self, func, *args):
+        """func(conn, *args) をグループコミットのキューに追加し、コミット後に結果を返す"""
+        if self._batch_writer_task is None or self._batch_writer_task.done():
+            self._write_queue = asyncio.Queue()
+            self._batch_writer_task = asyncio.create_task(self._batch_writer())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((func, args, future))
+        return await future
+
+    async def _batch_writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._write_queue.get()]
+            # 後続の書き込みが集まるまで少しだけ待つ
+            if self._write_queue.qsize() < WRITE_BATCH_MAX_OPS - 1:
+                await asyncio.sleep(WRITE_BATCH_WINDOW)
+            while len(batch) < WRITE_BATCH_MAX_OPS and not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+            
+            operations = [(func, args) for func, args, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self._writer, self._transaction, self._apply_batch, operations
+                )
+            except Exception as e:
+                # コミット自体に失敗した場合はすべての呼び出し元に通知
+                results = [(False, e)] * len(batch)
+            else:
+                self.write_commits += 1
+                self.write_ops += len(batch)
+            
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue  # 呼び出し元がキャンセル済み
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def write_stats(self) -> str:
+        average = (self.write_ops / self.write_commits) if self.write_commits else 0.0
+        return f"ops={self.write_ops} commits={self.write_commits} avg_batch={average:.1f}"
+
+    async def run_in_transaction(self, func, *args):
+        """func(conn, *args) を書き込みスレッド上の1トランザクションで実行"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._transaction, func, *args)
+
+    def close(self):
+        """実行中のクエリを待ってから全接続を閉じる"""
+        if self._batch_writer_task is not None:
+            self._batch_writer_task.cancel()
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.execute("PRAGMA optimize")  # 統計情報を更新してから閉じる
+                except sqlite3.Error as e:
+                    logger.warning(f"PRAGMA optimize failed: {e}")
+                conn.close()
+            self._connections.clear()
+
+db = Database(DB_PATH)
+
+# 時刻変換（DBには日時をUTCエポック秒の整数で保存する）
+def load_timezone(name: str) -> Optional[datetime.tzinfo]:
+    """IANAタイムゾーン名（Asia/Tokyoなど）を読み込む（不明な名前はNone）"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+DEFAULT_TZ = load_timezone(DEFAULT_TIMEZONE)
+if DEFAULT_TZ is None:
+    logger.warning(f"Unknown DEFAULT_TIMEZONE {DEFAULT_TIMEZONE!r}, falling back to UTC")
+    DEFAULT_TZ = datetime.timezone.utc
+
+def to_epoch(dt: datetime.datetime) -> int:
+    """datetimeをUTCエポック秒に変換（naiveな値はシステムのローカル時刻として扱う）"""
+    return int(dt.timestamp())
+
+def from_epoch(ts: int, tz: Optional[datetime.tzinfo] = None) -> datetime.datetime:
+    """UTCエポック秒を指定タイムゾーン（省略時はDEFAULT_TIMEZONE）のaware datetimeに変換"""
+    return datetime.datetime.fromtimestamp(ts, tz or DEFAULT_TZ)
+
+# スキーママイグレーション
+# 各マイグレーションは1トランザクションで適用され、schema_versionに記録される。
+# 大量の行を書き換える処理はregister_backfillで登録し、起動後にバッチ単位で実行する。
+def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+def _migration_001_initial_schema(conn: sqlite3.Connection):
     cursor = conn.cursor()
     
     # 管理者テーブル
@@ -114,15 +430,757 @@ def init_database():
             PRIMARY KEY (guild_id, user_id, channel_type)
         )
     ''')
+
+def _migration_002_reminder_sent(conn: sqlite3.Connection):
+    # reminder_sentが無い旧バージョンのtasksテーブルにカラムを追加
+    if not _column_exists(conn, 'tasks', 'reminder_sent'):
+        conn.execute('ALTER TABLE tasks ADD COLUMN reminder_sent INTEGER DEFAULT 0')
+
+def _migration_003_instructor_targets(conn: sqlite3.Connection):
+    # 指示対象をJSONから正規化テーブルへ移行
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS instructor_targets (
+            guild_id INTEGER,
+            instructor_id INTEGER,
+            target_id INTEGER,
+            PRIMARY KEY (guild_id, instructor_id, target_id)
+        ) WITHOUT ROWID
+    ''')
+    # 移行途中に制限付きの指示者が「全員対象」と判定されないよう、
+    # バックフィルではなくこのトランザクション内で変換する（指示者数は少ない）
+    rows = conn.execute(
+        "SELECT guild_id, user_id, target_users FROM instructors WHERE target_users IS NOT NULL"
+    ).fetchall()
+    # 変換できなかった行はtarget_usersを残し、指示権限なしとして扱う（対象なし＝全員対象にしない）
+    for guild_id, instructor_id, target_users in rows:
+        try:
+            target_ids = [int(target_id) for target_id in json.loads(target_users) or []]
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid target_users for instructor {instructor_id} in guild {guild_id}")
+            continue
+        conn.executemany(
+            "INSERT OR IGNORE INTO instructor_targets (guild_id, instructor_id, target_id) VALUES (?, ?, ?)",
+            [(guild_id, instructor_id, target_id) for target_id in target_ids]
+        )
+        conn.execute(
+            "UPDATE instructors SET target_users = NULL WHERE guild_id = ? AND user_id = ?",
+            (guild_id, instructor_id)
+        )
+
+def _migration_004_epoch_columns(conn: sqlite3.Connection):
+    # 日時をUTCエポック秒の整数で保持するカラムを追加（既存行はバックフィルで変換）
+    for column in ('due_ts', 'created_ts', 'updated_ts'):
+        if not _column_exists(conn, 'tasks', column):
+            conn.execute(f'ALTER TABLE tasks ADD COLUMN {column} INTEGER')
+    register_backfill(conn, 'tasks_epoch_columns')
+
+def _backfill_tasks_epoch_columns(conn: sqlite3.Connection, last_id: int, batch_size: int) -> Optional[int]:
+    # due_dateはローカル時刻、created_at/updated_atはCURRENT_TIMESTAMP（UTC）で保存されている
+    row = conn.execute(
+        "SELECT MAX(id) FROM (SELECT id FROM tasks WHERE id > ? ORDER BY id LIMIT ?)",
+        (last_id, batch_size)
+    ).fetchone()
+    if row[0] is None:
+        return None
+    conn.execute('''
+        UPDATE tasks SET
+            due_ts = COALESCE(due_ts, CAST(strftime('%s', due_date, 'utc') AS INTEGER)),
+            created_ts = COALESCE(created_ts, CAST(strftime('%s', created_at) AS INTEGER)),
+            updated_ts = COALESCE(updated_ts, CAST(strftime('%s', updated_at) AS INTEGER))
+        WHERE id > ? AND id <= ?
+    ''', (last_id, row[0]))
+    return row[0]
+
+def _migration_005_tasks_archive(conn: sqlite3.Connection):
+    # 終了済みタスクの移動先（ライブのtasksテーブルを小さく保つ）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER,
+            instructor_id INTEGER,
+            assignee_id INTEGER,
+            task_name TEXT,
+            status TEXT,
+            due_ts INTEGER,
+            created_ts INTEGER,
+            updated_ts INTEGER,
+            message_id INTEGER,
+            channel_id INTEGER,
+            archived_ts INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_guild_due_ts ON tasks_archive(guild_id, due_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_guild_instructor_due_ts ON tasks_archive(guild_id, instructor_id, due_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_guild_assignee_due_ts ON tasks_archive(guild_id, assignee_id, due_ts)")
+
+def _migration_006_tasks_fts(conn: sqlite3.Connection):
+    # タスク名の全文検索（trigramで日本語の部分一致に対応）
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(task_name, tokenize='trigram')
+    ''')
+    # tasksの変更をトリガーで同期（rowid = タスクID）
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts (rowid, task_name) VALUES (new.id, new.task_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            DELETE FROM tasks_fts WHERE rowid = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF task_name ON tasks BEGIN
+            UPDATE tasks_fts SET task_name = new.task_name WHERE rowid = old.id;
+        END
+    ''')
+    register_backfill(conn, 'tasks_fts')
+
+def _migration_007_reminder_jobs(conn: sqlite3.Connection):
+    # リマインダーの送信予定と結果を永続化（再起動をまたいで送信漏れ・二重送信を防ぐ）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_jobs (
+            id INTEGER PRIMARY KEY,
+            task_id INTEGER NOT NULL,
+            offset_seconds INTEGER NOT NULL,
+            fire_ts INTEGER NOT NULL,
+            state TEXT NOT NULL DEFAULT 'scheduled',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            updated_ts INTEGER,
+            UNIQUE (task_id, offset_seconds)
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reminder_jobs_scheduled ON reminder_jobs(fire_ts) "
+        "WHERE state = 'scheduled'"
+    )
+    # 未送信の受託済みタスクの移行はバックフィルで行う
+    register_backfill(conn, 'reminder_jobs')
+
+def _backfill_reminder_jobs(conn: sqlite3.Connection, last_id: int, batch_size: int) -> Optional[int]:
+    rows = conn.execute(
+        "SELECT id FROM tasks WHERE id > ? ORDER BY id LIMIT ?",
+        (last_id, batch_size)
+    ).fetchall()
+    if not rows:
+        return None
+    # due_tsのバックフィル前でも変換できるようdue_dateから計算
+    # 送信予定が既にあるタスク（移行後に受託されたもの）は対象外
+    conn.execute('''
+        INSERT OR IGNORE INTO reminder_jobs (task_id, offset_seconds, fire_ts, updated_ts)
+        SELECT id, ?, due - ?, CAST(strftime('%s', 'now') AS INTEGER)
+        FROM (
+            SELECT id, COALESCE(due_ts, CAST(strftime('%s', due_date, 'utc') AS INTEGER)) AS due
+            FROM tasks WHERE id > ? AND id <= ? AND status = 'accepted' AND reminder_sent = 0
+            AND NOT EXISTS (SELECT 1 FROM reminder_jobs WHERE reminder_jobs.task_id = tasks.id)
+        )
+        WHERE due > CAST(strftime('%s', 'now') AS INTEGER)
+    ''', (REMINDER_DEFAULT_OFFSETS[0], REMINDER_DEFAULT_OFFSETS[0], last_id, rows[-1][0]))
+    return rows[-1][0]
+
+def _migration_008_reminder_offsets(conn: sqlite3.Connection):
+    # サーバーごとの設定（NULLの項目は既定値を使う）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            reminder_offsets TEXT
+        )
+    ''')
+    # タスク個別のリマインダー設定（カンマ区切りの秒数。NULLはサーバー設定に従う）
+    if not _column_exists(conn, 'tasks', 'reminder_offsets'):
+        conn.execute('ALTER TABLE tasks ADD COLUMN reminder_offsets TEXT')
+
+def _migration_009_escalation(conn: sqlite3.Connection):
+    # escalation_stage: 通知済みの段階数、escalate_ts: 次の段階に進む時刻（NULLは対象外）
+    if not _column_exists(conn, 'tasks', 'escalation_stage'):
+        conn.execute('ALTER TABLE tasks ADD COLUMN escalation_stage INTEGER NOT NULL DEFAULT 0')
+    if not _column_exists(conn, 'tasks', 'escalate_ts'):
+        conn.execute('ALTER TABLE tasks ADD COLUMN escalate_ts INTEGER')
+    register_backfill(conn, 'tasks_escalate_ts')
+
+def _backfill_tasks_escalate_ts(conn: sqlite3.Connection, last_id: int, batch_size: int) -> Optional[int]:
+    row = conn.execute(
+        "SELECT MAX(id) FROM (SELECT id FROM tasks WHERE id > ? ORDER BY id LIMIT ?)",
+        (last_id, batch_size)
+    ).fetchone()
+    if row[0] is None:
+        return None
+    if OVERDUE_ESCALATION_DELAYS:
+        # 既に期日を過ぎている既存タスクは対象外（移行直後に大量の警告が届かないように）
+        due = "COALESCE(due_ts, CAST(strftime('%s', due_date, 'utc') AS INTEGER))"
+        conn.execute(f'''
+            UPDATE tasks SET escalate_ts = {due} + ?
+            WHERE id > ? AND id <= ? AND escalate_ts IS NULL AND escalation_stage = 0
+              AND status IN ('pending', 'accepted') AND {due} > CAST(strftime('%s', 'now') AS INTEGER)
+        ''', (OVERDUE_ESCALATION_DELAYS[0], last_id, row[0]))
+    return row[0]
+
+def _migration_010_task_recurrences(conn: sqlite3.Connection):
+    # 繰り返しタスクの定義（rule はRRULE形式、current_due_ts は作成済みの最新回の期日）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_recurrences (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            instructor_id INTEGER NOT NULL,
+            assignee_id INTEGER NOT NULL,
+            task_name TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            anchor_ts INTEGER NOT NULL,
+            current_due_ts INTEGER NOT NULL,
+            reminder_offsets TEXT,
+            message_id INTEGER,
+            channel_id INTEGER,
+            active INTEGER NOT NULL DEFAULT 1,
+            created_ts INTEGER
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_task_recurrences_due ON task_recurrences(current_due_ts) WHERE active = 1"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_task_recurrences_guild ON task_recurrences(guild_id, active)"
+    )
+    if not _column_exists(conn, 'tasks', 'recurrence_id'):
+        conn.execute('ALTER TABLE tasks ADD COLUMN recurrence_id INTEGER')
+
+def _migration_011_reminder_digest(conn: sqlite3.Connection):
+    # まとめ通知の設定（NULLは上位の設定に従う: ユーザー → サーバー → 既定値）
+    if not _column_exists(conn, 'guild_settings', 'reminder_digest'):
+        conn.execute('ALTER TABLE guild_settings ADD COLUMN reminder_digest INTEGER')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_settings (
+            guild_id INTEGER,
+            user_id INTEGER,
+            reminder_digest INTEGER,
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+def _migration_012_timezone_quiet_hours(conn: sqlite3.Connection):
+    # タイムゾーン（IANA名）と通知を控える時間帯（0時からの分。開始 > 終了なら日をまたぐ）
+    for column in ('timezone TEXT', 'quiet_start INTEGER', 'quiet_end INTEGER'):
+        if not _column_exists(conn, 'guild_settings', column.split()[0]):
+            conn.execute(f'ALTER TABLE guild_settings ADD COLUMN {column}')
+    # 静音時間のため後ろ倒しにしたジョブ（終了時にまとめて送る）
+    if not _column_exists(conn, 'reminder_jobs', 'deferred'):
+        conn.execute('ALTER TABLE reminder_jobs ADD COLUMN deferred INTEGER NOT NULL DEFAULT 0')
+
+def _migration_013_notification_outbox(conn: sqlite3.Connection):
+    # 送信する通知をタスクの更新と同じトランザクションで記録し、ワーカーが再送付きで配送する
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            task_id INTEGER,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_ts INTEGER NOT NULL,
+            last_error TEXT,
+            created_ts INTEGER NOT NULL,
+            updated_ts INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending ON notification_outbox(next_attempt_ts) "
+        "WHERE state = 'pending'"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notification_outbox_task ON notification_outbox(task_id)")
+
+def _migration_014_status_messages(conn: sqlite3.Connection):
+    # 状態変更の通知先（カンマ区切り。NULLは既定値）
+    if not _column_exists(conn, 'guild_settings', 'notification_targets'):
+        conn.execute('ALTER TABLE guild_settings ADD COLUMN notification_targets TEXT')
+    # タスクごとの状態メッセージ（以降の状態変更は新しく送らずにこのメッセージを編集する）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_status_messages (
+            task_id INTEGER NOT NULL,
+            target TEXT NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            thread_id INTEGER,
+            history TEXT NOT NULL DEFAULT '[]',  -- [[更新日時, 通知内容], ...]（JSON）
+            PRIMARY KEY (task_id, target)
+        ) WITHOUT ROWID
+    ''')
+
+def _migration_015_instructor_targets_by_target(conn: sqlite3.Connection):
+    # 「ユーザーXに指示できる指示者」の逆引き用（主キーは指示者が先頭のため使えない）
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_instructor_targets_target ON instructor_targets(guild_id, target_id)"
+    )
+
+def task_name_bigrams(task_name: Optional[str]) -> List[str]:
+    """タスク名に含まれる2文字の部分文字列（小文字化・重複除去）"""
+    name = (task_name or '').lower()
+    return sorted({name[i:i + 2] for i in range(len(name) - 1)})
+
+def insert_task_bigrams(conn: sqlite3.Connection, rows):
+    """(guild_id, task_id, task_name) ごとの2文字索引を追加（tasksへの追加と同じトランザクションで呼び出す）"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO task_bigrams (guild_id, bigram, task_id) VALUES (?, ?, ?)",
+        [(guild_id, bigram, task_id) for guild_id, task_id, task_name in rows for bigram in task_name_bigrams(task_name)]
+    )
+
+def delete_task_bigrams(conn: sqlite3.Connection, rows):
+    """(guild_id, task_id, task_name) ごとの2文字索引を削除（tasksからの削除と同じトランザクションで呼び出す）"""
+    conn.executemany(
+        "DELETE FROM task_bigrams WHERE guild_id = ? AND bigram = ? AND task_id = ?",
+        [(guild_id, bigram, task_id) for guild_id, task_id, task_name in rows for bigram in task_name_bigrams(task_name)]
+    )
+
+def _migration_016_task_bigrams(conn: sqlite3.Connection):
+    # trigramでは検索できない2文字の語（資料・会議など）用に、タスク名の2文字ごとの索引をサーバー単位で保持
+    # （sqlite3 CLIなどからも書き込めるようトリガーは使わず、タスクの追加・削除と同じトランザクションで更新する）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_bigrams (
+            guild_id INTEGER NOT NULL,
+            bigram TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, bigram, task_id)
+        ) WITHOUT ROWID
+    ''')
+    register_backfill(conn, 'task_bigrams')
+
+def _backfill_task_bigrams(conn: sqlite3.Connection, last_id: int, batch_size: int) -> Optional[int]:
+    rows = conn.execute(
+        "SELECT guild_id, id, task_name FROM tasks WHERE id > ? ORDER BY id LIMIT ?",
+        (last_id, batch_size)
+    ).fetchall()
+    if not rows:
+        return None
+    # 移行後に追加されたタスクの組はINSERT OR IGNOREで無視される
+    insert_task_bigrams(conn, rows)
+    return rows[-1][1]
+
+def _migration_017_drop_tasks_fts(conn: sqlite3.Connection):
+    # 検索はtask_bigramsで行うため、書き込みのたびに更新していた全文検索索引を削除
+    # 以前のマイグレーション16で作成していたトリガー（Pythonの関数を呼ぶためsqlite3 CLIから書き込めない）も削除
+    for trigger in ('tasks_fts_insert', 'tasks_fts_delete', 'tasks_fts_update',
+                    'task_bigrams_insert', 'task_bigrams_delete', 'task_bigrams_update'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS tasks_fts")
+    conn.execute("DELETE FROM schema_backfills WHERE name = 'tasks_fts'")
+
+def _migration_018_drop_tasks_compat(conn: sqlite3.Connection):
+    # 以前のマイグレーション4で作成していた、どこからも読まれない互換ビューを削除
+    conn.execute('DROP VIEW IF EXISTS tasks_compat')
+
+# (バージョン, 説明, 適用関数) をバージョン順に記述する
+MIGRATIONS = [
+    (1, 'initial schema', _migration_001_initial_schema),
+    (2, 'add tasks.reminder_sent', _migration_002_reminder_sent),
+    (3, 'normalize instructors.target_users into instructor_targets', _migration_003_instructor_targets),
+    (4, 'store task timestamps as integer epoch seconds', _migration_004_epoch_columns),
+    (5, 'add tasks_archive', _migration_005_tasks_archive),
+    (6, 'add tasks_fts full-text index', _migration_006_tasks_fts),
+    (7, 'add reminder_jobs', _migration_007_reminder_jobs),
+    (8, 'add guild_settings and per-task reminder offsets', _migration_008_reminder_offsets),
+    (9, 'add overdue escalation columns', _migration_009_escalation),
+    (10, 'add task_recurrences', _migration_010_task_recurrences),
+    (11, 'add reminder digest settings', _migration_011_reminder_digest),
+    (12, 'add guild timezone and quiet hours', _migration_012_timezone_quiet_hours),
+    (13, 'add notification outbox', _migration_013_notification_outbox),
+    (14, 'add notification targets and task status messages', _migration_014_status_messages),
+    (15, 'index instructor_targets by target', _migration_015_instructor_targets_by_target),
+    (16, 'add task_bigrams for two-character search terms', _migration_016_task_bigrams),
+    (17, 'drop tasks_fts in favour of task_bigrams', _migration_017_drop_tasks_fts),
+    (18, 'drop unused tasks_compat view', _migration_018_drop_tasks_compat),
+]
+
+# tasksテーブルの管理対象インデックス（名前 -> 定義）
+TASK_INDEXES = {
+    # タスク一覧（全体 / 指示者 / 担当者）の期日順表示
+    'idx_tasks_guild_due_ts':
+        "CREATE INDEX IF NOT EXISTS idx_tasks_guild_due_ts ON tasks(guild_id, due_ts)",
+    'idx_tasks_guild_instructor_due_ts':
+        "CREATE INDEX IF NOT EXISTS idx_tasks_guild_instructor_due_ts ON tasks(guild_id, instructor_id, due_ts)",
+    'idx_tasks_guild_assignee_due_ts':
+        "CREATE INDEX IF NOT EXISTS idx_tasks_guild_assignee_due_ts ON tasks(guild_id, assignee_id, due_ts)",
+    # アーカイブ対象（終了状態）のタスクを更新日時順に取得
+    'idx_tasks_finished_ts':
+        "CREATE INDEX IF NOT EXISTS idx_tasks_finished_ts ON tasks(updated_ts) "
+        "WHERE status IN ('completed', 'declined', 'abandoned')",
+    # 次のエスカレーション時刻を迎えたタスク
+    'idx_tasks_escalate_ts':
+        "CREATE INDEX IF NOT EXISTS idx_tasks_escalate_ts ON tasks(escalate_ts) WHERE escalate_ts IS NOT NULL",
+    # 重複チェック用のカバリングインデックス
+    'idx_tasks_guild_assignee_name':
+        "CREATE INDEX IF NOT EXISTS idx_tasks_guild_assignee_name ON tasks(guild_id, assignee_id, task_name, status)",
+}
+
+def _sync_task_indexes(conn: sqlite3.Connection) -> List[str]:
+    """管理対象外になったインデックスを削除し、未作成の管理対象インデックス名を返す（作成はbuild_task_indexesで行う）"""
+    existing = {
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND name LIKE 'idx_tasks_%'"
+        )
+    }
+    for name in existing - TASK_INDEXES.keys():
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+        logger.info(f"Dropped unmanaged index {name}")
+    return [name for name in TASK_INDEXES if name not in existing]
+
+def _create_task_index(conn: sqlite3.Connection, name: str):
+    conn.execute(TASK_INDEXES[name])
+
+# tasksの期日（tasks_epoch_columnsのバックフィル前の行はdue_date（ローカル時刻のTEXT）から計算）
+SQL_TASK_DUE_TS = "COALESCE(tasks.due_ts, CAST(strftime('%s', tasks.due_date, 'utc') AS INTEGER))"
+
+# 頻出クエリ（実行計画チェックの対象）
+SQL_SCHEDULED_REMINDER_JOBS = (
+    "SELECT id, fire_ts FROM reminder_jobs WHERE state = 'scheduled' AND fire_ts > ? AND fire_ts <= ?"
+)
+# 停止中に発火時刻を過ぎたジョブ（起動後に登録・更新されたものはスケジューラ側で処理する）
+SQL_OVERDUE_REMINDER_JOBS = (
+    "SELECT reminder_jobs.id, reminder_jobs.fire_ts, tasks.guild_id, tasks.assignee_id, "
+    f"tasks.task_name, {SQL_TASK_DUE_TS}, tasks.status "
+    "FROM reminder_jobs LEFT JOIN tasks ON tasks.id = reminder_jobs.task_id "
+    "WHERE reminder_jobs.state = 'scheduled' AND reminder_jobs.fire_ts <= ? AND reminder_jobs.updated_ts < ? "
+    "ORDER BY reminder_jobs.fire_ts LIMIT ?"
+)
+
+def _build_task_page_queries(tables=('tasks', 'tasks_archive'), due: str = 'due_ts') -> Dict[tuple, str]:
+    """タスク一覧のキーセットページング用クエリ（(due_ts, id) をキーとしてインデックス上を移動）"""
+    columns = f"id, instructor_id, assignee_id, task_name, {due if due == 'due_ts' else f'{due} AS due_ts'}, status"
+    queries = {}
+    for table in tables:
+        for direction, op, order in (('next', '>', 'ASC'), ('prev', '<', 'DESC')):
+            keyset = f"({due}, id) {op} (?, ?)"
+            order_by = f"ORDER BY due_ts {order}, id {order} LIMIT ?"
+            queries[(table, 'guild', direction)] = (
+                f"SELECT {columns} FROM {table} WHERE guild_id = ? AND {keyset} {order_by}"
+            )
+            # ORだとインデックス順に読めないため、指示者・担当者それぞれのインデックスをUNIONでマージ
+            queries[(table, 'member', direction)] = (
+                f"SELECT {columns} FROM {table} WHERE guild_id = ? AND instructor_id = ? AND {keyset} "
+                f"UNION SELECT {columns} FROM {table} WHERE guild_id = ? AND assignee_id = ? AND {keyset} "
+                f"{order_by}"
+            )
+    return queries
+
+SQL_TASK_PAGES = _build_task_page_queries()
+# tasks_epoch_columnsのバックフィル完了前に使う、due_tsが未設定の行も含めるクエリ（インデックスは使えない）
+SQL_TASK_PAGES_BEFORE_BACKFILL = _build_task_page_queries(('tasks',), SQL_TASK_DUE_TS)
+SQL_FINISHED_TASKS_BEFORE = (
+    "SELECT id FROM tasks WHERE status IN ('completed', 'declined', 'abandoned') "
+    "AND updated_ts < ? ORDER BY updated_ts LIMIT ?"
+)
+SQL_ESCALATION_DUE = (
+    f"SELECT id, guild_id, instructor_id, assignee_id, task_name, {SQL_TASK_DUE_TS}, escalation_stage FROM tasks "
+    "WHERE escalate_ts <= ? AND status IN ('pending', 'accepted') ORDER BY escalate_ts LIMIT ?"
+)
+SQL_RECURRENCES_DUE = (
+    "SELECT id, current_due_ts FROM task_recurrences WHERE active = 1 AND current_due_ts <= ? "
+    "ORDER BY current_due_ts LIMIT ?"
+)
+# 配送時刻を迎えた通知
+SQL_OUTBOX_DUE = (
+    "SELECT id, idempotency_key, kind, guild_id, task_id, payload, attempts FROM notification_outbox "
+    "WHERE state = 'pending' AND next_attempt_ts <= ? ORDER BY next_attempt_ts LIMIT ?"
+)
+# 次に配送する通知の時刻
+SQL_OUTBOX_NEXT = "SELECT MIN(next_attempt_ts) FROM notification_outbox WHERE state = 'pending'"
+# 担当者の送信待ちリマインダー（まとめ通知用）
+SQL_ASSIGNEE_DUE_REMINDER_JOBS = (
+    f"SELECT reminder_jobs.id, tasks.task_name, {SQL_TASK_DUE_TS} FROM tasks "
+    "JOIN reminder_jobs ON reminder_jobs.task_id = tasks.id "
+    "WHERE tasks.guild_id = ? AND tasks.assignee_id = ? AND tasks.status = 'accepted' "
+    "AND reminder_jobs.state = 'scheduled' AND reminder_jobs.fire_ts <= ? "
+    "ORDER BY tasks.due_ts, reminder_jobs.id"
+)
+# ユーザーを指示対象に含む指示者（対象が無い指示者は全員が対象のため別途確認する）
+SQL_INSTRUCTORS_FOR_TARGET = "SELECT instructor_id FROM instructor_targets WHERE guild_id = ? AND target_id = ?"
+SQL_DUPLICATE_TASK = (
+    "SELECT 1 FROM tasks WHERE assignee_id = ? AND task_name = ? AND guild_id = ? "
+    "AND status NOT IN ('completed', 'abandoned', 'declined')"
+)
+
+# (名前, クエリ, サンプルパラメータ)
+QUERY_PLAN_CHECKS = [
+    ('scheduled_reminder_jobs', SQL_SCHEDULED_REMINDER_JOBS, (0, 0)),
+    ('overdue_reminder_jobs', SQL_OVERDUE_REMINDER_JOBS, (0, 0, 1)),
+    *[
+        (f"task_page_{table}_{scope}_{direction}", query,
+         (0, 0, 0, 1) if scope == 'guild' else (0, 0, 0, 0, 0, 0, 0, 0, 1))
+        for (table, scope, direction), query in SQL_TASK_PAGES.items()
+    ],
+    ('duplicate_task', SQL_DUPLICATE_TASK, (0, '', 0)),
+    ('finished_tasks_before', SQL_FINISHED_TASKS_BEFORE, (0, 1)),
+    ('escalation_due', SQL_ESCALATION_DUE, (0, 1)),
+    ('recurrences_due', SQL_RECURRENCES_DUE, (0, 1)),
+    ('assignee_due_reminder_jobs', SQL_ASSIGNEE_DUE_REMINDER_JOBS, (0, 0, 0)),
+    ('outbox_due', SQL_OUTBOX_DUE, (0, 1)),
+    ('outbox_next', SQL_OUTBOX_NEXT, ()),
+    ('instructors_for_target', SQL_INSTRUCTORS_FOR_TARGET, (0, 0)),
+]
+
+# 全件スキャンを検出する対象テーブル
+FULL_SCAN_TABLES = ('tasks', 'reminder_jobs', 'task_recurrences', 'notification_outbox', 'instructor_targets')
+# 主キーの先頭（guild_id）だけで検索できてしまい全件スキャンとして検出されないクエリが使うべきインデックス
+QUERY_PLAN_REQUIRED_INDEXES = {
+    'instructors_for_target': 'idx_instructor_targets_target',
+}
+
+def find_full_scans(conn: sqlite3.Connection) -> List[str]:
+    """頻出クエリのうち対象テーブルを全件スキャンするものを返す"""
+    regressions = []
+    for name, query, params in QUERY_PLAN_CHECKS:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        for row in plan:
+            detail = row[-1]
+            if any(detail.startswith(f"SCAN {table}") for table in FULL_SCAN_TABLES):
+                regressions.append(f"{name}: {detail}")
+        index = QUERY_PLAN_REQUIRED_INDEXES.get(name)
+        if index and not any(f"INDEX {index} " in row[-1] for row in plan):
+            regressions.append(f"{name}: not using {index} ({'; '.join(row[-1] for row in plan)})")
+    return regressions
+
+def _ensure_migration_tables(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER DEFAULT 0,
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+    ''')
+
+def _current_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def _apply_migration(conn: sqlite3.Connection, version: int, description: str, migrate):
+    """マイグレーション本体とバージョン記録を同一トランザクションで適用"""
+    conn.execute("BEGIN IMMEDIATE")
+    migrate(conn)
+    conn.execute(
+        "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+        (version, description)
+    )
+
+def register_backfill(conn: sqlite3.Connection, name: str):
+    """マイグレーション内からバックフィルを登録（実処理は起動後にバックグラウンドで実行）"""
+    conn.execute("INSERT OR IGNORE INTO schema_backfills (name) VALUES (?)", (name,))
+
+# バックフィル名 -> fn(conn, last_id, batch_size)
+# 1バッチ分を処理して次の開始位置を返す。処理対象が無くなったらNoneを返す
+BACKFILLS = {
+    'tasks_epoch_columns': _backfill_tasks_epoch_columns,
+    'tasks_escalate_ts': _backfill_tasks_escalate_ts,
+    'reminder_jobs': _backfill_reminder_jobs,
+    'task_bigrams': _backfill_task_bigrams,
+}
+
+BACKFILL_BATCH_SIZE = 500
+BACKFILL_PAUSE_SECONDS = 0.05  # バッチ間で書き込みスレッドを他の処理に譲る
+
+def _run_backfill_batch(conn: sqlite3.Connection, name: str, step, last_id: int):
+    # バッチ処理と進捗の記録を同一トランザクションで行い、再起動後も続きから再開できるようにする
+    next_id = step(conn, last_id, BACKFILL_BATCH_SIZE)
+    if next_id is None:
+        conn.execute(
+            "UPDATE schema_backfills SET completed_at = CURRENT_TIMESTAMP WHERE name = ?",
+            (name,)
+        )
+    else:
+        conn.execute("UPDATE schema_backfills SET last_id = ? WHERE name = ?", (next_id, name))
+    return next_id
+
+async def run_backfills():
+    """未完了のバックフィルを短いトランザクションに分けて実行"""
+    pending = await db.fetch(
+        "SELECT name, last_id FROM schema_backfills WHERE completed_at IS NULL ORDER BY registered_at"
+    )
+    for name, last_id in pending:
+        step = BACKFILLS.get(name)
+        if step is None:
+            logger.warning(f"Backfill {name} is registered but has no implementation")
+            continue
+        
+        logger.info(f"Backfill {name} started (from id {last_id})")
+        try:
+            while last_id is not None:
+                last_id = await db.run_in_transaction(_run_backfill_batch, name, step, last_id)
+                await asyncio.sleep(BACKFILL_PAUSE_SECONDS)
+            logger.info(f"Backfill {name} completed")
+        except Exception as e:
+            logger.error(f"Backfill {name} failed: {e}")
+
+# 完了済みのバックフィル（完了後に未完了へ戻ることはないため、完了したものだけを保持）
+completed_backfills = set()
+
+async def backfill_completed(name: str) -> bool:
+    """バックフィルが完了したか（完了するまでは未変換の行を考慮したクエリを使う）"""
+    if name not in completed_backfills:
+        result = await db.fetch("SELECT completed_at FROM schema_backfills WHERE name = ?", (name,))
+        if result and result[0][0]:
+            completed_backfills.add(name)
+    return name in completed_backfills
+
+async def run_background_maintenance():
+    """起動後のインデックス作成とバックフィル"""
+    await build_task_indexes()
+    await run_backfills()
+
+async def build_task_indexes():
+    """未作成の管理対象インデックスを1件ずつ別のトランザクションで作成し、頻出クエリの実行計画を確認"""
+    # 大きなtasksテーブルへのインデックス作成は時間がかかるため、起動後にバックグラウンドで実行する
+    for name in await db.run_in_transaction(_sync_task_indexes):
+        logger.info(f"Creating index {name}")
+        try:
+            await db.run_in_transaction(_create_task_index, name)
+        except Exception as e:
+            logger.error(f"Creating index {name} failed: {e}")
+        await asyncio.sleep(BACKFILL_PAUSE_SECONDS)
     
-    # 既存のテーブルにreminder_sentカラムを追加（存在しない場合）
-    try:
-        cursor.execute('ALTER TABLE tasks ADD COLUMN reminder_sent INTEGER DEFAULT 0')
-    except sqlite3.OperationalError:
-        pass  # カラムが既に存在する場合
+    # インデックスが効かなくなったクエリを検出
+    regressions = await db.run_in_transaction(find_full_scans)
+    for regression in regressions:
+        logger.warning(f"Query plan regression (full table scan): {regression}")
+
+async def run_migrations():
+    """未適用のマイグレーションを順番に適用"""
+    await db.run_in_transaction(_ensure_migration_tables)
+    current = await db.run_in_transaction(_current_schema_version)
+    
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Applying schema migration {version}: {description}")
+        await db.run_in_transaction(_apply_migration, version, description, migrate)
+
+def _configure_database(conn: sqlite3.Connection):
+    """データベースファイル単位の設定（WALは一度設定すればファイルに保持される）"""
+    journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    if journal_mode.lower() != 'wal':
+        logger.warning(f"WAL mode could not be enabled (journal_mode={journal_mode})")
+    # チェックポイントは約4MBごとに自動実行
+    conn.execute("PRAGMA wal_autocheckpoint = 1000")
+
+async def init_database():
+    """書き込みスレッド上でWALを有効化し、スキーマを最新バージョンに更新"""
+    await db.run_in_transaction(_configure_database)
+    await run_migrations()
+    # 管理対象外のインデックスの削除のみ行い、不足分はbuild_task_indexesでバックグラウンドで作成
+    missing = await db.run_in_transaction(_sync_task_indexes)
+    if missing:
+        logger.info(f"{len(missing)} index(es) will be built in the background: {', '.join(missing)}")
+    
+    await guild_settings_cache.load_all()
+    await channel_directory.load_all()
+
+class TokenBucket:
+    """トークンバケット（毎秒rate個補充、最大capacity個）。429を受けたらretry_after秒間止める
+    
+    成功したレスポンスでも、Discord側の残り回数が0になればリセットまで止める。
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        # 待機中はロックを保持し、先に待ち始めた呼び出しから順にトークンを渡す
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                blocked = self._blocked_until - now
+                if blocked <= 0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep(max(blocked, (1 - self._tokens) / self.rate))
+    
+    def block(self, retry_after: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+        self._tokens = 0.0
+    
+    def limit(self, remaining: int, reset_after: float):
+        """Discord側のバケットの残り回数を超えてトークンを渡さないようにする"""
+        self._tokens = min(self._tokens, float(remaining))
+        if remaining <= 0:
+            self.block(reset_after)
+
+def retry_after_from(error: Exception) -> Optional[float]:
+    """レート制限（429）なら待機秒数を返す（Retry-After / X-RateLimit-Reset-Afterヘッダーを優先）"""
+    if isinstance(error, discord.RateLimited):
+        return float(error.retry_after)
+    if getattr(error, 'status', None) != 429:
+        return None
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    for header in ('Retry-After', 'X-RateLimit-Reset-After'):
+        try:
+            return float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 1.0
+
+class RouteRateLimiter:
+    """ルート（API種別とサーバーなど）ごとのトークンバケットでAPI呼び出しを制限"""
+    
+    def __init__(self, rate: float, capacity: int, max_retries: int = 3):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_retries = max_retries
+        self._buckets: Dict[Any, TokenBucket] = {}
+    
+    def bucket(self, route) -> TokenBucket:
+        if route not in self._buckets:
+            self._buckets[route] = TokenBucket(self.rate, self.capacity)
+        return self._buckets[route]
     
-    conn.commit()
-    conn.close()
+    async def call(self, route, func, *args, **kwargs):
+        bucket = self.bucket(route)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            token = current_rate_limit_bucket.set(bucket)
+            try:
+                return await func(*args, **kwargs)
+            except (discord.HTTPException, discord.RateLimited) as e:
+                retry_after = retry_after_from(e)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                logger.warning(f"Rate limited on {route}, retrying after {retry_after:.1f}s")
+                bucket.block(retry_after)
+            finally:
+                current_rate_limit_bucket.reset(token)
+
+thread_invite_limiter = RouteRateLimiter(THREAD_INVITE_RATE, THREAD_INVITE_BURST)
+notification_limiter = RouteRateLimiter(NOTIFICATION_API_RATE, NOTIFICATION_API_BURST)
+
+def thread_members_for(guild, *users) -> set:
+    """スレッドに招待するユーザー（指定ユーザー + タスク管理者・タスク指示者ロール）"""
+    members = set(users)
+    for role_name in ("タスク管理者", "タスク指示者"):
+        role = discord.utils.get(guild.roles, name=role_name)
+        if role:
+            members.update(role.members)
+    return members
+
+async def invite_thread_members(thread, members):
+    """スレッドにユーザーを招待（サーバーごとのレート制限内で並行実行。バックグラウンドで呼び出す）"""
+    async def _add(member):
+        try:
+            await thread_invite_limiter.call(('thread_members', thread.guild.id), thread.add_user, member)
+        except Exception as e:
+            logger.error(f"Failed to add user {member.display_name} to thread: {e}")
+    
+    await asyncio.gather(*(_add(member) for member in members))
 
 # スレッド削除機能
 async def delete_thread_after_delay(thread, delay_seconds):
@@ -142,125 +1200,1073 @@ async def delete_thread_after_delay(thread, delay_seconds):
     except Exception as e:
         logger.error(f"Error deleting thread {thread.name}: {e}")
 
+# 権限キャッシュ
+class PermissionEntry(NamedTuple):
+    is_admin: bool
+    is_instructor: bool
+    targets: frozenset  # 指示可能なユーザーID（空の場合は全員対象）
+    targets_invalid: bool = False  # 旧形式の指示対象を移行できなかった（誰にも指示できない）
+
+class PermissionCache:
+    """(guild_id, user_id) ごとの権限情報をギルド単位でメモリに保持するキャッシュ"""
+
+    def __init__(self):
+        self._guilds: Dict[int, Dict[int, PermissionEntry]] = {}
+        self._generation = 0  # 無効化のたびに増やし、読み込み中の古い値で上書きしないようにする
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, guild_id: int, user_id: int) -> Optional[PermissionEntry]:
+        entry = self._guilds.get(guild_id, {}).get(user_id)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, guild_id: int, user_id: int, entry: PermissionEntry, generation: int):
+        if generation == self._generation:
+            self._guilds.setdefault(guild_id, {})[user_id] = entry
+
+    def invalidate(self, guild_id: int, user_id: int = None):
+        """書き込み時に呼び出す（user_id省略時はギルド全体を無効化）"""
+        self._generation += 1
+        if user_id is None:
+            self._guilds.pop(guild_id, None)
+        else:
+            self._guilds.get(guild_id, {}).pop(user_id, None)
+
+    def clear(self):
+        self._generation += 1
+        self._guilds.clear()
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        entries = sum(len(users) for users in self._guilds.values())
+        return f"hits={self.hits} misses={self.misses} hit_rate={hit_rate:.1f}% entries={entries}"
+
+permission_cache = PermissionCache()
+
+class GuildSettings(NamedTuple):
+    timezone: datetime.tzinfo
+    quiet_start: Optional[int]  # 0時からの分
+    quiet_end: Optional[int]
+    notification_targets: tuple  # 状態変更の通知先（NOTIFICATION_TARGETSのキー）
+
+# GuildSettingsCacheが読み込むguild_settingsのカラム
+SQL_GUILD_SETTINGS_CACHED = (
+    "SELECT timezone, quiet_start, quiet_end, notification_targets FROM guild_settings WHERE guild_id = ?"
+)
+
+class GuildSettingsCache:
+    """サーバーごとのタイムゾーン・静音時間・通知先をメモリに保持（起動時に全件読み込み、変更時に更新）"""
+    
+    def __init__(self):
+        self._guilds: Dict[int, GuildSettings] = {}
+    
+    async def load_all(self):
+        rows = await db.fetch("SELECT guild_id, timezone, quiet_start, quiet_end, notification_targets FROM guild_settings")
+        self._guilds = {row[0]: self._build(*row[1:]) for row in rows}
+    
+    @staticmethod
+    def _build(timezone: Optional[str], quiet_start: Optional[int], quiet_end: Optional[int],
+               notification_targets: Optional[str]) -> GuildSettings:
+        tz = load_timezone(timezone) if timezone else None
+        targets = DEFAULT_NOTIFICATION_TARGETS if notification_targets is None else tuple(
+            target for target in notification_targets.split(',') if target in NOTIFICATION_TARGETS
+        )
+        return GuildSettings(tz or DEFAULT_TZ, quiet_start, quiet_end, targets)
+    
+    def get(self, guild_id: int) -> GuildSettings:
+        return self._guilds.get(guild_id) or GuildSettings(DEFAULT_TZ, None, None, DEFAULT_NOTIFICATION_TARGETS)
+    
+    def put(self, guild_id: int, timezone: Optional[str], quiet_start: Optional[int], quiet_end: Optional[int],
+            notification_targets: Optional[str]):
+        self._guilds[guild_id] = self._build(timezone, quiet_start, quiet_end, notification_targets)
+
+guild_settings_cache = GuildSettingsCache()
+
+def guild_tz(guild_id: int) -> datetime.tzinfo:
+    return guild_settings_cache.get(guild_id).timezone
+
+class ChannelDirectory:
+    """個人チャンネル・タスク管理チャンネルの (guild_id, user_id, 種類) → channel_id をメモリに保持
+    
+    notification_channelsを起動時に全件読み込み、チャンネルの作成・変更・削除イベントで更新する。
+    未登録のチャンネルは一度だけ名前で探して登録する（登録後は表示名を変更しても同じチャンネルを使う）。
+    """
+    PERSONAL = 'personal'
+    MANAGEMENT = 'management'  # user_idは0
+    
+    def __init__(self):
+        self._channels: Dict[tuple, int] = {}
+        self._keys: Dict[int, tuple] = {}  # channel_id -> (guild_id, user_id, 種類)
+        self._missing: Dict[int, set] = {}  # guild_id -> 名前で探しても見つからなかった (user_id, 種類)
+    
+    async def load_all(self):
+        rows = await db.fetch("SELECT guild_id, user_id, channel_type, channel_id FROM notification_channels")
+        self._channels = {(guild_id, user_id, channel_type): channel_id for guild_id, user_id, channel_type, channel_id in rows}
+        self._keys = {channel_id: key for key, channel_id in self._channels.items()}
+        self._missing.clear()
+    
+    async def get(self, guild, user_id: int, channel_type: str, name: str):
+        """登録済みのチャンネルを返す（未登録ならnameで探して登録。見つからなければNone）"""
+        key = (guild.id, user_id, channel_type)
+        channel_id = self._channels.get(key)
+        if channel_id is not None:
+            channel = guild.get_channel(channel_id)
+            if channel:
+                return channel
+            await self.forget(channel_id)  # 停止中に削除されたチャンネル
+        
+        missing = self._missing.setdefault(guild.id, set())
+        if (user_id, channel_type) in missing:
+            return None
+        channel = discord.utils.get(guild.text_channels, name=name)
+        if channel:
+            await self.register(guild.id, user_id, channel_type, channel.id)
+        else:
+            missing.add((user_id, channel_type))
+        return channel
+    
+    async def get_personal(self, guild, member):
+        return await self.get(guild, member.id, self.PERSONAL, f"{member.display_name}のタスク")
+    
+    async def get_management(self, guild):
+        return await self.get(guild, 0, self.MANAGEMENT, "タスク管理")
+    
+    async def register(self, guild_id: int, user_id: int, channel_type: str, channel_id: int):
+        key = (guild_id, user_id, channel_type)
+        old_channel_id = self._channels.get(key)
+        if old_channel_id is not None:
+            self._keys.pop(old_channel_id, None)
+        self._channels[key] = channel_id
+        self._keys[channel_id] = key
+        self._missing.get(guild_id, set()).discard((user_id, channel_type))
+        await DatabaseManager.set_notification_channel(guild_id, user_id, channel_type, channel_id)
+    
+    async def forget(self, channel_id: int):
+        key = self._keys.pop(channel_id, None)
+        if key is None:
+            return
+        self._channels.pop(key, None)
+        await DatabaseManager.delete_notification_channel(*key)
+    
+    def is_registered(self, channel_id: int) -> bool:
+        return channel_id in self._keys
+    
+    def clear_missing(self, guild_id: int):
+        """チャンネルの作成・名前変更時に呼び出し、見つからなかったチャンネルを次回探し直す"""
+        self._missing.pop(guild_id, None)
+
+channel_directory = ChannelDirectory()
+
+def quiet_hours_end(guild_id: int, now: datetime.datetime) -> Optional[datetime.datetime]:
+    """nowが静音時間内なら、その終了日時を返す"""
+    settings = guild_settings_cache.get(guild_id)
+    if settings.quiet_start is None or settings.quiet_end is None:
+        return None
+    now = now.astimezone(settings.timezone)
+    minutes = now.hour * 60 + now.minute
+    start, end = settings.quiet_start, settings.quiet_end
+    if start <= end:
+        in_quiet = start <= minutes < end
+    else:
+        in_quiet = minutes >= start or minutes < end  # 日をまたぐ（22:00-7:00など）
+    if not in_quiet:
+        return None
+    end_at = now.replace(hour=end // 60, minute=end % 60, second=0, microsecond=0)
+    if end_at <= now:
+        end_at += datetime.timedelta(days=1)
+    return end_at
+
 # データベース操作関数
 class DatabaseManager:
     @staticmethod
-    def execute_query(query: str, params: tuple = None):
-        conn = sqlite3.connect('reminder_bot.db')
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        result = cursor.fetchall()
-        conn.commit()
-        conn.close()
-        return result
+    async def execute_query(query: str, params: tuple = None):
+        """書き込みクエリを実行（コミットあり）"""
+        return await db.execute(query, params)
     
     @staticmethod
-    def is_admin(user_id: int, guild_id: int) -> bool:
-        result = DatabaseManager.execute_query(
-            "SELECT 1 FROM admins WHERE user_id = ? AND guild_id = ?",
-            (user_id, guild_id)
-        )
-        return len(result) > 0
+    async def fetch_query(query: str, params: tuple = None):
+        """読み取り専用クエリを実行（コミットなし）"""
+        return await db.fetch(query, params)
     
     @staticmethod
-    def is_instructor(user_id: int, guild_id: int) -> bool:
-        result = DatabaseManager.execute_query(
-            "SELECT 1 FROM instructors WHERE user_id = ? AND guild_id = ?",
-            (user_id, guild_id)
+    async def get_permissions(user_id: int, guild_id: int) -> PermissionEntry:
+        """権限情報を取得（キャッシュに無い場合のみ1クエリで読み込む）"""
+        entry = permission_cache.get(guild_id, user_id)
+        if entry is not None:
+            return entry
+        
+        generation = permission_cache.generation
+        result = await DatabaseManager.fetch_query(
+            "SELECT (SELECT 1 FROM admins WHERE user_id = ? AND guild_id = ?), "
+            "(SELECT target_users IS NOT NULL FROM instructors WHERE user_id = ? AND guild_id = ?), "
+            "(SELECT group_concat(target_id) FROM instructor_targets WHERE guild_id = ? AND instructor_id = ?)",
+            (user_id, guild_id, user_id, guild_id, guild_id, user_id)
         )
-        return len(result) > 0
+        # 指示者でなければNULL、移行できなかった旧形式の指示対象が残っていれば1
+        is_admin, unmigrated_targets, target_ids = result[0]
+        entry = PermissionEntry(
+            is_admin=bool(is_admin),
+            is_instructor=unmigrated_targets is not None,
+            targets=frozenset(int(t) for t in target_ids.split(',')) if target_ids else frozenset(),
+            targets_invalid=bool(unmigrated_targets)
+        )
+        permission_cache.put(guild_id, user_id, entry, generation)
+        return entry
+    
+    @staticmethod
+    async def is_admin(user_id: int, guild_id: int) -> bool:
+        return (await DatabaseManager.get_permissions(user_id, guild_id)).is_admin
+    
+    @staticmethod
+    async def is_instructor(user_id: int, guild_id: int) -> bool:
+        return (await DatabaseManager.get_permissions(user_id, guild_id)).is_instructor
     
     @staticmethod
-    def can_instruct_user(instructor_id: int, target_id: int, guild_id: int) -> bool:
-        if DatabaseManager.is_admin(instructor_id, guild_id):
+    async def can_instruct_user(instructor_id: int, target_id: int, guild_id: int) -> bool:
+        permissions = await DatabaseManager.get_permissions(instructor_id, guild_id)
+        if permissions.is_admin:
             return True
         
-        result = DatabaseManager.execute_query(
-            "SELECT target_users FROM instructors WHERE user_id = ? AND guild_id = ?",
-            (instructor_id, guild_id)
-        )
-        
-        if not result:
+        if not permissions.is_instructor or permissions.targets_invalid:
             return False
         
-        target_users = json.loads(result[0][0]) if result[0][0] else []
-        return target_id in target_users or not target_users  # 空リストは全員対象
+        return target_id in permissions.targets or not permissions.targets  # 空集合は全員対象
     
     @staticmethod
-    def add_task(guild_id: int, instructor_id: int, assignee_id: int, 
-                task_name: str, due_date: datetime.datetime, message_id: int, channel_id: int):
-        DatabaseManager.execute_query(
-            "INSERT INTO tasks (guild_id, instructor_id, assignee_id, task_name, due_date, message_id, channel_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (guild_id, instructor_id, assignee_id, task_name, due_date, message_id, channel_id)
-        )
+    async def add_task(guild_id: int, instructor_id: int, assignee_id: int, 
+                task_name: str, due_date: datetime.datetime, message_id: int, channel_id: int,
+                reminder_offsets: Optional[List[int]] = None) -> int:
+        """タスクを追加し、新しいタスクIDを返す"""
+        def _insert(conn):
+            return DatabaseManager._insert_task(
+                conn, guild_id, instructor_id, assignee_id, task_name, due_date, message_id, channel_id,
+                reminder_offsets
+            )
+        
+        return await db.write(_insert)
     
     @staticmethod
-    def update_task_status(task_id: int, status: str):
-        DatabaseManager.execute_query(
-            "UPDATE tasks SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (status, task_id)
-        )
+    async def create_task_if_not_duplicate(guild_id: int, instructor_id: int, assignee_id: int,
+                task_name: str, due_date: datetime.datetime, message_id: int, channel_id: int,
+                reminder_offsets: Optional[List[int]] = None,
+                recurrence: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """重複チェックとタスク追加を同一トランザクションで行い、新しいタスクIDを返す（重複時はNone）
+        
+        recurrenceを指定すると繰り返しの定義を登録し、due_dateを初回としてタスクを作成する。
+        """
+        def _create(conn):
+            if conn.execute(SQL_DUPLICATE_TASK, (assignee_id, task_name, guild_id)).fetchone():
+                return None
+            recurrence_id = None
+            if recurrence:
+                due_ts = to_epoch(due_date)
+                cursor = conn.execute(
+                    "INSERT INTO task_recurrences (guild_id, instructor_id, assignee_id, task_name, rule, anchor_ts, "
+                    "current_due_ts, reminder_offsets, message_id, channel_id, created_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (guild_id, instructor_id, assignee_id, task_name, format_rrule(recurrence), due_ts,
+                     due_ts, encode_offsets(reminder_offsets), message_id, channel_id, int(time.time()))
+                )
+                recurrence_id = cursor.lastrowid
+            task_id = DatabaseManager._insert_task(
+                conn, guild_id, instructor_id, assignee_id, task_name, due_date, message_id, channel_id,
+                reminder_offsets, recurrence_id
+            )
+            enqueue_task_assigned(conn, task_id, guild_id, instructor_id, assignee_id, task_name,
+                                  to_epoch(due_date), message_id)
+            return task_id
+        
+        return await db.write(_create)
     
     @staticmethod
-    def check_duplicate_task(assignee_id: int, task_name: str, guild_id: int) -> bool:
-        result = DatabaseManager.execute_query(
-            "SELECT 1 FROM tasks WHERE assignee_id = ? AND task_name = ? AND guild_id = ? AND status NOT IN ('completed', 'abandoned', 'declined')",
-            (assignee_id, task_name, guild_id)
+    def _insert_task(conn: sqlite3.Connection, guild_id: int, instructor_id: int, assignee_id: int,
+                task_name: str, due_date: datetime.datetime, message_id: int, channel_id: int,
+                reminder_offsets: Optional[List[int]] = None, recurrence_id: Optional[int] = None) -> int:
+        now_ts = int(time.time())
+        due_ts = to_epoch(due_date)
+        cursor = conn.execute(
+            "INSERT INTO tasks (guild_id, instructor_id, assignee_id, task_name, due_ts, created_ts, updated_ts, message_id, channel_id, reminder_offsets, escalate_ts, recurrence_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (guild_id, instructor_id, assignee_id, task_name, due_ts, now_ts, now_ts, message_id, channel_id,
+             encode_offsets(reminder_offsets), next_escalation_ts(due_ts, 0), recurrence_id)
         )
-        return len(result) > 0
+        insert_task_bigrams(conn, [(guild_id, cursor.lastrowid, task_name)])
+        return cursor.lastrowid
+    
+    @staticmethod
+    async def archive_finished_tasks(cutoff: datetime.datetime, limit: int) -> int:
+        """cutoffより前に終了したタスクを最大limit件アーカイブへ移動し、移動した件数を返す"""
+        def _archive(conn):
+            task_ids = [row[0] for row in conn.execute(SQL_FINISHED_TASKS_BEFORE, (to_epoch(cutoff), limit))]
+            if not task_ids:
+                return 0
+            placeholders = ','.join('?' * len(task_ids))
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks_archive (id, guild_id, instructor_id, assignee_id, task_name, status, "
+                "due_ts, created_ts, updated_ts, message_id, channel_id, archived_ts) "
+                "SELECT id, guild_id, instructor_id, assignee_id, task_name, status, "
+                f"due_ts, created_ts, updated_ts, message_id, channel_id, ? FROM tasks WHERE id IN ({placeholders})",
+                (int(time.time()), *task_ids)
+            )
+            delete_task_bigrams(conn, conn.execute(
+                f"SELECT guild_id, id, task_name FROM tasks WHERE id IN ({placeholders})", task_ids
+            ).fetchall())
+            conn.execute(f"DELETE FROM tasks WHERE id IN ({placeholders})", task_ids)
+            conn.execute(f"DELETE FROM reminder_jobs WHERE task_id IN ({placeholders})", task_ids)
+            conn.execute(f"DELETE FROM notification_outbox WHERE task_id IN ({placeholders}) AND state != 'pending'", task_ids)
+            conn.execute(f"DELETE FROM task_status_messages WHERE task_id IN ({placeholders})", task_ids)
+            return len(task_ids)
+        
+        return await db.write(_archive)
+    
+    @staticmethod
+    async def update_task_status(task_id: int, status: str, notification: Optional[str] = None) -> bool:
+        """状態を更新し、notificationを指定すると指示者への通知を同じトランザクションでアウトボックスに追加
+        
+        状態が変わらなかった場合（ボタンの二重押しなど）は通知しない。通知を追加したらTrueを返す。
+        """
+        def _update(conn):
+            row = conn.execute(
+                f"SELECT {SQL_TASK_DUE_TS}, escalation_stage, status, guild_id, instructor_id, assignee_id, task_name FROM tasks WHERE id = ?",
+                (task_id,)
+            ).fetchone()
+            if not row:
+                return False
+            due_ts, escalation_stage, old_status, guild_id, instructor_id, assignee_id, task_name = row
+            # 終了したタスクはエスカレーション対象から外し、完了取り消し時は続きの段階から再開
+            escalate_ts = next_escalation_ts(due_ts, escalation_stage) if status in OPEN_TASK_STATUSES else None
+            now_ts = int(time.time())
+            conn.execute(
+                "UPDATE tasks SET status = ?, updated_at = CURRENT_TIMESTAMP, updated_ts = ?, escalate_ts = ? WHERE id = ?",
+                (status, now_ts, escalate_ts, task_id)
+            )
+            if not notification or status == old_status:
+                return False
+            # サーバーの通知ポリシーで選ばれた宛先にだけ通知する
+            targets = guild_settings_cache.get(guild_id).notification_targets
+            payload = {'instructor_id': instructor_id, 'assignee_id': assignee_id, 'task_name': task_name,
+                       'message': notification, 'updated_ts': now_ts}
+            for target in targets:
+                kind = f"status_{target}"
+                enqueue_notification(conn, f"{kind}:{task_id}:{status}:{now_ts}", kind, guild_id, task_id, payload)
+            return bool(targets)
+        
+        return await db.write(_update)
+
+    @staticmethod
+    async def advance_recurrence(recurrence_id: int, expected_due_ts: int) -> Optional[tuple]:
+        """繰り返しの次回分を作成し、(タスクID, guild_id, instructor_id, assignee_id, task_name, 期日, message_id) を返す
+        
+        最新回の期日がexpected_due_tsでなければ（既に次回が作成済みなら）何もしない。
+        """
+        def _advance(conn):
+            row = conn.execute(
+                "SELECT guild_id, instructor_id, assignee_id, task_name, rule, anchor_ts, current_due_ts, "
+                "reminder_offsets, message_id, channel_id FROM task_recurrences WHERE id = ? AND active = 1",
+                (recurrence_id,)
+            ).fetchone()
+            if not row or row[6] != expected_due_ts:
+                return None
+            (guild_id, instructor_id, assignee_id, task_name, rule, anchor_ts, current_due_ts,
+             reminder_offsets, message_id, channel_id) = row
+            
+            # 停止中に過ぎた回はまとめて飛ばし、現在より後の回だけを作成する
+            tz = guild_tz(guild_id)
+            after = max(from_epoch(current_due_ts, tz), datetime.datetime.now(tz))
+            due_date = next_occurrence(parse_rrule(rule), after, from_epoch(anchor_ts, tz))
+            if due_date is None:
+                conn.execute("UPDATE task_recurrences SET active = 0 WHERE id = ?", (recurrence_id,))
+                return None
+            
+            task_id = DatabaseManager._insert_task(
+                conn, guild_id, instructor_id, assignee_id, task_name, due_date, message_id, channel_id,
+                decode_offsets(reminder_offsets), recurrence_id
+            )
+            enqueue_task_assigned(conn, task_id, guild_id, instructor_id, assignee_id, task_name,
+                                  to_epoch(due_date), message_id)
+            conn.execute(
+                "UPDATE task_recurrences SET current_due_ts = ? WHERE id = ?",
+                (to_epoch(due_date), recurrence_id)
+            )
+            return task_id, guild_id, instructor_id, assignee_id, task_name, due_date, message_id
+        
+        return await db.write(_advance)
+
+    @staticmethod
+    async def stop_recurrence(recurrence_id: int, guild_id: int) -> bool:
+        """繰り返しを停止（作成済みのタスクはそのまま）"""
+        def _stop(conn):
+            cursor = conn.execute(
+                "UPDATE task_recurrences SET active = 0 WHERE id = ? AND guild_id = ? AND active = 1",
+                (recurrence_id, guild_id)
+            )
+            return cursor.rowcount > 0
+        
+        return await db.write(_stop)
 
     @staticmethod
-    def add_instructor_if_not_exists(user_id: int, guild_id: int, target_users: list) -> bool:
+    async def advance_escalations(updates: List[tuple]):
+        """(到達した段階, 次のエスカレーション時刻, タスクID) のリストで段階を進める"""
+        await db.write(lambda conn: conn.executemany(
+            "UPDATE tasks SET escalation_stage = ?, escalate_ts = ? WHERE id = ?",
+            updates
+        ))
+
+    @staticmethod
+    async def add_instructor_if_not_exists(user_id: int, guild_id: int, target_users: list) -> bool:
         """指示者が存在しない場合のみ追加し、追加されたかどうかを返す"""
-        # 既存チェック
-        existing = DatabaseManager.execute_query(
-            "SELECT 1 FROM instructors WHERE user_id = ? AND guild_id = ?",
-            (user_id, guild_id)
-        )
+        def _add(conn):
+            # 既存チェックと追加を同一トランザクションで実行
+            existing = conn.execute(
+                "SELECT 1 FROM instructors WHERE user_id = ? AND guild_id = ?",
+                (user_id, guild_id)
+            ).fetchone()
+            
+            if existing:
+                return False  # 既に存在する
+            
+            # 新規追加
+            conn.execute(
+                "INSERT INTO instructors (user_id, guild_id) VALUES (?, ?)",
+                (user_id, guild_id)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO instructor_targets (guild_id, instructor_id, target_id) VALUES (?, ?, ?)",
+                [(guild_id, user_id, target_id) for target_id in target_users]
+            )
+            return True  # 新規追加された
         
-        if existing:
-            return False  # 既に存在する
+        was_added = await db.write(_add)
+        permission_cache.invalidate(guild_id, user_id)
+        return was_added
+
+    @staticmethod
+    async def add_instructor_targets(user_id: int, guild_id: int, target_ids: list) -> int:
+        """既存の指示者に指示対象を追加し、新たに追加された人数を返す"""
+        def _add(conn):
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO instructor_targets (guild_id, instructor_id, target_id) VALUES (?, ?, ?)",
+                [(guild_id, user_id, target_id) for target_id in target_ids]
+            )
+            return cursor.rowcount
         
-        # 新規追加
-        DatabaseManager.execute_query(
-            "INSERT INTO instructors (user_id, guild_id, target_users) VALUES (?, ?, ?)",
-            (user_id, guild_id, json.dumps(target_users))
-        )
-        return True  # 新規追加された
+        added = await db.write(_add)
+        permission_cache.invalidate(guild_id, user_id)
+        return added
+
+    @staticmethod
+    async def remove_instructor_targets(user_id: int, guild_id: int, target_ids: list) -> int:
+        """指示者の指示対象を削除し、削除された人数を返す"""
+        def _remove(conn):
+            cursor = conn.executemany(
+                "DELETE FROM instructor_targets WHERE guild_id = ? AND instructor_id = ? AND target_id = ?",
+                [(guild_id, user_id, target_id) for target_id in target_ids]
+            )
+            return cursor.rowcount
+        
+        removed = await db.write(_remove)
+        permission_cache.invalidate(guild_id, user_id)
+        return removed
+
+    @staticmethod
+    async def remove_instructor(user_id: int, guild_id: int):
+        """指示者を削除"""
+        def _remove(conn):
+            conn.execute(
+                "DELETE FROM instructors WHERE user_id = ? AND guild_id = ?",
+                (user_id, guild_id)
+            )
+            conn.execute(
+                "DELETE FROM instructor_targets WHERE guild_id = ? AND instructor_id = ?",
+                (guild_id, user_id)
+            )
+        
+        await db.write(_remove)
+        permission_cache.invalidate(guild_id, user_id)
 
     @staticmethod
-    def add_admin_if_not_exists(user_id: int, guild_id: int) -> bool:
+    async def add_admin_if_not_exists(user_id: int, guild_id: int) -> bool:
         """管理者が存在しない場合のみ追加し、追加されたかどうかを返す"""
-        # 既存チェック
-        existing = DatabaseManager.execute_query(
-            "SELECT 1 FROM admins WHERE user_id = ? AND guild_id = ?",
+        def _add(conn):
+            # 既存チェックと追加を同一トランザクションで実行
+            existing = conn.execute(
+                "SELECT 1 FROM admins WHERE user_id = ? AND guild_id = ?",
+                (user_id, guild_id)
+            ).fetchone()
+            
+            if existing:
+                return False  # 既に存在する
+            
+            # 新規追加
+            conn.execute(
+                "INSERT INTO admins (user_id, guild_id) VALUES (?, ?)",
+                (user_id, guild_id)
+            )
+            return True  # 新規追加された
+        
+        was_added = await db.write(_add)
+        permission_cache.invalidate(guild_id, user_id)
+        return was_added
+
+    @staticmethod
+    async def remove_admin(user_id: int, guild_id: int):
+        """管理者を削除"""
+        await DatabaseManager.execute_query(
+            "DELETE FROM admins WHERE user_id = ? AND guild_id = ?",
             (user_id, guild_id)
         )
+        permission_cache.invalidate(guild_id, user_id)
+
+    @staticmethod
+    async def schedule_reminder_jobs(task_id: int) -> List[tuple]:
+        """受託済みタスクのリマインダージョブを登録し、送信待ちの (job_id, fire_ts) を返す"""
+        def _schedule(conn):
+            row = conn.execute(
+                f"SELECT {SQL_TASK_DUE_TS}, tasks.status, tasks.reminder_offsets, guild_settings.reminder_offsets "
+                "FROM tasks LEFT JOIN guild_settings ON guild_settings.guild_id = tasks.guild_id WHERE tasks.id = ?",
+                (task_id,)
+            ).fetchone()
+            now_ts = int(time.time())
+            if not row or row[1] != 'accepted' or row[0] is None or row[0] <= now_ts:
+                return []
+            due_ts, _, task_offsets, guild_offsets = row
+            offsets = resolve_reminder_offsets(task_offsets, guild_offsets, due_ts - now_ts)
+            
+            # 設定から外れたオフセットの送信待ちジョブは削除
+            placeholders = ','.join('?' * len(offsets))
+            conn.execute(
+                f"DELETE FROM reminder_jobs WHERE task_id = ? AND state = 'scheduled' "
+                f"AND offset_seconds NOT IN ({placeholders})",
+                (task_id, *offsets)
+            )
+            # 送信済み・失敗済みのジョブは上書きしない（完了取り消し後の再送を防ぐ）
+            conn.executemany(
+                "INSERT INTO reminder_jobs (task_id, offset_seconds, fire_ts, updated_ts) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (task_id, offset_seconds) DO UPDATE SET "
+                "fire_ts = excluded.fire_ts, updated_ts = excluded.updated_ts WHERE state = 'scheduled'",
+                [(task_id, offset, due_ts - offset, now_ts) for offset in offsets]
+            )
+            return conn.execute(
+                "SELECT id, fire_ts FROM reminder_jobs WHERE task_id = ? AND state = 'scheduled'",
+                (task_id,)
+            ).fetchall()
+        
+        return await db.write(_schedule)
+
+    @staticmethod
+    async def get_guild_reminder_offsets(guild_id: int) -> Optional[List[int]]:
+        """サーバーのリマインダー設定を取得（未設定ならNone）"""
+        result = await DatabaseManager.fetch_query(
+            "SELECT reminder_offsets FROM guild_settings WHERE guild_id = ?",
+            (guild_id,)
+        )
+        return decode_offsets(result[0][0]) if result else None
+
+    @staticmethod
+    async def set_guild_reminder_offsets(guild_id: int, offsets: Optional[List[int]]):
+        """サーバーのリマインダー設定を保存（Noneで既定値に戻す）"""
+        await DatabaseManager.execute_query(
+            "INSERT INTO guild_settings (guild_id, reminder_offsets) VALUES (?, ?) "
+            "ON CONFLICT (guild_id) DO UPDATE SET reminder_offsets = excluded.reminder_offsets",
+            (guild_id, encode_offsets(offsets))
+        )
+
+    @staticmethod
+    async def set_guild_timezone(guild_id: int, timezone: Optional[str]):
+        """タイムゾーンを保存（NoneでDEFAULT_TIMEZONEに戻す）"""
+        def _set(conn):
+            conn.execute(
+                "INSERT INTO guild_settings (guild_id, timezone) VALUES (?, ?) "
+                "ON CONFLICT (guild_id) DO UPDATE SET timezone = excluded.timezone",
+                (guild_id, timezone)
+            )
+            return conn.execute(SQL_GUILD_SETTINGS_CACHED, (guild_id,)).fetchone()
         
-        if existing:
-            return False  # 既に存在する
+        guild_settings_cache.put(guild_id, *await db.write(_set))
+
+    @staticmethod
+    async def set_guild_quiet_hours(guild_id: int, quiet_start: Optional[int], quiet_end: Optional[int]):
+        """静音時間を保存（Noneで解除）"""
+        def _set(conn):
+            conn.execute(
+                "INSERT INTO guild_settings (guild_id, quiet_start, quiet_end) VALUES (?, ?, ?) "
+                "ON CONFLICT (guild_id) DO UPDATE SET quiet_start = excluded.quiet_start, quiet_end = excluded.quiet_end",
+                (guild_id, quiet_start, quiet_end)
+            )
+            return conn.execute(SQL_GUILD_SETTINGS_CACHED, (guild_id,)).fetchone()
         
-        # 新規追加
-        DatabaseManager.execute_query(
-            "INSERT INTO admins (user_id, guild_id) VALUES (?, ?)",
-            (user_id, guild_id)
+        guild_settings_cache.put(guild_id, *await db.write(_set))
+
+    @staticmethod
+    async def set_guild_notification_targets(guild_id: int, targets: Optional[List[str]]):
+        """状態変更の通知先を保存（Noneで既定値に戻す。空リストは通知しない）"""
+        def _set(conn):
+            conn.execute(
+                "INSERT INTO guild_settings (guild_id, notification_targets) VALUES (?, ?) "
+                "ON CONFLICT (guild_id) DO UPDATE SET notification_targets = excluded.notification_targets",
+                (guild_id, None if targets is None else ','.join(targets))
+            )
+            return conn.execute(SQL_GUILD_SETTINGS_CACHED, (guild_id,)).fetchone()
+        
+        guild_settings_cache.put(guild_id, *await db.write(_set))
+
+    @staticmethod
+    async def get_status_message(task_id: int, target: str) -> Optional[tuple]:
+        """(channel_id, message_id, thread_id, history) を返す"""
+        result = await db.fetch(
+            "SELECT channel_id, message_id, thread_id, history FROM task_status_messages WHERE task_id = ? AND target = ?",
+            (task_id, target)
         )
-        return True  # 新規追加された
+        return result[0] if result else None
 
     @staticmethod
-    def mark_reminder_sent(task_id: int):
-        """リマインダー送信フラグを設定"""
-        DatabaseManager.execute_query(
-            "UPDATE tasks SET reminder_sent = 1 WHERE id = ?",
-            (task_id,)
+    async def save_status_message(task_id: int, target: str, channel_id: int, message_id: int,
+                                  thread_id: Optional[int], history: str):
+        def _save(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO task_status_messages (task_id, target, channel_id, message_id, thread_id, history) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, target, channel_id, message_id, thread_id, history)
+            )
+        
+        await db.write(_save)
+
+    @staticmethod
+    async def claim_notifications(limit: int) -> List[tuple]:
+        """配送時刻を迎えた通知を取り出し、OUTBOX_LEASE_SECONDSの間は他のワーカーに渡さないようにする"""
+        def _claim(conn):
+            now_ts = int(time.time())
+            rows = conn.execute(SQL_OUTBOX_DUE, (now_ts, limit)).fetchall()
+            if rows:
+                placeholders = ','.join('?' * len(rows))
+                conn.execute(
+                    f"UPDATE notification_outbox SET next_attempt_ts = ? WHERE id IN ({placeholders})",
+                    (now_ts + OUTBOX_LEASE_SECONDS, *[row[0] for row in rows])
+                )
+            return rows
+        
+        return await db.write(_claim)
+
+    @staticmethod
+    async def renew_notification_leases(notification_ids: List[int]):
+        """配送中の通知のリースを延長（時間のかかる配送が他のワーカーに再送されないように）"""
+        def _renew(conn):
+            placeholders = ','.join('?' * len(notification_ids))
+            conn.execute(
+                f"UPDATE notification_outbox SET next_attempt_ts = ? WHERE state = 'pending' AND id IN ({placeholders})",
+                (int(time.time()) + OUTBOX_LEASE_SECONDS, *notification_ids)
+            )
+        
+        await db.write(_renew)
+
+    @staticmethod
+    async def record_notification_result(notification_id: int, state: str, error: Optional[str] = None,
+                                         next_attempt_ts: Optional[int] = None):
+        """配送結果を記録（state: sent / pending（再送待ち）/ dead）"""
+        def _record(conn):
+            conn.execute(
+                "UPDATE notification_outbox SET state = ?, attempts = attempts + 1, last_error = ?, "
+                "next_attempt_ts = COALESCE(?, next_attempt_ts), updated_ts = ? WHERE id = ?",
+                (state, error, next_attempt_ts, int(time.time()), notification_id)
+            )
+        
+        await db.write(_record)
+
+    @staticmethod
+    async def set_notification_channel(guild_id: int, user_id: int, channel_type: str, channel_id: int):
+        def _set(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO notification_channels (guild_id, user_id, channel_id, channel_type) VALUES (?, ?, ?, ?)",
+                (guild_id, user_id, channel_id, channel_type)
+            )
+        
+        await db.write(_set)
+
+    @staticmethod
+    async def delete_notification_channel(guild_id: int, user_id: int, channel_type: str):
+        def _delete(conn):
+            conn.execute(
+                "DELETE FROM notification_channels WHERE guild_id = ? AND user_id = ? AND channel_type = ?",
+                (guild_id, user_id, channel_type)
+            )
+        
+        await db.write(_delete)
+
+    @staticmethod
+    async def defer_reminder_job(job_id: int, fire_ts: int) -> bool:
+        """静音時間中のジョブを終了時刻まで後ろ倒し"""
+        def _defer(conn):
+            cursor = conn.execute(
+                "UPDATE reminder_jobs SET fire_ts = ?, deferred = 1, updated_ts = ? WHERE id = ? AND state = 'scheduled'",
+                (fire_ts, int(time.time()), job_id)
+            )
+            return cursor.rowcount > 0
+        
+        return await db.write(_defer)
+
+    @staticmethod
+    async def get_reminder_digest_settings(guild_id: int, user_id: int) -> tuple:
+        """(サーバー設定, ユーザー設定) を返す（未設定はNone）"""
+        result = await DatabaseManager.fetch_query(
+            "SELECT (SELECT reminder_digest FROM guild_settings WHERE guild_id = ?), "
+            "(SELECT reminder_digest FROM user_settings WHERE guild_id = ? AND user_id = ?)",
+            (guild_id, guild_id, user_id)
+        )
+        guild_value, user_value = result[0]
+        return (
+            None if guild_value is None else bool(guild_value),
+            None if user_value is None else bool(user_value)
+        )
+
+    @staticmethod
+    async def set_guild_reminder_digest(guild_id: int, enabled: Optional[bool]):
+        await DatabaseManager.execute_query(
+            "INSERT INTO guild_settings (guild_id, reminder_digest) VALUES (?, ?) "
+            "ON CONFLICT (guild_id) DO UPDATE SET reminder_digest = excluded.reminder_digest",
+            (guild_id, enabled)
         )
 
+    @staticmethod
+    async def set_user_reminder_digest(guild_id: int, user_id: int, enabled: Optional[bool]):
+        await DatabaseManager.execute_query(
+            "INSERT INTO user_settings (guild_id, user_id, reminder_digest) VALUES (?, ?, ?) "
+            "ON CONFLICT (guild_id, user_id) DO UPDATE SET reminder_digest = excluded.reminder_digest",
+            (guild_id, user_id, enabled)
+        )
+
+    @staticmethod
+    async def snooze_reminder_job(job_id: int, fire_ts: int) -> bool:
+        """送信済みのリマインダージョブを再度スケジュール（タスクが受託中の場合のみ）"""
+        def _snooze(conn):
+            cursor = conn.execute(
+                "UPDATE reminder_jobs SET state = 'scheduled', fire_ts = ?, updated_ts = ? "
+                "WHERE id = ? AND EXISTS (SELECT 1 FROM tasks WHERE tasks.id = reminder_jobs.task_id AND tasks.status = 'accepted')",
+                (fire_ts, int(time.time()), job_id)
+            )
+            return cursor.rowcount > 0
+        
+        return await db.write(_snooze)
+
+    @staticmethod
+    async def cancel_reminder_jobs(task_id: int) -> List[int]:
+        """送信待ちのリマインダージョブを削除し、削除したjob_idを返す"""
+        def _cancel(conn):
+            job_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM reminder_jobs WHERE task_id = ? AND state = 'scheduled'",
+                (task_id,)
+            )]
+            conn.execute("DELETE FROM reminder_jobs WHERE task_id = ? AND state = 'scheduled'", (task_id,))
+            return job_ids
+        
+        return await db.write(_cancel)
+
+    @staticmethod
+    async def mark_reminder_jobs(job_ids: List[int], state: str, error: Optional[str] = None):
+        """リマインダージョブの結果（sent / failed / missed）を記録"""
+        if not job_ids:
+            return
+        def _mark(conn):
+            placeholders = ','.join('?' * len(job_ids))
+            conn.execute(
+                f"UPDATE reminder_jobs SET state = ?, attempts = attempts + 1, last_error = ?, updated_ts = ?, deferred = 0 "
+                f"WHERE id IN ({placeholders})",
+                (state, error, int(time.time()), *job_ids)
+            )
+            if state == 'sent':
+                # 旧バージョン互換のためtasks側のフラグも更新
+                conn.execute(
+                    f"UPDATE tasks SET reminder_sent = 1 WHERE id IN "
+                    f"(SELECT task_id FROM reminder_jobs WHERE id IN ({placeholders}))",
+                    job_ids
+                )
+        
+        await db.write(_mark)
+
+# リマインダーのオフセット（期日の何秒前か）
+OFFSET_UNITS = {'日': 86400, '時間': 3600, '分': 60}
+
+def parse_reminder_offsets(text: str) -> Optional[List[int]]:
+    """『1日 3時間 15分』『1日/15分』などを秒数のリストに変換（『なし』は空リスト、不正ならNone）"""
+    text = text.strip()
+    if text in ('なし', 'off'):
+        return []
+    tokens = [t for t in re.split(r'[\s/、]+', text) if t]
+    offsets = set()
+    for token in tokens:
+        match = re.fullmatch(r'(\d+)(日|時間|分)前?', token)
+        if not match:
+            return None
+        seconds = int(match.group(1)) * OFFSET_UNITS[match.group(2)]
+        if not 0 < seconds <= REMINDER_MAX_OFFSET_SECONDS:
+            return None
+        offsets.add(seconds)
+    if not offsets or len(offsets) > REMINDER_MAX_OFFSETS:
+        return None
+    return sorted(offsets, reverse=True)
+
+def format_offsets(offsets: List[int]) -> str:
+    """秒数のリストを『1日前、3時間前』の形式で表示"""
+    if not offsets:
+        return "なし"
+    labels = []
+    for seconds in offsets:
+        for unit, size in OFFSET_UNITS.items():
+            if seconds % size == 0:
+                labels.append(f"{seconds // size}{unit}前")
+                break
+    return "、".join(labels)
+
+def parse_switch(text: str):
+    """『オン』『オフ』『既定』をTrue / False / Noneに変換（不正な値はEllipsis）"""
+    text = text.strip().lower()
+    if text in ('オン', 'on'):
+        return True
+    if text in ('オフ', 'off'):
+        return False
+    if text in ('既定', 'default'):
+        return None
+    return ...
+
+def format_switch(value: Optional[bool], default: bool) -> str:
+    if value is None:
+        return f"{'オン' if default else 'オフ'}（既定）"
+    return 'オン' if value else 'オフ'
+
+def parse_quiet_hours(text: str):
+    """『22:00-7:00』を (開始, 終了)（0時からの分）に変換（『なし』はNone、不正な値はEllipsis）"""
+    text = text.strip()
+    if text in ('なし', 'off', 'none'):
+        return None
+    match = re.fullmatch(r'(\d{1,2}):(\d{2})\s*[-~〜]\s*(\d{1,2}):(\d{2})', text)
+    if not match:
+        return ...
+    start_hour, start_minute, end_hour, end_minute = (int(g) for g in match.groups())
+    if start_hour > 23 or end_hour > 23 or start_minute > 59 or end_minute > 59:
+        return ...
+    start, end = start_hour * 60 + start_minute, end_hour * 60 + end_minute
+    if start == end:
+        return ...
+    return start, end
+
+def format_quiet_hours(quiet_start: Optional[int], quiet_end: Optional[int]) -> str:
+    if quiet_start is None or quiet_end is None:
+        return 'なし'
+    return f"{quiet_start // 60}:{quiet_start % 60:02d}-{quiet_end // 60}:{quiet_end % 60:02d}"
+
+def parse_notification_targets(values) -> Optional[List[str]]:
+    """『タスク管理 DM』を通知先のリストに変換（『なし』は空リスト、不正な値はNone）"""
+    if list(values) in (['なし'], ['none']):
+        return []
+    names = {name.lower(): target for target, name in NOTIFICATION_TARGETS.items()}
+    targets = []
+    for value in values:
+        target = names.get(value.lower()) or (value.lower() if value.lower() in NOTIFICATION_TARGETS else None)
+        if target is None:
+            return None
+        if target not in targets:
+            targets.append(target)
+    return targets or None
+
+def format_notification_targets(targets) -> str:
+    return ' / '.join(NOTIFICATION_TARGETS[target] for target in targets) if targets else 'なし'
+
+def encode_offsets(offsets: Optional[List[int]]) -> Optional[str]:
+    return None if offsets is None else ','.join(str(o) for o in offsets)
+
+def decode_offsets(value: Optional[str]) -> Optional[List[int]]:
+    if value is None:
+        return None
+    return [int(o) for o in value.split(',') if o]
+
+def resolve_reminder_offsets(task_offsets: Optional[str], guild_offsets: Optional[str], remaining: int) -> List[int]:
+    """タスク設定 → サーバー設定 → 既定値の順でオフセットを決定
+    
+    送信時刻を既に過ぎたオフセットは、最も期日に近いもの1件だけを残す（受託直後にまとめて届かないように）
+    """
+    offsets = decode_offsets(task_offsets)
+    if offsets is None:
+        offsets = decode_offsets(guild_offsets)
+    if offsets is None:
+        offsets = list(REMINDER_DEFAULT_OFFSETS)
+    
+    upcoming = [o for o in offsets if o < remaining]
+    passed = [o for o in offsets if o >= remaining]
+    if passed:
+        upcoming.append(min(passed))
+    return upcoming
+
+def next_escalation_ts(due_ts: Optional[int], stage: int) -> Optional[int]:
+    """stage番目のエスカレーションを行う時刻（全段階が終わっていればNone）"""
+    if due_ts is None or stage >= len(OVERDUE_ESCALATION_DELAYS):
+        return None
+    return due_ts + OVERDUE_ESCALATION_DELAYS[stage]
+
+def enqueue_notification(conn: sqlite3.Connection, key: str, kind: str, guild_id: int,
+                         task_id: Optional[int], payload: Dict[str, Any]):
+    """通知をアウトボックスに追加（呼び出し元のトランザクション内で実行。同じkeyの通知は1回だけ）"""
+    now_ts = int(time.time())
+    conn.execute(
+        "INSERT OR IGNORE INTO notification_outbox (idempotency_key, kind, guild_id, task_id, payload, "
+        "next_attempt_ts, created_ts, updated_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (key, kind, guild_id, task_id, json.dumps(payload, ensure_ascii=False), now_ts, now_ts, now_ts)
+    )
+
+def task_assigned_key(task_id: int) -> str:
+    return f"task_assigned:{task_id}"
+
+def enqueue_task_assigned(conn: sqlite3.Connection, task_id: int, guild_id: int, instructor_id: int,
+                          assignee_id: int, task_name: str, due_ts: int, message_id: int):
+    enqueue_notification(conn, task_assigned_key(task_id), 'task_assigned', guild_id, task_id, {
+        'instructor_id': instructor_id, 'assignee_id': assignee_id, 'task_name': task_name,
+        'due_ts': due_ts, 'message_id': message_id,
+    })
+
+# 繰り返しルール（RRULEのFREQ/INTERVAL/BYDAY/BYMONTHDAY/BYHOUR/BYMINUTEに対応）
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+WEEKDAY_KANJI = '月火水木金土日'
+
+def parse_rrule(text: str) -> Optional[Dict[str, Any]]:
+    """『FREQ=WEEKLY;BYDAY=MO,FR;BYHOUR=18』形式を解析"""
+    text = text.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    rule = {'FREQ': None, 'INTERVAL': 1, 'BYDAY': [], 'BYMONTHDAY': None, 'BYHOUR': None, 'BYMINUTE': None}
+    try:
+        for part in filter(None, text.upper().split(';')):
+            key, value = part.split('=', 1)
+            if key == 'FREQ' and value in ('DAILY', 'WEEKLY', 'MONTHLY'):
+                rule['FREQ'] = value
+            elif key == 'INTERVAL':
+                rule['INTERVAL'] = int(value)
+            elif key == 'BYDAY':
+                rule['BYDAY'] = [WEEKDAY_CODES.index(day) for day in value.split(',')]
+            elif key == 'BYMONTHDAY':
+                rule['BYMONTHDAY'] = int(value)
+            elif key == 'BYHOUR':
+                rule['BYHOUR'] = int(value)
+            elif key == 'BYMINUTE':
+                rule['BYMINUTE'] = int(value)
+            else:
+                return None
+    except ValueError:
+        return None
+    
+    # 時刻の省略時は23:59、時だけ指定された場合は0分
+    if rule['BYMINUTE'] is None:
+        rule['BYMINUTE'] = 59 if rule['BYHOUR'] is None else 0
+    if rule['BYHOUR'] is None:
+        rule['BYHOUR'] = 23
+    if (rule['FREQ'] is None or not 1 <= rule['INTERVAL'] <= RECURRENCE_MAX_INTERVAL
+            or not 0 <= rule['BYHOUR'] <= 23 or not 0 <= rule['BYMINUTE'] <= 59
+            or rule['BYMONTHDAY'] not in (None, -1, *range(1, 32))):
+        return None
+    if rule['FREQ'] == 'MONTHLY' and rule['BYMONTHDAY'] is None:
+        return None
+    return rule
+
+def parse_recurrence(text: str) -> Optional[Dict[str, Any]]:
+    """『毎日』『毎週金曜 18:00』『毎月末』『平日 9:00』『2週間ごとの月曜』やRRULE形式を解析（繰り返しでなければNone）"""
+    text = text.strip()
+    if text.upper().startswith(('RRULE:', 'FREQ=')):
+        return parse_rrule(text)
+    
+    hour, minute = 23, 59  # parse_dateと同じく時刻省略時は23:59
+    time_match = re.search(r'\s*(\d{1,2}):(\d{2})$', text)
+    if time_match:
+        hour, minute = int(time_match.group(1)), int(time_match.group(2))
+        text = text[:time_match.start()]
+    
+    def weekdays(chars: str) -> List[int]:
+        return sorted({WEEKDAY_KANJI.index(c) for c in chars if c in WEEKDAY_KANJI})
+    
+    daily_match = re.fullmatch(r'(\d+)日ごと', text)
+    weekly_match = re.fullmatch(r'(?:毎週|(\d+)週間?ごとの?)([月火水木金土日・、]+?)(?:曜日?)?', text)
+    monthly_match = re.fullmatch(r'毎月(\d{1,2})日', text)
+    
+    if text == '毎日':
+        rule = 'FREQ=DAILY'
+    elif daily_match:
+        rule = f'FREQ=DAILY;INTERVAL={daily_match.group(1)}'
+    elif text in ('平日', '毎平日'):
+        rule = 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR'
+    elif weekly_match:
+        days = weekdays(weekly_match.group(2))
+        if not days:
+            return None
+        rule = f"FREQ=WEEKLY;INTERVAL={weekly_match.group(1) or 1};BYDAY={','.join(WEEKDAY_CODES[d] for d in days)}"
+    elif text in ('毎月末', '毎月末日'):
+        rule = 'FREQ=MONTHLY;BYMONTHDAY=-1'
+    elif monthly_match:
+        rule = f'FREQ=MONTHLY;BYMONTHDAY={monthly_match.group(1)}'
+    else:
+        return None
+    return parse_rrule(f'{rule};BYHOUR={hour};BYMINUTE={minute}')
+
+def format_rrule(rule: Dict[str, Any]) -> str:
+    parts = [f"FREQ={rule['FREQ']}", f"INTERVAL={rule['INTERVAL']}"]
+    if rule['BYDAY']:
+        parts.append(f"BYDAY={','.join(WEEKDAY_CODES[d] for d in rule['BYDAY'])}")
+    if rule['BYMONTHDAY'] is not None:
+        parts.append(f"BYMONTHDAY={rule['BYMONTHDAY']}")
+    parts.append(f"BYHOUR={rule['BYHOUR']};BYMINUTE={rule['BYMINUTE']}")
+    return ';'.join(parts)
+
+def describe_recurrence(rule: Dict[str, Any]) -> str:
+    """一覧表示用の説明（例: 毎週金曜 18:00）"""
+    interval = rule['INTERVAL']
+    if rule['FREQ'] == 'DAILY':
+        text = '毎日' if interval == 1 else f'{interval}日ごと'
+    elif rule['FREQ'] == 'WEEKLY':
+        days = '・'.join(WEEKDAY_KANJI[d] for d in rule['BYDAY']) if rule['BYDAY'] else ''
+        text = (f'毎週{days}曜' if interval == 1 else f'{interval}週間ごとの{days}曜') if days else f'{interval}週間ごと'
+    else:
+        day = '末' if rule['BYMONTHDAY'] == -1 else f"{rule['BYMONTHDAY']}日"
+        text = f'毎月{day}' if interval == 1 else f'{interval}ヶ月ごとの{day}'
+    return f"{text} {rule['BYHOUR']:02d}:{rule['BYMINUTE']:02d}"
+
+def next_occurrence(rule: Dict[str, Any], after: datetime.datetime,
+                    anchor: Optional[datetime.datetime] = None) -> Optional[datetime.datetime]:
+    """afterより後の最初の回を返す（anchorは初回。INTERVALの起点になる。時刻はafterのタイムゾーンで解釈）"""
+    interval = rule['INTERVAL']
+    for offset in range(366 * interval + 32):
+        day = after.date() + datetime.timedelta(days=offset)
+        candidate = datetime.datetime.combine(day, datetime.time(rule['BYHOUR'], rule['BYMINUTE']), after.tzinfo)
+        if candidate <= after:
+            continue
+        
+        if rule['FREQ'] == 'DAILY':
+            if anchor and (day - anchor.date()).days % interval:
+                continue
+        elif rule['FREQ'] == 'WEEKLY':
+            if day.weekday() not in (rule['BYDAY'] or [(anchor or after).weekday()]):
+                continue
+            if anchor:
+                anchor_monday = anchor.date() - datetime.timedelta(days=anchor.weekday())
+                if ((day - anchor_monday).days // 7) % interval:
+                    continue
+        else:
+            last_day = ((day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)).day
+            # 存在しない日（31日など）は月末として扱う
+            target = last_day if rule['BYMONTHDAY'] == -1 else min(rule['BYMONTHDAY'], last_day)
+            if day.day != target:
+                continue
+            if anchor and ((day.year - anchor.year) * 12 + day.month - anchor.month) % interval:
+                continue
+        return candidate
+    return None
+
 # 日付解析関数（時間指定対応版）
-def parse_date(date_str: str) -> Optional[datetime.datetime]:
-    now = datetime.datetime.now()
+def parse_date(date_str: str, tz: Optional[datetime.tzinfo] = None) -> Optional[datetime.datetime]:
+    """日付文字列をtz（省略時はDEFAULT_TIMEZONE）の日時として解釈"""
+    tz = tz or DEFAULT_TZ
+    now = datetime.datetime.now(tz)
     
     # 時間部分を分離
     time_part = None
@@ -398,16 +2404,16 @@ def parse_date(date_str: str) -> Optional[datetime.datetime]:
                     if len(match.groups()) == 2:
                         # MM/DD形式の場合
                         if "/" in pattern:
-                            base_date = datetime.datetime.strptime(f"{now.year}/{date_part}", "%Y/%m/%d")
+                            base_date = datetime.datetime.strptime(f"{now.year}/{date_part}", "%Y/%m/%d").replace(tzinfo=tz)
                         elif "-" in pattern:
-                            base_date = datetime.datetime.strptime(f"{now.year}-{date_part}", "%Y-%m-%d")
+                            base_date = datetime.datetime.strptime(f"{now.year}-{date_part}", "%Y-%m-%d").replace(tzinfo=tz)
                         else:
-                            base_date = datetime.datetime.strptime(f"{now.year}年{date_part}", "%Y年%m月%d日")
+                            base_date = datetime.datetime.strptime(f"{now.year}年{date_part}", "%Y年%m月%d日").replace(tzinfo=tz)
                         
                         if base_date < now.replace(hour=0, minute=0, second=0, microsecond=0):
                             base_date = base_date.replace(year=now.year + 1)
                     else:
-                        base_date = datetime.datetime.strptime(date_part, format_str)
+                        base_date = datetime.datetime.strptime(date_part, format_str).replace(tzinfo=tz)
                     break
                 except ValueError:
                     continue
@@ -473,65 +2479,25 @@ class TaskView(discord.ui.View):
             ))
     
     # 元のボタンメソッドは削除し、interaction処理は別途実装
-    
-    async def send_notification(self, guild, message, user, assignee_id=None):
-        """指示者に完了通知を送信"""
-        try:
-            # 完了者のIDを取得
-            if assignee_id is None:
-                assignee_id = self.assignee_id
-            
-            # 1. タスク管理チャンネルに通知
-            task_channel = discord.utils.get(guild.channels, name="タスク管理")
-            if task_channel and isinstance(task_channel, discord.TextChannel):
-                embed = discord.Embed(
-                    title="🎉 タスク完了通知",
-                    description=f"{user.mention} {message}",
-                    color=discord.Color.green(),
-                    timestamp=datetime.datetime.now()
-                )
-                embed.add_field(name="完了者", value=f"<@{assignee_id}>", inline=True)
-                embed.add_field(name="タスクID", value=f"#{self.task_id}", inline=True)
-                await task_channel.send(embed=embed)
-                logger.info(f"タスク管理チャンネルに完了通知を送信: {task_channel.name}")
-            
-            # 2. 指示者の個人チャンネルにも通知
-            personal_channel_name = f"{user.display_name}のタスク"
-            personal_channel = discord.utils.get(guild.channels, name=personal_channel_name)
-            if personal_channel and isinstance(personal_channel, discord.TextChannel):
-                embed = discord.Embed(
-                    title="🎉 タスク完了",
-                    description=f"あなたが指示したタスクが完了されました！",
-                    color=discord.Color.green(),
-                    timestamp=datetime.datetime.now()
-                )
-                embed.add_field(name="タスク", value=message, inline=False)
-                embed.add_field(name="完了者", value=f"<@{assignee_id}>", inline=True)
-                embed.add_field(name="タスクID", value=f"#{self.task_id}", inline=True)
-                await personal_channel.send(embed=embed)
-                logger.info(f"個人チャンネルに完了通知を送信: {personal_channel.name}")
-            
-            # 3. 指示者にDM通知（オプション）
-            try:
-                embed = discord.Embed(
-                    title="🎉 タスク完了通知",
-                    description=f"あなたが指示したタスクが完了されました！",
-                    color=discord.Color.green(),
-                    timestamp=datetime.datetime.now()
-                )
-                embed.add_field(name="タスク", value=message, inline=False)
-                embed.add_field(name="完了者", value=f"<@{assignee_id}>", inline=True)
-                embed.add_field(name="タスクID", value=f"#{self.task_id}", inline=True)
-                await user.send(embed=embed)
-                logger.info(f"指示者にDMで完了通知を送信: {user.display_name}")
-            except discord.Forbidden:
-                logger.info(f"指示者 {user.display_name} のDMが無効です")
-            except Exception as dm_error:
-                logger.error(f"DM送信エラー: {dm_error}")
-                
-        except Exception as e:
-            logger.error(f"通知送信中にエラーが発生: {e}")
-            raise
+
+# リマインダーのスヌーズボタン（押下はon_interactionで処理）
+class ReminderView(discord.ui.View):
+    def __init__(self, job_id: int):
+        super().__init__(timeout=None)
+        for action, (label, _) in SNOOZE_ACTIONS.items():
+            self.add_item(discord.ui.Button(
+                label=f"💤 {label}",
+                style=discord.ButtonStyle.secondary,
+                custom_id=f"{action}_{job_id}"
+            ))
+
+def snooze_until(action: str, now: datetime.datetime) -> datetime.datetime:
+    """スヌーズ後の再通知日時"""
+    _, seconds = SNOOZE_ACTIONS[action]
+    if seconds is not None:
+        return now + datetime.timedelta(seconds=seconds)
+    tomorrow = now + datetime.timedelta(days=1)
+    return tomorrow.replace(hour=SNOOZE_MORNING_HOUR, minute=0, second=0, microsecond=0)
 
 # 完了取り消しビューは削除（TaskViewに統合）
 
@@ -550,23 +2516,32 @@ async def setup_persistent_views():
         if not custom_id:
             return
         
-        # カスタムIDからアクションとタスクIDを分離
+        # カスタムIDからアクションと対象ID（タスクID、スヌーズはリマインダージョブID）を分離
         parts = custom_id.split('_')
         if len(parts) < 3:
             return
         
-        action = '_'.join(parts[:-1])  # "accept_task", "complete_task" など
+        action = '_'.join(parts[:-1])  # "accept_task", "complete_task", "snooze_1h" など
         try:
             task_id = int(parts[-1])
         except ValueError:
             return
         
+        if action in SNOOZE_ACTIONS:
+            try:
+                await handle_snooze_action(interaction, action, task_id)
+            except Exception as e:
+                logger.error(f"Error handling snooze interaction: {e}")
+                if not interaction.response.is_done():
+                    await interaction.response.send_message("❌ エラーが発生しました。", ephemeral=True)
+            return
+        
         if action not in ['accept_task', 'decline_task', 'complete_task', 'abandon_task', 'undo_completion']:
             return
         
         try:
             # データベースからタスク情報を取得
-            task_data = DatabaseManager.execute_query(
+            task_data = await DatabaseManager.fetch_query(
                 "SELECT assignee_id, instructor_id, status FROM tasks WHERE id = ?",
                 (task_id,)
             )
@@ -595,6 +2570,39 @@ async def setup_persistent_views():
             except:
                 pass
 
+async def handle_snooze_action(interaction, action, job_id):
+    """リマインダーをスヌーズ（タスク自体は変更せず、リマインダージョブだけを再スケジュール）"""
+    result = await DatabaseManager.fetch_query(
+        "SELECT tasks.assignee_id, tasks.status, tasks.guild_id FROM reminder_jobs JOIN tasks ON tasks.id = reminder_jobs.task_id "
+        "WHERE reminder_jobs.id = ?",
+        (job_id,)
+    )
+    if not result:
+        await interaction.response.send_message("❌ リマインダーが見つかりません。", ephemeral=True)
+        return
+    
+    assignee_id, status, guild_id = result[0]
+    if interaction.user.id != assignee_id:
+        await interaction.response.send_message("❌ このタスクの担当者ではありません。", ephemeral=True)
+        return
+    if status != 'accepted':
+        await interaction.response.send_message("ℹ️ このタスクは既に終了しています。", ephemeral=True)
+        return
+    
+    fire_at = snooze_until(action, datetime.datetime.now(guild_tz(guild_id)))
+    fire_ts = to_epoch(fire_at)
+    if not await DatabaseManager.snooze_reminder_job(job_id, fire_ts):
+        await interaction.response.send_message("ℹ️ このタスクは既に終了しています。", ephemeral=True)
+        return
+    reminder_scheduler.schedule(job_id, fire_ts)
+    
+    embed = interaction.message.embeds[0] if interaction.message.embeds else None
+    if embed:
+        embed.set_footer(text=f"💤 {fire_at.strftime('%m/%d %H:%M')} に再通知します")
+        await interaction.response.edit_message(embed=embed, view=None)
+    else:
+        await interaction.response.edit_message(view=None)
+
 async def handle_task_action(interaction, action, task_id, assignee_id, instructor_id, current_status):
     """タスクアクションの処理"""
     embed = interaction.message.embeds[0] if interaction.message.embeds else None
@@ -604,8 +2612,10 @@ async def handle_task_action(interaction, action, task_id, assignee_id, instruct
     
     try:
         if action == "accept_task":
-            # 受託処理
-            DatabaseManager.update_task_status(task_id, "accepted")
+            # 受託処理（状態の更新と指示者への通知を同じトランザクションで記録し、通知はアウトボックスから配送）
+            await DatabaseManager.update_task_status(task_id, "accepted", "✅ 受託")
+            notification_outbox.wake()
+            await reminder_scheduler.schedule_task(task_id)
             
             # Embedを更新
             embed.color = discord.Color.blue()
@@ -619,17 +2629,12 @@ async def handle_task_action(interaction, action, task_id, assignee_id, instruct
             view = TaskView(task_id, assignee_id, instructor_id, "accepted")
             
             await interaction.response.edit_message(embed=embed, view=view)
-            
-            # 通知送信
-            guild = interaction.guild
-            if guild:
-                instructor = guild.get_member(instructor_id)
-                if instructor:
-                    await send_notification_to_instructor(guild, instructor, f"✅ 受託", assignee_id, task_id)
         
         elif action == "decline_task":
             # 辞退処理
-            DatabaseManager.update_task_status(task_id, "declined")
+            await DatabaseManager.update_task_status(task_id, "declined", "❌ 辞退")
+            notification_outbox.wake()
+            await reminder_scheduler.cancel_task(task_id)
             
             embed.color = discord.Color.red()
             for i, field in enumerate(embed.fields):
@@ -639,17 +2644,14 @@ async def handle_task_action(interaction, action, task_id, assignee_id, instruct
             
             # ボタンを削除
             await interaction.response.edit_message(embed=embed, view=None)
-            
-            # 通知送信
-            guild = interaction.guild
-            if guild:
-                instructor = guild.get_member(instructor_id)
-                if instructor:
-                    await send_notification_to_instructor(guild, instructor, f"❌ 辞退", assignee_id, task_id)
         
         elif action == "complete_task":
             # 完了処理
-            DatabaseManager.update_task_status(task_id, "completed")
+            await DatabaseManager.update_task_status(task_id, "completed", "🎉 完了")
+            notification_outbox.wake()
+            await reminder_scheduler.cancel_task(task_id)
+            # 繰り返しタスクは次回分を作成
+            spawn_background(create_next_occurrence_for(task_id))
             
             embed.color = discord.Color.green()
             for i, field in enumerate(embed.fields):
@@ -661,17 +2663,12 @@ async def handle_task_action(interaction, action, task_id, assignee_id, instruct
             view = TaskView(task_id, assignee_id, instructor_id, "completed")
             
             await interaction.response.edit_message(embed=embed, view=view)
-            
-            # 完了通知送信
-            guild = interaction.guild
-            if guild:
-                instructor = guild.get_member(instructor_id)
-                if instructor:
-                    await send_notification_to_instructor(guild, instructor, f"🎉 完了", assignee_id, task_id)
         
         elif action == "abandon_task":
             # 問題発生処理
-            DatabaseManager.update_task_status(task_id, "abandoned")
+            await DatabaseManager.update_task_status(task_id, "abandoned", "⚠️ 問題発生")
+            notification_outbox.wake()
+            await reminder_scheduler.cancel_task(task_id)
             
             embed.color = discord.Color.dark_red()
             for i, field in enumerate(embed.fields):
@@ -680,17 +2677,12 @@ async def handle_task_action(interaction, action, task_id, assignee_id, instruct
                     break
             
             await interaction.response.edit_message(embed=embed, view=None)
-            
-            # 通知送信
-            guild = interaction.guild
-            if guild:
-                instructor = guild.get_member(instructor_id)
-                if instructor:
-                    await send_notification_to_instructor(guild, instructor, f"⚠️ 問題発生", assignee_id, task_id)
         
         elif action == "undo_completion":
             # 完了取り消し処理
-            DatabaseManager.update_task_status(task_id, "accepted")
+            await DatabaseManager.update_task_status(task_id, "accepted", "↩️ 完了取り消し")
+            notification_outbox.wake()
+            await reminder_scheduler.schedule_task(task_id)
             
             embed.color = discord.Color.blue()
             for i, field in enumerate(embed.fields):
@@ -711,158 +2703,167 @@ async def handle_task_action(interaction, action, task_id, assignee_id, instruct
         else:
             await interaction.followup.send("❌ エラーが発生しました。", ephemeral=True)
 
-async def send_notification_to_instructor(guild, instructor, message, assignee_id, task_id):
-    """指示者に通知を送信"""
-    try:
-        # 1. タスク管理チャンネルに通知（スレッド作成）
-        task_channel = discord.utils.get(guild.channels, name="タスク管理")
-        if task_channel and isinstance(task_channel, discord.TextChannel):
-            # メインメッセージ（シンプル）
-            main_embed = discord.Embed(
-                title=message,
-                color=discord.Color.blue()
-            )
-            main_message = await task_channel.send(embed=main_embed)
-            
-            # スレッドを作成
-            thread_name = f"📋 タスク状況 - {message}"
-            thread = await main_message.create_thread(
-                name=thread_name, 
-                auto_archive_duration=60,
-                reason="タスク状況詳細"
-            )
-            
-            # スレッドに詳細情報を送信（指示者、状態、作成日時のみ）
-            detail_embed = discord.Embed(
-                title="📋 詳細情報",
-                color=discord.Color.blue()
-            )
-            detail_embed.add_field(name="指示者", value=instructor.mention, inline=True)
-            detail_embed.add_field(name="状態", value=message, inline=True)
-            detail_embed.add_field(name="更新日時", value=datetime.datetime.now().strftime("%Y/%m/%d %H:%M"), inline=True)
-            
-            await thread.send(embed=detail_embed)
-            
-            # スレッドに適切なユーザーを招待（レート制限対策）
+TASK_STATUS_LABELS = {
+    'pending': '⏳ 未受託',
+    'accepted': '✅ 受託済み',
+    'completed': '🎉 完了',
+    'declined': '❌ 辞退',
+    'abandoned': '⚠️ 問題発生',
+}
+
+def status_color(status: str):
+    colors = {
+        'accepted': discord.Color.blue,
+        'completed': discord.Color.green,
+        'declined': discord.Color.red,
+        'abandoned': discord.Color.dark_red,
+    }
+    return colors.get(status, discord.Color.gold)()
+
+class KeyedLock:
+    """キーごとのasyncio.Lock（使われなくなったキーは削除）"""
+    
+    def __init__(self):
+        self._locks: Dict[Any, list] = {}  # key -> [Lock, 利用中の数]
+    
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+# 同じタスクの状態メッセージを複数のワーカーが同時に作成しないようにする
+status_message_locks = KeyedLock()
+
+async def delete_status_thread_if_completed(task_id: int, thread, delay_seconds):
+    """指定時間後もタスクが完了のままなら状態メッセージのスレッドを削除（完了取り消し時は残す）"""
+    await asyncio.sleep(delay_seconds)
+    result = await DatabaseManager.fetch_query("SELECT status FROM tasks WHERE id = ?", (task_id,))
+    if result and result[0][0] == 'completed':
+        await delete_thread_after_delay(thread, 0)
+
+async def update_status_message(guild, channel, target, instructor, task_id, payload, thread_name, reason):
+    """タスクの状態メッセージを更新（初回だけメッセージとスレッドを作成し、以降は同じメッセージを編集）"""
+    async with status_message_locks.hold((task_id, target)):
+        route = ('notifications', guild.id)
+        row = await DatabaseManager.get_status_message(task_id, target)
+        result = await DatabaseManager.fetch_query("SELECT status FROM tasks WHERE id = ?", (task_id,))
+        status = result[0][0] if result else None
+        
+        # 履歴に今回の変更を追加し、Embedには最新の状態を表示する（配送順が前後しても時刻順・現在の状態になる）
+        tz = guild_tz(guild.id)
+        updated_ts = payload.get('updated_ts') or int(time.time())
+        # 同じ通知の再送で履歴が重複しないよう、(時刻, 内容) の組で重複を除く
+        entries = sorted({tuple(entry) for entry in (json.loads(row[3]) if row else [])} | {(updated_ts, payload['message'])})
+        entries = entries[-STATUS_HISTORY_LINES:]
+        history = json.dumps(entries, ensure_ascii=False)
+        
+        embed = discord.Embed(
+            title=f"📋 {payload.get('task_name') or f'タスク #{task_id}'}",
+            color=status_color(status)
+        )
+        embed.add_field(name="状態", value=TASK_STATUS_LABELS.get(status, payload['message']), inline=True)
+        embed.add_field(name="担当者", value=f"<@{payload['assignee_id']}>", inline=True)
+        embed.add_field(name="指示者", value=instructor.mention, inline=True)
+        embed.add_field(
+            name="履歴",
+            value="\n".join(f"{from_epoch(ts, tz).strftime('%m/%d %H:%M')} {message}" for ts, message in entries),
+            inline=False
+        )
+        embed.set_footer(text=f"タスクID: #{task_id}")
+        
+        thread_id = None
+        if row and row[0] == channel.id:
+            thread_id = row[2]
             try:
-                # 招待するユーザーのリストを作成（重複を避ける）
-                users_to_add = set()
-                users_to_add.add(instructor)
-                
-                # 管理者ロールを持つユーザーを追加
-                admin_role = discord.utils.get(guild.roles, name="タスク管理者")
-                if admin_role:
-                    for member in admin_role.members:
-                        users_to_add.add(member)
-                
-                # 指示者ロールを持つユーザーを追加
-                instructor_role = discord.utils.get(guild.roles, name="タスク指示者")
-                if instructor_role:
-                    for member in instructor_role.members:
-                        users_to_add.add(member)
-                
-                # ユーザーを順次招待（レート制限対策）
-                for user in users_to_add:
-                    try:
-                        await thread.add_user(user)
-                        await asyncio.sleep(0.5)  # 0.5秒の遅延
-                    except Exception as user_error:
-                        logger.error(f"Failed to add user {user.display_name} to thread: {user_error}")
-                        continue
-                        
-            except Exception as e:
-                logger.error(f"Failed to add users to thread: {e}")
-            
-            # 完了の場合、5分後にスレッドを削除するタスクをスケジュール
-            if "完了" in message:
-                asyncio.create_task(delete_thread_after_delay(thread, 300))  # 5分 = 300秒
-        
-        # 2. 指示者の個人チャンネルに通知（スレッド作成）
-        personal_channel_name = f"{instructor.display_name}のタスク"
-        personal_channel = discord.utils.get(guild.channels, name=personal_channel_name)
-        if personal_channel and isinstance(personal_channel, discord.TextChannel):
-            # メインメッセージ（シンプル）
-            main_embed = discord.Embed(
-                title=message,
-                color=discord.Color.blue()
-            )
-            main_message = await personal_channel.send(embed=main_embed)
-            
-            # スレッドを作成
-            thread_name = f"📋 状況更新 - {message}"
-            thread = await main_message.create_thread(
-                name=thread_name, 
+                await notification_limiter.call(route, channel.get_partial_message(row[1]).edit, embed=embed)
+            except discord.NotFound:
+                row = None  # 状態メッセージが削除されていたら作り直す
+            else:
+                await DatabaseManager.save_status_message(task_id, target, channel.id, row[1], thread_id, history)
+                thread = guild.get_thread(thread_id) if thread_id else None
+                if thread and status == 'completed':
+                    spawn_background(delete_status_thread_if_completed(task_id, thread, 300))  # 5分 = 300秒
+                return
+        
+        main_message = await notification_limiter.call(route, channel.send, embed=embed)
+        # 先に記録し、スレッド作成に失敗して再送されても同じメッセージを編集する
+        await DatabaseManager.save_status_message(task_id, target, channel.id, main_message.id, None, history)
+        
+        try:
+            # スレッドを作成（以降の状態変更では作らない）
+            thread = await notification_limiter.call(
+                route, main_message.create_thread,
+                name=thread_name[:100], 
                 auto_archive_duration=60,
-                reason="個人タスク状況詳細"
+                reason=reason
             )
             
-            # スレッドに詳細情報を送信（指示者、状態、作成日時のみ）
+            # スレッドに詳細情報を送信
             detail_embed = discord.Embed(
                 title="📋 詳細情報",
                 color=discord.Color.blue()
             )
             detail_embed.add_field(name="指示者", value=instructor.mention, inline=True)
-            detail_embed.add_field(name="状態", value=message, inline=True)
-            detail_embed.add_field(name="更新日時", value=datetime.datetime.now().strftime("%Y/%m/%d %H:%M"), inline=True)
+            detail_embed.add_field(name="担当者", value=f"<@{payload['assignee_id']}>", inline=True)
+            detail_embed.add_field(name="作成日時", value=from_epoch(updated_ts, tz).strftime("%Y/%m/%d %H:%M"), inline=True)
             
             await thread.send(embed=detail_embed)
-            
-            # スレッドに適切なユーザーを招待（レート制限対策）
-            try:
-                # 招待するユーザーのリストを作成（重複を避ける）
-                users_to_add = set()
-                users_to_add.add(instructor)
-                
-                # 管理者ロールを持つユーザーを追加
-                admin_role = discord.utils.get(guild.roles, name="タスク管理者")
-                if admin_role:
-                    for member in admin_role.members:
-                        users_to_add.add(member)
-                
-                # 指示者ロールを持つユーザーを追加
-                instructor_role = discord.utils.get(guild.roles, name="タスク指示者")
-                if instructor_role:
-                    for member in instructor_role.members:
-                        users_to_add.add(member)
-                
-                # ユーザーを順次招待（レート制限対策）
-                for user in users_to_add:
-                    try:
-                        await thread.add_user(user)
-                        await asyncio.sleep(0.5)  # 0.5秒の遅延
-                    except Exception as user_error:
-                        logger.error(f"Failed to add user {user.display_name} to thread: {user_error}")
-                        continue
-                        
-            except Exception as e:
-                logger.error(f"Failed to add users to thread: {e}")
-            
-            # 完了の場合、5分後にスレッドを削除するタスクをスケジュール
-            if "完了" in message:
-                asyncio.create_task(delete_thread_after_delay(thread, 300))  # 5分 = 300秒
+            await DatabaseManager.save_status_message(task_id, target, channel.id, main_message.id, thread.id, history)
+        except Exception as e:
+            logger.error(f"Failed to create status thread in {channel.id}: {e}")
+            return
         
-        # 3. 指示者にDM通知（オプション）
-        try:
-            embed = discord.Embed(
-                title=message,
-                color=discord.Color.blue()
-            )
-            embed.add_field(name="担当者", value=f"<@{assignee_id}>", inline=True)
-            embed.add_field(name="タスクID", value=f"#{task_id}", inline=True)
-            await instructor.send(embed=embed)
-        except discord.Forbidden:
-            pass  # DMが無効な場合は無視
-        except Exception as dm_error:
-            logger.error(f"DM送信エラー: {dm_error}")
-    
-    except Exception as e:
-        logger.error(f"通知送信エラー: {e}")
+        # スレッドに適切なユーザーを招待（スレッド作成時の1回だけ。レート制限内でバックグラウンド実行）
+        spawn_background(invite_thread_members(thread, thread_members_for(guild, instructor)))
+        
+        # 完了の場合、5分後にスレッドを削除するタスクをスケジュール
+        if status == 'completed':
+            spawn_background(delete_status_thread_if_completed(task_id, thread, 300))  # 5分 = 300秒
+
+async def notify_status_management(guild, instructor, task_id, payload):
+    """タスク管理チャンネルの状態メッセージを更新"""
+    task_channel = await channel_directory.get_management(guild)
+    if task_channel and isinstance(task_channel, discord.TextChannel):
+        await update_status_message(
+            guild, task_channel, 'management', instructor, task_id, payload,
+            f"📋 タスク状況 - {payload.get('task_name') or task_id}", "タスク状況詳細"
+        )
+
+async def notify_status_personal(guild, instructor, task_id, payload):
+    """指示者の個人チャンネルの状態メッセージを更新"""
+    personal_channel = await channel_directory.get_personal(guild, instructor)
+    if personal_channel and isinstance(personal_channel, discord.TextChannel):
+        await update_status_message(
+            guild, personal_channel, 'personal', instructor, task_id, payload,
+            f"📋 状況更新 - {payload.get('task_name') or task_id}", "個人タスク状況詳細"
+        )
+
+async def notify_status_dm(guild, instructor, task_id, payload):
+    """指示者にDMで状態変更を通知（DMは通知として届くよう、編集せずに毎回送信）"""
+    embed = discord.Embed(
+        title=payload['message'],
+        color=discord.Color.blue()
+    )
+    embed.add_field(name="担当者", value=f"<@{payload['assignee_id']}>", inline=True)
+    embed.add_field(name="タスクID", value=f"#{task_id}", inline=True)
+    try:
+        await instructor.send(embed=embed)
+    except discord.Forbidden:
+        pass  # DMが無効な場合は無視（再送しても届かない）
 
 # 個人チャンネルにタスク通知を送信（修正版）
-async def send_task_notification(guild, assignee, instructor, task_name, due_date, original_message_id):
+async def send_task_notification(guild, assignee, instructor, task_id, task_name, due_date, original_message_id):
     """個人チャンネルにタスク通知を送信"""
     channel_name = f"{assignee.display_name}のタスク"
-    channel = discord.utils.get(guild.channels, name=channel_name)
+    channel = await channel_directory.get_personal(guild, assignee)
+    route = ('notifications', guild.id)  # 同時に配送する他の担当者とAPIの呼び出し枠を共有する
     
     if not channel:
         # チャンネルが無い場合は自動作成
@@ -874,11 +2875,13 @@ async def send_task_notification(guild, assignee, instructor, task_name, due_dat
                 discord.utils.get(guild.roles, name="タスク指示者"): discord.PermissionOverwrite(read_messages=True)
             }
             
-            channel = await guild.create_text_channel(
+            channel = await notification_limiter.call(
+                route, guild.create_text_channel,
                 channel_name, 
                 overwrites=overwrites,
                 topic=f"{assignee.display_name}の個人タスク管理チャンネル"
             )
+            await channel_directory.register(guild.id, assignee.id, ChannelDirectory.PERSONAL, channel.id)
             
             # 初回作成時の説明メッセージ
             welcome_embed = discord.Embed(
@@ -895,11 +2898,8 @@ async def send_task_notification(guild, assignee, instructor, task_name, due_dat
             
         except Exception as e:
             logger.error(f"Failed to create personal channel for {assignee.id}: {e}")
-            # チャンネル作成に失敗した場合はDMで送信
-            try:
-                channel = await assignee.create_dm()
-            except:
-                return
+            # チャンネル作成に失敗した場合はDMで送信（DMも開けなければアウトボックスから再送）
+            channel = await assignee.create_dm()
     else:
         # 既存のチャンネルが見つかった場合、権限を確認・更新
         try:
@@ -911,17 +2911,6 @@ async def send_task_notification(guild, assignee, instructor, task_name, due_dat
         except Exception as e:
             logger.error(f"Failed to update permissions for {assignee.id}: {e}")
     
-    # タスクIDを取得
-    result = DatabaseManager.execute_query(
-        "SELECT id FROM tasks WHERE guild_id = ? AND assignee_id = ? AND task_name = ? ORDER BY created_at DESC LIMIT 1",
-        (guild.id, assignee.id, task_name)
-    )
-    
-    if not result:
-        return
-    
-    task_id = result[0][0]
-    
     # メインメッセージ（タスク名と期日のみ）
     embed = discord.Embed(
         title=f"📋 {task_name}",
@@ -933,57 +2922,234 @@ async def send_task_notification(guild, assignee, instructor, task_name, due_dat
     view = TaskView(task_id, assignee.id, instructor.id, "pending")
     
     # メインメッセージを送信
-    main_message = await channel.send(f"{assignee.mention}", embed=embed, view=view)
-    
-    # スレッドを作成して詳細情報を送信
-    thread_name = f"📋 {task_name} - 詳細"
-    thread = await main_message.create_thread(
-        name=thread_name, 
-        auto_archive_duration=60,
-        reason="タスク詳細情報"
-    )
+    main_message = await notification_limiter.call(route, channel.send, f"{assignee.mention}", embed=embed, view=view)
     
-    # スレッドに詳細情報を送信（指示者、状態、作成日時のみ）
-    detail_embed = discord.Embed(
-        title="📋 タスク詳細",
-        color=discord.Color.blue()
-    )
-    detail_embed.add_field(name="指示者", value=instructor.mention, inline=True)
-    detail_embed.add_field(name="状態", value="⏳ 未受託", inline=True)
-    detail_embed.add_field(name="作成日時", value=datetime.datetime.now().strftime("%Y/%m/%d %H:%M"), inline=True)
-    
-    await thread.send(embed=detail_embed)
-    
-    # スレッドに適切なユーザーを招待（レート制限対策）
+    # 以降の失敗はログに残すだけにする（再送でタスク通知が重複しないように）
     try:
-        # 招待するユーザーのリストを作成（重複を避ける）
-        users_to_add = set()
-        users_to_add.add(assignee)
-        users_to_add.add(instructor)
+        # スレッドを作成して詳細情報を送信
+        thread_name = f"📋 {task_name} - 詳細"
+        thread = await notification_limiter.call(
+            route, main_message.create_thread,
+            name=thread_name, 
+            auto_archive_duration=60,
+            reason="タスク詳細情報"
+        )
         
-        # 管理者ロールを持つユーザーを追加
-        admin_role = discord.utils.get(guild.roles, name="タスク管理者")
-        if admin_role:
-            for member in admin_role.members:
-                users_to_add.add(member)
-        
-        # 指示者ロールを持つユーザーを追加
-        instructor_role = discord.utils.get(guild.roles, name="タスク指示者")
-        if instructor_role:
-            for member in instructor_role.members:
-                users_to_add.add(member)
-        
-        # ユーザーを順次招待（レート制限対策）
-        for user in users_to_add:
-            try:
-                await thread.add_user(user)
-                await asyncio.sleep(0.5)  # 0.5秒の遅延
-            except Exception as user_error:
-                logger.error(f"Failed to add user {user.display_name} to thread: {user_error}")
-                continue
-                
+        # スレッドに詳細情報を送信（指示者、状態、作成日時のみ）
+        detail_embed = discord.Embed(
+            title="📋 タスク詳細",
+            color=discord.Color.blue()
+        )
+        detail_embed.add_field(name="指示者", value=instructor.mention, inline=True)
+        detail_embed.add_field(name="状態", value="⏳ 未受託", inline=True)
+        detail_embed.add_field(name="作成日時", value=datetime.datetime.now(guild_tz(assignee.guild.id)).strftime("%Y/%m/%d %H:%M"), inline=True)
+        
+        await thread.send(embed=detail_embed)
     except Exception as e:
-        logger.error(f"Failed to add users to thread: {e}")
+        logger.error(f"Failed to create task thread for {task_id}: {e}")
+        return
+    
+    # スレッドに適切なユーザーを招待（レート制限内でバックグラウンド実行し、指示への返信を待たせない）
+    spawn_background(invite_thread_members(thread, thread_members_for(guild, assignee, instructor)))
+
+class NotificationUndeliverable(Exception):
+    """再送しても届かない通知（宛先のサーバー・メンバーが存在しないなど）"""
+
+class NotificationRetryLater(Exception):
+    """一時的に配送できない通知（バックオフ後に再送する）"""
+
+async def resolve_member(guild, user_id: int):
+    """メンバーを取得（キャッシュにない場合はAPIから取得。退出済みならNotificationUndeliverable）"""
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    try:
+        return await notification_limiter.call(('notifications', guild.id), guild.fetch_member, user_id)
+    except discord.NotFound:
+        raise NotificationUndeliverable(f'member {user_id} not found')
+    except discord.HTTPException as e:
+        # 権限エラーなども含め、メンバー取得の失敗は再送で回復し得るものとして扱う
+        raise NotificationRetryLater(f'failed to fetch member {user_id}: {e}') from e
+
+async def deliver_task_assigned(guild, task_id, payload):
+    assignee = await resolve_member(guild, payload['assignee_id'])
+    instructor = await resolve_member(guild, payload['instructor_id'])
+    due_date = from_epoch(payload['due_ts'], guild_tz(guild.id))
+    await send_task_notification(guild, assignee, instructor, task_id, payload['task_name'], due_date, payload['message_id'])
+
+def status_delivery(notify):
+    async def _deliver(guild, task_id, payload):
+        instructor = await resolve_member(guild, payload['instructor_id'])
+        await notify(guild, instructor, task_id, payload)
+    return _deliver
+
+# アウトボックスの kind → 配送関数
+NOTIFICATION_DELIVERIES = {
+    'task_assigned': deliver_task_assigned,
+    'status_management': status_delivery(notify_status_management),
+    'status_personal': status_delivery(notify_status_personal),
+    'status_dm': status_delivery(notify_status_dm),
+}
+
+def outbox_backoff(attempts: int) -> int:
+    """attempts回失敗した通知を再送するまでの秒数（指数バックオフ + ジッター）"""
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return int(delay * random.uniform(0.5, 1.0)) + 1
+
+class NotificationOutbox:
+    """notification_outboxの通知をOUTBOX_WORKERS個のワーカーで配送
+    
+    失敗した通知は指数バックオフで再送し、OUTBOX_MAX_ATTEMPTS回失敗するか再送しても届かない場合はdeadとして残す。
+    """
+    
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}  # idempotency_key -> 配送結果を待つFuture
+        self._in_flight: set = set()  # 取り出してから結果を記録するまでの通知ID
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+    
+    def wake(self):
+        """通知を追加したときに呼び出す"""
+        self._wakeup.set()
+    
+    def start(self):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+    
+    def stats(self) -> Dict[str, int]:
+        return {'delivered': self.delivered, 'retried': self.retried, 'dead': self.dead}
+    
+    async def wait_for(self, keys: List[str], timeout: float) -> Dict[str, tuple]:
+        """通知の配送結果 (state, last_error) を待つ（timeoutまでに終わらなかった通知は ('pending', 直近のエラー)）"""
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        for key, future in futures.items():
+            self._waiters.setdefault(key, []).append(future)
+        try:
+            # 待ち始める前に配送が終わっていた通知
+            placeholders = ','.join('?' * len(keys))
+            rows = await DatabaseManager.fetch_query(
+                f"SELECT idempotency_key, state, last_error FROM notification_outbox WHERE idempotency_key IN ({placeholders})",
+                keys
+            )
+            last_errors = {}
+            for key, state, error in rows:
+                last_errors[key] = error
+                if state != 'pending':
+                    self._resolve(key, state, error)
+            if futures:
+                await asyncio.wait(futures.values(), timeout=timeout)
+            return {
+                key: future.result() if future.done() else ('pending', last_errors.get(key))
+                for key, future in futures.items()
+            }
+        finally:
+            for key, future in futures.items():
+                waiters = self._waiters.get(key, [])
+                if future in waiters:
+                    waiters.remove(future)
+                if not waiters:
+                    self._waiters.pop(key, None)
+    
+    def _resolve(self, key: str, state: str, error: Optional[str] = None):
+        for future in self._waiters.pop(key, []):
+            if not future.done():
+                future.set_result((state, error))
+    
+    async def _run(self):
+        queue: asyncio.Queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(OUTBOX_WORKERS)]
+        renewed_at = time.monotonic()
+        try:
+            while True:
+                self._wakeup.clear()
+                next_ts = None
+                try:
+                    # 配送中の通知がOUTBOX_BATCH_SIZE件になるまで取り出し、ワーカーが空くたびに補充する
+                    free = OUTBOX_BATCH_SIZE - len(self._in_flight)
+                    rows = await DatabaseManager.claim_notifications(free) if free > 0 else []
+                    for row in rows:
+                        if row[0] in self._in_flight:
+                            continue  # リースが切れたがまだ配送中（二重送信しない）
+                        self._in_flight.add(row[0])
+                        queue.put_nowait(row)
+                    
+                    if self._in_flight and time.monotonic() - renewed_at >= OUTBOX_LEASE_RENEW_SECONDS:
+                        await DatabaseManager.renew_notification_leases(list(self._in_flight))
+                        renewed_at = time.monotonic()
+                    
+                    if len(self._in_flight) < OUTBOX_BATCH_SIZE:
+                        result = await DatabaseManager.fetch_query(SQL_OUTBOX_NEXT)
+                        next_ts = result[0][0] if result else None
+                except Exception as e:
+                    logger.error(f"Notification outbox error: {e}")
+                
+                if len(self._in_flight) >= OUTBOX_BATCH_SIZE:
+                    timeout = OUTBOX_LEASE_RENEW_SECONDS  # ワーカーが空くと起こされる
+                else:
+                    timeout = OUTBOX_IDLE_SECONDS if next_ts is None else min(OUTBOX_IDLE_SECONDS, max(0, next_ts - time.time()))
+                if self._in_flight:
+                    timeout = min(timeout, max(0, OUTBOX_LEASE_RENEW_SECONDS - (time.monotonic() - renewed_at)))
+                else:
+                    renewed_at = time.monotonic()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for worker in workers:
+                worker.cancel()
+    
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            row = await queue.get()
+            try:
+                await self._deliver(*row)
+            except Exception as e:
+                logger.error(f"Notification outbox worker error: {e}")
+            finally:
+                self._in_flight.discard(row[0])
+                self._wakeup.set()
+    
+    async def _deliver(self, notification_id, key, kind, guild_id, task_id, payload, attempts):
+        try:
+            deliver = NOTIFICATION_DELIVERIES.get(kind)
+            if deliver is None:
+                raise NotificationUndeliverable(f'unknown kind {kind!r}')
+            guild = bot.get_guild(guild_id)
+            if not guild:
+                raise NotificationUndeliverable('guild not found')
+            await deliver(guild, task_id, json.loads(payload))
+        except (NotificationUndeliverable, discord.Forbidden, discord.NotFound) as e:
+            await self._dead_letter(notification_id, key, f"{type(e).__name__}: {e}")
+            return
+        except Exception as e:
+            attempts += 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                await self._dead_letter(notification_id, key, f"{type(e).__name__}: {e}")
+                return
+            delay = outbox_backoff(attempts)
+            await DatabaseManager.record_notification_result(
+                notification_id, 'pending', f"{type(e).__name__}: {e}", int(time.time()) + delay
+            )
+            self.retried += 1
+            logger.warning(f"Notification {key} failed ({attempts}/{OUTBOX_MAX_ATTEMPTS}), retrying in {delay}s: {e}")
+            return
+        
+        await DatabaseManager.record_notification_result(notification_id, 'sent')
+        self.delivered += 1
+        self._resolve(key, 'sent')
+    
+    async def _dead_letter(self, notification_id, key, error):
+        await DatabaseManager.record_notification_result(notification_id, 'dead', error)
+        self.dead += 1
+        self._resolve(key, 'dead', error)
+        logger.warning(f"Notification {key} moved to dead letter: {error}")
+
+notification_outbox = NotificationOutbox()
 
 # Botイベント
 @bot.event
@@ -991,7 +3157,12 @@ async def on_ready():
     logger.info(f'{bot.user} has landed!')
     logger.info(f"Bot is in {len(bot.guilds)} guilds")
     
-    init_database()
+    await init_database()
+    
+    # インデックス作成と大量行のバックフィルは起動をブロックしないようバックグラウンドで実行
+    global backfill_task
+    if backfill_task is None or backfill_task.done():
+        backfill_task = asyncio.create_task(run_background_maintenance())
     
     # 永続化ビューの設定
     await setup_persistent_views()
@@ -1002,10 +3173,14 @@ async def on_ready():
         await setup_roles(guild)
     
     # 定期タスク開始
+    global reminder_scheduler_started
     try:
-        if not check_reminders.is_running():
-            check_reminders.start()
-            logger.info("Reminder task started successfully")
+        if not reminder_scheduler_started:
+            reminder_scheduler.start()
+            reminder_scheduler_started = True
+            logger.info("Reminder scheduler started successfully")
+        
+        notification_outbox.start()
         
         if not heartbeat_check.is_running():
             heartbeat_check.start()
@@ -1014,6 +3189,18 @@ async def on_ready():
         if not cleanup_memory.is_running():
             cleanup_memory.start()
             logger.info("Memory cleanup started")
+        
+        if not archive_finished_tasks.is_running():
+            archive_finished_tasks.start()
+            logger.info("Task archiving started")
+        
+        if not escalate_overdue_tasks.is_running():
+            escalate_overdue_tasks.start()
+            logger.info("Overdue escalation started")
+        
+        if not advance_recurring_tasks.is_running():
+            advance_recurring_tasks.start()
+            logger.info("Recurring task sweep started")
     except Exception as e:
         logger.error(f"Failed to start tasks: {e}")
 
@@ -1061,8 +3248,8 @@ async def handle_task_instruction(message):
     instructor = message.author
     
     # 権限チェック
-    if not (DatabaseManager.is_admin(instructor.id, guild.id) or 
-            DatabaseManager.is_instructor(instructor.id, guild.id)):
+    if not (await DatabaseManager.is_admin(instructor.id, guild.id) or 
+            await DatabaseManager.is_instructor(instructor.id, guild.id)):
         await message.reply("❌ 指示権限がありません。管理者にお問い合わせください。")
         return
     
@@ -1077,62 +3264,110 @@ async def handle_task_instruction(message):
         return
     
     # コンテンツから期日とタスク名を抽出
-    # 形式: @bot @user1 @user2, 期日, タスク名
+    # 形式: @bot @user1 @user2, 期日, タスク名[, リマインド:1日 3時間]
     content_parts = content.split(',')
     if len(content_parts) < 3:
         await message.reply("❌ 形式が正しくありません。形式: `@bot @ユーザー, 期日, タスク名`")
         return
     
     date_str = content_parts[1].strip()
-    task_name = content_parts[2].strip()
+    name_parts = content_parts[2:]
+    
+    # タスク個別のリマインダー（最後の項目が『リマインド:』で始まる場合のみ。省略時はサーバー設定に従う）
+    reminder_offsets = None
+    reminder_match = re.match(r'リマインド[:：]', name_parts[-1].strip()) if len(name_parts) >= 2 else None
+    if reminder_match:
+        reminder_str = name_parts.pop().strip()[reminder_match.end():]
+        reminder_offsets = parse_reminder_offsets(reminder_str)
+        if reminder_offsets is None:
+            await message.reply(f"❌ リマインドは『リマインド:1日 3時間 15分』『リマインド:なし』の形式で{REMINDER_MAX_OFFSETS}個まで指定してください。")
+            return
+    
+    # タスク名に含まれるカンマはそのまま残す
+    task_name = ','.join(name_parts).strip()
     
     if len(task_name) > 100:
         await message.reply("❌ タスク名は100文字以内で入力してください。")
         return
     
-    # 期日解析
-    due_date = parse_date(date_str)
+    # 期日解析（『毎週金曜 18:00』などの繰り返し指定は初回を期日とする）
+    tz = guild_tz(guild.id)
+    recurrence = parse_recurrence(date_str)
+    if recurrence:
+        due_date = next_occurrence(recurrence, datetime.datetime.now(tz))
+    else:
+        due_date = parse_date(date_str, tz)
     if not due_date:
-        await message.reply("❌ 期日は『明日』『12/25』『3日後』『来週』『金曜日』『2時間後』などの形式で入力してください。")
+        await message.reply("❌ 期日は『明日』『12/25』『3日後』『来週』『金曜日』『2時間後』『毎週金曜 18:00』などの形式で入力してください。")
         return
     
     # 各ユーザーにタスクを作成
-    success_count = 0
+    created = []  # (担当者, タスクID)
     error_messages = []
     
+    assignees = []
     for user in mentions:
         # 権限チェック
-        if not DatabaseManager.can_instruct_user(instructor.id, user.id, guild.id):
+        if not await DatabaseManager.can_instruct_user(instructor.id, user.id, guild.id):
             error_messages.append(f"❌ {user.display_name}への指示権限がありません。")
             continue
+        assignees.append(user)
+    
+    # タスク作成（全員分の書き込みを同時に発行し、グループコミットで1回のコミットにまとめる）
+    # 担当者への通知は同じトランザクションでアウトボックスに記録し、ワーカーが並行して配送する
+    created_task_ids = await asyncio.gather(*[
+        DatabaseManager.create_task_if_not_duplicate(
+            guild.id, instructor.id, user.id, 
+            task_name, due_date, message.id, message.channel.id, reminder_offsets, recurrence
+        )
+        for user in assignees
+    ], return_exceptions=True)
+    
+    for user, task_id in zip(assignees, created_task_ids):
+        if isinstance(task_id, Exception):
+            error_messages.append(f"❌ {user.display_name}: エラーが発生しました。")
+            logger.error(f"Task creation error for {user.id}: {task_id}")
+            continue
         
-        # 重複チェック
-        if DatabaseManager.check_duplicate_task(user.id, task_name, guild.id):
+        if task_id is None:
             error_messages.append(f"❌ {user.display_name}には既に『{task_name}』タスクが指示済みです。")
             continue
         
-        # タスク作成
-        try:
-            # タスクをデータベースに追加
-            DatabaseManager.add_task(
-                guild.id, instructor.id, user.id, 
-                task_name, due_date, message.id, message.channel.id
-            )
-            
-            # タスク通知を個人チャンネルに送信
-            await send_task_notification(guild, user, instructor, task_name, due_date, message.id)
-            
-            success_count += 1
-        except Exception as e:
-            error_messages.append(f"❌ {user.display_name}: エラーが発生しました。")
-            logger.error(f"Task creation error for {user.id}: {e}")
+        created.append((user, task_id))
     
-    # 結果報告
-    result_message = f"✅ {success_count}件のタスクを指示しました。"
+    # 結果報告（作成結果をすぐに返信し、担当者への配送が終わったら返信を更新する）
+    result_message = f"✅ {len(created)}件のタスクを指示しました。"
+    if recurrence and created:
+        result_message += f"（{describe_recurrence(recurrence)}に繰り返し）"
     if error_messages:
         result_message += "\n\n⚠️ エラー:\n" + "\n".join(error_messages)
     
-    await message.reply(result_message)
+    if not created:
+        await message.reply(result_message)
+        return
+    
+    notification_outbox.wake()
+    reply = await message.reply(result_message + f"\n\n⏳ {len(created)}人に通知しています…")
+    spawn_background(report_instruction_delivery(reply, result_message, created))
+
+async def report_instruction_delivery(reply, result_message: str, created: List[tuple]):
+    """担当者ごとの通知の配送結果を待ち、タスク指示への返信に反映"""
+    try:
+        results = await notification_outbox.wait_for(
+            [task_assigned_key(task_id) for _, task_id in created], INSTRUCTION_DELIVERY_TIMEOUT_SECONDS
+        )
+        lines = []
+        for user, task_id in created:
+            state, _ = results[task_assigned_key(task_id)]
+            if state == 'sent':
+                lines.append(f"📨 {user.display_name}: 通知済み")
+            elif state == 'dead':
+                lines.append(f"❌ {user.display_name}: 通知できませんでした")
+            else:
+                lines.append(f"⏳ {user.display_name}: 通知を再試行しています")
+        await reply.edit(content=result_message + "\n\n" + "\n".join(lines))
+    except Exception as e:
+        logger.error(f"Failed to report instruction delivery: {e}")
 
 # 管理者コマンド
 @bot.command(name='セットアップ', aliases=['setup'])
@@ -1152,7 +3387,7 @@ async def setup_command(ctx):
         author = ctx.author
         
         # 管理者として登録（既存チェック付き）
-        was_added = DatabaseManager.add_admin_if_not_exists(author.id, guild.id)
+        was_added = await DatabaseManager.add_admin_if_not_exists(author.id, guild.id)
         
         # ロール作成
         await setup_roles(guild)
@@ -1204,12 +3439,12 @@ async def admin_command(ctx, action: str, user: discord.Member):
     executing_commands.add(command_key)
     
     try:
-        if not DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
+        if not await DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
             await ctx.send("❌ 管理者権限が必要です。")
             return
         
         if action == "追加" or action == "add":
-            was_added = DatabaseManager.add_admin_if_not_exists(user.id, ctx.guild.id)
+            was_added = await DatabaseManager.add_admin_if_not_exists(user.id, ctx.guild.id)
             
             if was_added:
                 admin_role = discord.utils.get(ctx.guild.roles, name="タスク管理者")
@@ -1226,10 +3461,7 @@ async def admin_command(ctx, action: str, user: discord.Member):
         
         elif action == "削除" or action == "remove":
             # データベースから削除
-            DatabaseManager.execute_query(
-                "DELETE FROM admins WHERE user_id = ? AND guild_id = ?",
-                (user.id, ctx.guild.id)
-            )
+            await DatabaseManager.remove_admin(user.id, ctx.guild.id)
             
             # Discordロールから削除（権限エラーをハンドリング）
             admin_role = discord.utils.get(ctx.guild.roles, name="タスク管理者")
@@ -1259,50 +3491,251 @@ async def instructor_command(ctx, action: str, user: discord.Member, *targets):
     
     executing_commands.add(command_key)
     
-    try:
-        if not DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
-            await ctx.send("❌ 管理者権限が必要です。")
+    try:
+        if not await DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
+            await ctx.send("❌ 管理者権限が必要です。")
+            return
+        
+        target_ids = []
+        if targets:
+            for target in targets:
+                if target.startswith('<@') and target.endswith('>'):
+                    target_id = int(target[2:-1].replace('!', ''))
+                    target_ids.append(target_id)
+        
+        if action == "追加" or action == "add":
+            was_added = await DatabaseManager.add_instructor_if_not_exists(user.id, ctx.guild.id, target_ids)
+            
+            if was_added:
+                instructor_role = discord.utils.get(ctx.guild.roles, name="タスク指示者")
+                if instructor_role and instructor_role not in user.roles:
+                    await user.add_roles(instructor_role)
+                
+                target_desc = "全員" if not target_ids else f"{len(target_ids)}人のユーザー"
+                await ctx.send(f"✅ {user.display_name}に指示権限を付与しました。（対象: {target_desc}）")
+            elif target_ids:
+                # 全員対象の指示者に対象を追加すると、指定したユーザーだけに狭まってしまうため拒否する
+                permissions = await DatabaseManager.get_permissions(user.id, ctx.guild.id)
+                if permissions.targets_invalid:
+                    await ctx.send(f"❌ {user.display_name}の指示対象を移行できなかったため、現在は誰にも指示できません。`!指示者 削除 @ユーザー` の後に対象を指定して追加し直してください。")
+                    return
+                if not permissions.targets:
+                    await ctx.send(f"❌ {user.display_name}は全員に指示できます。指示対象を限定する場合は `!指示者 削除 @ユーザー` の後に対象を指定して追加してください。")
+                    return
+                
+                # 既存の指示者には指示対象を追加
+                added = await DatabaseManager.add_instructor_targets(user.id, ctx.guild.id, target_ids)
+                await ctx.send(f"✅ {user.display_name}の指示対象に{added}人のユーザーを追加しました。")
+            else:
+                await ctx.send(f"ℹ️ {user.display_name}は既に指示者です。")
+        
+        elif action == "対象削除" or action == "remove_targets":
+            permissions = await DatabaseManager.get_permissions(user.id, ctx.guild.id)
+            if not permissions.is_instructor:
+                await ctx.send(f"❌ {user.display_name}は指示者ではありません。")
+                return
+            
+            if not target_ids:
+                await ctx.send("❌ 削除する指示対象のユーザーをメンションしてください。")
+                return
+            
+            # 対象が空になると「全員対象」になってしまうため拒否する
+            if permissions.targets and permissions.targets <= set(target_ids):
+                await ctx.send("❌ 指示対象を全て削除すると全員が対象になります。指示権限を削除する場合は `!指示者 削除 @ユーザー` を使用してください。")
+                return
+            
+            removed = await DatabaseManager.remove_instructor_targets(user.id, ctx.guild.id, target_ids)
+            await ctx.send(f"✅ {user.display_name}の指示対象から{removed}人のユーザーを削除しました。")
+        
+        elif action == "削除" or action == "remove":
+            await DatabaseManager.remove_instructor(user.id, ctx.guild.id)
+            
+            instructor_role = discord.utils.get(ctx.guild.roles, name="タスク指示者")
+            if instructor_role and instructor_role in user.roles:
+                await user.remove_roles(instructor_role)
+            
+            await ctx.send(f"✅ {user.display_name}の指示権限を削除しました。")
+            
+    finally:
+        executing_commands.discard(command_key)
+
+@bot.command(name='設定', aliases=['settings'])
+async def settings_command(ctx, key: str = "", *values):
+    """サーバー設定の表示・変更"""
+    guild_id = ctx.guild.id
+    
+    if not key:
+        offsets = await DatabaseManager.get_guild_reminder_offsets(guild_id)
+        digest, _ = await DatabaseManager.get_reminder_digest_settings(guild_id, ctx.author.id)
+        embed = discord.Embed(title="⚙️ サーバー設定", color=discord.Color.blue())
+        embed.add_field(
+            name="リマインド",
+            value=format_offsets(offsets if offsets is not None else list(REMINDER_DEFAULT_OFFSETS))
+                  + ("" if offsets is not None else "（既定）"),
+            inline=False
+        )
+        embed.add_field(
+            name="まとめ通知",
+            value=format_switch(digest, REMINDER_DIGEST_DEFAULT),
+            inline=False
+        )
+        settings = guild_settings_cache.get(guild_id)
+        embed.add_field(name="タイムゾーン", value=str(settings.timezone), inline=False)
+        embed.add_field(
+            name="静音時間",
+            value=format_quiet_hours(settings.quiet_start, settings.quiet_end),
+            inline=False
+        )
+        embed.add_field(
+            name="通知先",
+            value=format_notification_targets(settings.notification_targets),
+            inline=False
+        )
+        await ctx.send(embed=embed)
+        return
+    
+    if not await DatabaseManager.is_admin(ctx.author.id, guild_id):
+        await ctx.send("❌ 管理者権限が必要です。")
+        return
+    
+    if key in ("リマインド", "reminder"):
+        value = " ".join(values)
+        if value in ("既定", "default"):
+            await DatabaseManager.set_guild_reminder_offsets(guild_id, None)
+            await ctx.send(f"✅ リマインドを既定値（{format_offsets(list(REMINDER_DEFAULT_OFFSETS))}）に戻しました。")
+            return
+        
+        offsets = parse_reminder_offsets(value)
+        if offsets is None:
+            await ctx.send(f"❌ 形式: `!設定 リマインド 1日 3時間 15分`（{REMINDER_MAX_OFFSETS}個まで）/ `なし` / `既定`")
+            return
+        
+        await DatabaseManager.set_guild_reminder_offsets(guild_id, offsets)
+        await ctx.send(f"✅ リマインドを『{format_offsets(offsets)}』に設定しました。（これから受託されるタスクに適用）")
+    elif key in ("まとめ通知", "digest"):
+        enabled = parse_switch(" ".join(values))
+        if enabled is ...:
+            await ctx.send("❌ 形式: `!設定 まとめ通知 オン/オフ/既定`")
+            return
+        await DatabaseManager.set_guild_reminder_digest(guild_id, enabled)
+        await ctx.send(f"✅ まとめ通知を『{format_switch(enabled, REMINDER_DIGEST_DEFAULT)}』に設定しました。")
+    elif key in ("タイムゾーン", "timezone"):
+        value = " ".join(values).strip()
+        if value in ("既定", "default"):
+            await DatabaseManager.set_guild_timezone(guild_id, None)
+            await ctx.send(f"✅ タイムゾーンを既定値（{DEFAULT_TZ}）に戻しました。")
+            return
+        if not value or load_timezone(value) is None:
+            await ctx.send("❌ 形式: `!設定 タイムゾーン Asia/Tokyo`（IANAタイムゾーン名）/ `既定`")
+            return
+        await DatabaseManager.set_guild_timezone(guild_id, value)
+        await ctx.send(f"✅ タイムゾーンを『{value}』に設定しました。")
+    elif key in ("静音時間", "quiet"):
+        quiet_hours = parse_quiet_hours(" ".join(values))
+        if quiet_hours is ...:
+            await ctx.send("❌ 形式: `!設定 静音時間 22:00-7:00` / `なし`")
+            return
+        quiet_start, quiet_end = quiet_hours or (None, None)
+        await DatabaseManager.set_guild_quiet_hours(guild_id, quiet_start, quiet_end)
+        await ctx.send(f"✅ 静音時間を『{format_quiet_hours(quiet_start, quiet_end)}』に設定しました。（この間のリマインダーは終了時にまとめて送信）")
+    elif key in ("通知先", "notify"):
+        if list(values) in (["既定"], ["default"]):
+            await DatabaseManager.set_guild_notification_targets(guild_id, None)
+            await ctx.send(f"✅ 通知先を既定値（{format_notification_targets(DEFAULT_NOTIFICATION_TARGETS)}）に戻しました。")
+            return
+        targets = parse_notification_targets(values)
+        if targets is None:
+            await ctx.send("❌ 形式: `!設定 通知先 タスク管理 個人チャンネル DM`（いくつでも）/ `なし` / `既定`")
+            return
+        await DatabaseManager.set_guild_notification_targets(guild_id, targets)
+        await ctx.send(f"✅ 状態変更の通知先を『{format_notification_targets(targets)}』に設定しました。")
+    else:
+        await ctx.send("❌ 設定項目が見つかりません。利用できる項目: `リマインド` `まとめ通知` `タイムゾーン` `静音時間` `通知先`")
+
+@bot.command(name='個人設定', aliases=['mysettings'])
+async def user_settings_command(ctx, key: str = "", *values):
+    """自分の通知設定の表示・変更（未設定の項目はサーバー設定に従う）"""
+    guild_id = ctx.guild.id
+    guild_digest, user_digest = await DatabaseManager.get_reminder_digest_settings(guild_id, ctx.author.id)
+    
+    if not key:
+        embed = discord.Embed(title=f"⚙️ {ctx.author.display_name}さんの設定", color=discord.Color.blue())
+        embed.add_field(
+            name="まとめ通知",
+            value=format_switch(user_digest, REMINDER_DIGEST_DEFAULT if guild_digest is None else guild_digest),
+            inline=False
+        )
+        await ctx.send(embed=embed)
+        return
+    
+    if key in ("まとめ通知", "digest"):
+        enabled = parse_switch(" ".join(values))
+        if enabled is ...:
+            await ctx.send("❌ 形式: `!個人設定 まとめ通知 オン/オフ/既定`")
+            return
+        await DatabaseManager.set_user_reminder_digest(guild_id, ctx.author.id, enabled)
+        default = REMINDER_DIGEST_DEFAULT if guild_digest is None else guild_digest
+        await ctx.send(f"✅ まとめ通知を『{format_switch(enabled, default)}』に設定しました。")
+    else:
+        await ctx.send("❌ 設定項目が見つかりません。利用できる項目: `まとめ通知`")
+
+@bot.command(name='繰り返し', aliases=['recurring'])
+async def recurring_command(ctx, action: str = "", recurrence_id: int = 0):
+    """繰り返しタスクの一覧・停止"""
+    guild_id = ctx.guild.id
+    permissions = await DatabaseManager.get_permissions(ctx.author.id, guild_id)
+    
+    if action in ("停止", "stop"):
+        result = await DatabaseManager.fetch_query(
+            "SELECT instructor_id FROM task_recurrences WHERE id = ? AND guild_id = ? AND active = 1",
+            (recurrence_id, guild_id)
+        )
+        if not result:
+            await ctx.send("❌ 指定された繰り返しが見つかりません。")
+            return
+        if not permissions.is_admin and result[0][0] != ctx.author.id:
+            await ctx.send("❌ 繰り返しを停止できるのは指示者または管理者のみです。")
             return
         
-        if action == "追加" or action == "add":
-            target_ids = []
-            if targets:
-                for target in targets:
-                    if target.startswith('<@') and target.endswith('>'):
-                        target_id = int(target[2:-1].replace('!', ''))
-                        target_ids.append(target_id)
-            
-            was_added = DatabaseManager.add_instructor_if_not_exists(user.id, ctx.guild.id, target_ids)
-            
-            if was_added:
-                instructor_role = discord.utils.get(ctx.guild.roles, name="タスク指示者")
-                if instructor_role and instructor_role not in user.roles:
-                    await user.add_roles(instructor_role)
-                
-                target_desc = "全員" if not target_ids else f"{len(target_ids)}人のユーザー"
-                await ctx.send(f"✅ {user.display_name}に指示権限を付与しました。（対象: {target_desc}）")
-            else:
-                await ctx.send(f"ℹ️ {user.display_name}は既に指示者です。")
-        
-        elif action == "削除" or action == "remove":
-            DatabaseManager.execute_query(
-                "DELETE FROM instructors WHERE user_id = ? AND guild_id = ?",
-                (user.id, ctx.guild.id)
-            )
-            
-            instructor_role = discord.utils.get(ctx.guild.roles, name="タスク指示者")
-            if instructor_role and instructor_role in user.roles:
-                await user.remove_roles(instructor_role)
-            
-            await ctx.send(f"✅ {user.display_name}の指示権限を削除しました。")
-            
-    finally:
-        executing_commands.discard(command_key)
+        await DatabaseManager.stop_recurrence(recurrence_id, guild_id)
+        await ctx.send(f"✅ 繰り返し #{recurrence_id} を停止しました。（作成済みのタスクは残ります）")
+        return
+    
+    # 管理者はサーバー全体、それ以外は自分が指示者・担当者のもののみ
+    if permissions.is_admin:
+        rows = await DatabaseManager.fetch_query(
+            "SELECT id, instructor_id, assignee_id, task_name, rule, current_due_ts FROM task_recurrences "
+            "WHERE guild_id = ? AND active = 1 ORDER BY id LIMIT 25",
+            (guild_id,)
+        )
+    else:
+        rows = await DatabaseManager.fetch_query(
+            "SELECT id, instructor_id, assignee_id, task_name, rule, current_due_ts FROM task_recurrences "
+            "WHERE guild_id = ? AND active = 1 AND (instructor_id = ? OR assignee_id = ?) ORDER BY id LIMIT 25",
+            (guild_id, ctx.author.id, ctx.author.id)
+        )
+    
+    if not rows:
+        await ctx.send("📭 繰り返しタスクはありません。")
+        return
+    
+    embed = discord.Embed(title="🔁 繰り返しタスク", color=discord.Color.blue())
+    for row_id, instructor_id, assignee_id, task_name, rule, current_due_ts in rows:
+        assignee = ctx.guild.get_member(assignee_id)
+        embed.add_field(
+            name=f"#{row_id} {task_name}",
+            value=f"担当: {assignee.display_name if assignee else 'Unknown'}\n"
+                  f"繰り返し: {describe_recurrence(parse_rrule(rule))}\n"
+                  f"次回期日: {from_epoch(current_due_ts, guild_tz(guild_id)).strftime('%Y/%m/%d %H:%M')}",
+            inline=True
+        )
+    embed.set_footer(text="停止: !繰り返し 停止 番号")
+    await ctx.send(embed=embed)
 
 @bot.command(name='チャンネル作成', aliases=['channel'])
 async def create_channels_command(ctx):
     """通知チャンネル一括作成"""
-    if not DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
+    if not await DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
         await ctx.send("❌ 管理者権限が必要です。")
         return
     
@@ -1310,7 +3743,7 @@ async def create_channels_command(ctx):
     created_channels = []
     
     # タスク管理チャンネル
-    management_channel = discord.utils.get(guild.channels, name="タスク管理")
+    management_channel = await channel_directory.get_management(guild)
     if not management_channel:
         overwrites = {
             guild.default_role: discord.PermissionOverwrite(read_messages=False),
@@ -1318,6 +3751,7 @@ async def create_channels_command(ctx):
             discord.utils.get(guild.roles, name="タスク指示者"): discord.PermissionOverwrite(read_messages=True)
         }
         management_channel = await guild.create_text_channel("タスク管理", overwrites=overwrites)
+        await channel_directory.register(guild.id, 0, ChannelDirectory.MANAGEMENT, management_channel.id)
         created_channels.append("タスク管理")
     
     # 個人タスクチャンネルを全メンバーに作成
@@ -1326,7 +3760,7 @@ async def create_channels_command(ctx):
             continue
             
         channel_name = f"{member.display_name}のタスク"
-        existing_channel = discord.utils.get(guild.channels, name=channel_name)
+        existing_channel = await channel_directory.get_personal(guild, member)
         
         if not existing_channel:
             # 権限設定：本人、管理者、指示者のみアクセス可能
@@ -1343,6 +3777,7 @@ async def create_channels_command(ctx):
                     overwrites=overwrites,
                     topic=f"{member.display_name}の個人タスク管理チャンネル"
                 )
+                await channel_directory.register(guild.id, member.id, ChannelDirectory.PERSONAL, new_channel.id)
                 created_channels.append(channel_name)
                 
                 # 作成通知をチャンネルに送信
@@ -1377,7 +3812,7 @@ async def create_channels_command(ctx):
 @bot.command(name='個人チャンネル作成', aliases=['create_personal'])
 async def create_personal_channel_command(ctx, user: discord.Member = None):
     """特定ユーザーの個人チャンネルを作成"""
-    if not DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
+    if not await DatabaseManager.is_admin(ctx.author.id, ctx.guild.id):
         await ctx.send("❌ 管理者権限が必要です。")
         return
     
@@ -1391,7 +3826,7 @@ async def create_personal_channel_command(ctx, user: discord.Member = None):
     
     guild = ctx.guild
     channel_name = f"{user.display_name}のタスク"
-    existing_channel = discord.utils.get(guild.channels, name=channel_name)
+    existing_channel = await channel_directory.get_personal(guild, user)
     
     if existing_channel:
         # 既存のチャンネルの権限を確認・更新
@@ -1421,6 +3856,7 @@ async def create_personal_channel_command(ctx, user: discord.Member = None):
             overwrites=overwrites,
             topic=f"{user.display_name}の個人タスク管理チャンネル"
         )
+        await channel_directory.register(guild.id, user.id, ChannelDirectory.PERSONAL, new_channel.id)
         
         # 作成通知
         embed = discord.Embed(
@@ -1443,64 +3879,282 @@ async def create_personal_channel_command(ctx, user: discord.Member = None):
         logger.error(f"Error creating personal channel: {e}")
         await ctx.send("❌ チャンネル作成中にエラーが発生しました。")
 
+# タスク一覧（キーセットページング）
+TASK_LIST_PAGE_SIZE = 10
+KEYSET_START = (-(2 ** 62), 0)  # どのタスクよりも前のキー
+
+TASK_STATUS_EMOJI = {
+    'pending': '⏳',
+    'accepted': '✅',
+    'completed': '🎉',
+    'declined': '❌',
+    'abandoned': '⚠️'
+}
+
+def add_task_field(embed, guild, row):
+    """(id, instructor_id, assignee_id, task_name, due_ts, status) の行をEmbedのフィールドとして追加"""
+    task_id, instructor_id, assignee_id, task_name, due_ts, status = row
+    instructor = guild.get_member(instructor_id)
+    assignee = guild.get_member(assignee_id)
+    due_date = from_epoch(due_ts, guild_tz(guild.id)).strftime('%Y/%m/%d %H:%M') if due_ts is not None else '未設定'
+    
+    embed.add_field(
+        name=f"{TASK_STATUS_EMOJI.get(status, '❓')} {task_name}",
+        value=f"担当: {assignee.display_name if assignee else 'Unknown'}\n"
+              f"指示者: {instructor.display_name if instructor else 'Unknown'}\n"
+              f"期日: {due_date}\n"
+              f"状態: {status}",
+        inline=True
+    )
+
+async def fetch_task_page(table: str, scope: str, direction: str, guild_id: int, user_id: int, key: tuple):
+    """keyの次（または前）の1ページ分を取得し、(行, さらに続きがあるか) を返す"""
+    if table == 'tasks' and not await backfill_completed('tasks_epoch_columns'):
+        query = SQL_TASK_PAGES_BEFORE_BACKFILL[(table, scope, direction)]
+    else:
+        query = SQL_TASK_PAGES[(table, scope, direction)]
+    due_ts, task_id = key
+    limit = TASK_LIST_PAGE_SIZE + 1  # 1件多く取得して続きの有無を判定
+    if scope == 'guild':
+        params = (guild_id, due_ts, task_id, limit)
+    else:
+        params = (guild_id, user_id, due_ts, task_id, guild_id, user_id, due_ts, task_id, limit)
+    
+    rows = await DatabaseManager.fetch_query(query, params)
+    has_more = len(rows) > TASK_LIST_PAGE_SIZE
+    rows = rows[:TASK_LIST_PAGE_SIZE]
+    if direction == 'prev':
+        rows.reverse()
+    return rows, has_more
+
+class TaskListView(discord.ui.View):
+    """前へ/次へボタンで1ページずつ取得するタスク一覧"""
+    
+    def __init__(self, guild, author_id: int, table: str, scope: str):
+        super().__init__(timeout=300)
+        self.guild = guild
+        self.author_id = author_id
+        self.table = table
+        self.scope = scope
+        self.page_number = 1
+        self.rows = []  # 表示中のページのみ保持
+        self.message = None
+    
+    async def load(self, direction: str, key: tuple) -> bool:
+        rows, has_more = await fetch_task_page(
+            self.table, self.scope, direction, self.guild.id, self.author_id, key
+        )
+        if not rows:
+            return False
+        
+        self.rows = rows
+        if direction == 'next':
+            self.next_page.disabled = not has_more
+            self.previous_page.disabled = self.page_number <= 1
+        else:
+            self.next_page.disabled = False
+            self.previous_page.disabled = not has_more or self.page_number <= 1
+        return True
+    
+    def build_embed(self):
+        title = "📦 アーカイブ済みタスク" if self.table == 'tasks_archive' else "📋 タスク一覧"
+        embed = discord.Embed(
+            title=f"{title} (ページ {self.page_number})",
+            color=discord.Color.blue()
+        )
+        
+        for row in self.rows:
+            add_task_field(embed, self.guild, row)
+        return embed
+    
+    async def interaction_check(self, interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ この一覧を操作できるのはコマンドの実行者のみです。", ephemeral=True)
+            return False
+        return True
+    
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+    
+    @discord.ui.button(label="◀ 前へ", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        first_due_ts, first_id = self.rows[0][4], self.rows[0][0]
+        self.page_number -= 1
+        if not await self.load('prev', (first_due_ts, first_id)):
+            self.page_number += 1
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+    
+    @discord.ui.button(label="次へ ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        last_due_ts, last_id = self.rows[-1][4], self.rows[-1][0]
+        self.page_number += 1
+        if not await self.load('next', (last_due_ts, last_id)):
+            self.page_number -= 1
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
 @bot.command(name='タスク一覧', aliases=['tasks'])
-async def tasks_command(ctx, scope: str = ""):
+async def tasks_command(ctx, scope: str = "", option: str = ""):
     """タスク一覧表示"""
     user_id = ctx.author.id
     guild_id = ctx.guild.id
     
+    # アーカイブ済みタスクは明示的に指定された場合のみ参照
+    archived = scope == "アーカイブ" or scope == "archive"
+    if archived:
+        scope = option
+    
     if scope == "全て" or scope == "all":
-        if not (DatabaseManager.is_admin(user_id, guild_id) or DatabaseManager.is_instructor(user_id, guild_id)):
+        if not (await DatabaseManager.is_admin(user_id, guild_id) or await DatabaseManager.is_instructor(user_id, guild_id)):
             await ctx.send("❌ 全体表示には権限が必要です。")
             return
-        query = "SELECT * FROM tasks WHERE guild_id = ? ORDER BY due_date"
-        params = (guild_id,)
+        list_scope = 'guild'
     else:
-        query = "SELECT * FROM tasks WHERE guild_id = ? AND (instructor_id = ? OR assignee_id = ?) ORDER BY due_date"
-        params = (guild_id, user_id, user_id)
+        list_scope = 'member'
     
-    tasks = DatabaseManager.execute_query(query, params)
-    
-    if not tasks:
+    view = TaskListView(ctx.guild, user_id, 'tasks_archive' if archived else 'tasks', list_scope)
+    if not await view.load('next', KEYSET_START):
         await ctx.send("📝 該当するタスクはありません。")
         return
     
-    # ページング処理（10件ずつ）
-    page_size = 10
-    pages = [tasks[i:i + page_size] for i in range(0, len(tasks), page_size)]
+    view.message = await ctx.send(embed=view.build_embed(), view=view)
+
+# タスク検索
+TASK_SEARCH_LIMIT = 25  # Embedのフィールド上限
+
+# 検索条件で指定できる状態（日本語表記も受け付ける）
+TASK_STATUS_ALIASES = {
+    '未受託': 'pending', 'pending': 'pending',
+    '受託済み': 'accepted', '受託': 'accepted', 'accepted': 'accepted',
+    '完了': 'completed', 'completed': 'completed',
+    '辞退': 'declined', 'declined': 'declined',
+    '問題発生': 'abandoned', 'abandoned': 'abandoned',
+}
+
+# 2文字索引で候補を取り出す上限（どの2文字もこれより多く一致する語は期日順にLIKEで絞り込む）
+TASK_SEARCH_INDEX_MAX_ROWS = 5000
+
+# 件数を比べる2文字の上限（長い検索語でもUNION ALLの項数を抑える。残りの2文字はLIKEで絞り込まれる）
+TASK_SEARCH_MAX_BIGRAMS = 16
+
+async def rarest_bigram(guild_id: int, bigrams: List[str]) -> tuple:
+    """サーバー内で一致するタスクが最も少ない2文字と件数（TASK_SEARCH_INDEX_MAX_ROWSで打ち切り）"""
+    bigrams = bigrams[:TASK_SEARCH_MAX_BIGRAMS]
+    counts = " UNION ALL ".join(
+        "SELECT ? AS bigram, (SELECT COUNT(*) FROM (SELECT 1 FROM task_bigrams "
+        "WHERE guild_id = ? AND bigram = ? LIMIT ?)) AS matches"
+        for _ in bigrams
+    )
+    params = [value for bigram in bigrams for value in (bigram, guild_id, bigram, TASK_SEARCH_INDEX_MAX_ROWS)]
+    result = await DatabaseManager.fetch_query(f"{counts} ORDER BY matches LIMIT 1", tuple(params))
+    return result[0]
+
+async def search_tasks(guild_id: int, keywords: List[str], status: str = None, assignee_id: int = None,
+                       due_from: datetime.datetime = None, due_to: datetime.datetime = None,
+                       member_id: int = None) -> list:
+    """タスク名で検索（member_id指定時はその人が指示者か担当者のタスクのみ）"""
+    conditions = ["t.guild_id = ?"]
+    params = [guild_id]
+    bigrams = sorted({bigram for k in keywords for bigram in task_name_bigrams(k)})
+    # task_bigramsのバックフィルが完了するまではLIKEで検索する
+    if bigrams and await backfill_completed('task_bigrams'):
+        # サーバー内の2文字索引で、一致の少ない2文字があればその候補だけを確認する
+        # どれもよく使われる語なら期日順に走査して上位で打ち切る（語の一致はいずれもLIKEで確認）
+        bigram, matches = await rarest_bigram(guild_id, bigrams)
+        if matches < TASK_SEARCH_INDEX_MAX_ROWS:
+            conditions.append("t.id IN (SELECT task_id FROM task_bigrams WHERE guild_id = ? AND bigram = ?)")
+            params.extend([guild_id, bigram])
+    for term in keywords:
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("t.task_name LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    if status:
+        conditions.append("t.status = ?")
+        params.append(status)
+    if assignee_id:
+        conditions.append("t.assignee_id = ?")
+        params.append(assignee_id)
+    if due_from:
+        conditions.append("t.due_ts >= ?")
+        params.append(to_epoch(due_from))
+    if due_to:
+        conditions.append("t.due_ts < ?")
+        params.append(to_epoch(due_to))
+    if member_id:
+        conditions.append("(t.instructor_id = ? OR t.assignee_id = ?)")
+        params.extend([member_id, member_id])
     
-    for i, page in enumerate(pages):
-        embed = discord.Embed(
-            title=f"📋 タスク一覧 (ページ {i+1}/{len(pages)})",
-            color=discord.Color.blue()
-        )
-        
-        for task in page:
-            # データベースの列数に対応
-            if len(task) >= 10:
-                task_id, guild_id, instructor_id, assignee_id, task_name, due_date, status, created_at, updated_at, message_id = task[:10]
-            else:
-                task_id, guild_id, instructor_id, assignee_id, task_name, due_date, status, created_at, updated_at = task[:9]
-            
-            instructor = ctx.guild.get_member(instructor_id)
-            assignee = ctx.guild.get_member(assignee_id)
-            
-            status_emoji = {
-                'pending': '⏳',
-                'accepted': '✅',
-                'completed': '🎉',
-                'declined': '❌',
-                'abandoned': '⚠️'
-            }
-            
-            embed.add_field(
-                name=f"{status_emoji.get(status, '❓')} {task_name}",
-                value=f"担当: {assignee.display_name if assignee else 'Unknown'}\n"
-                      f"指示者: {instructor.display_name if instructor else 'Unknown'}\n"
-                      f"期日: {due_date}\n"
-                      f"状態: {status}",
-                inline=True
-            )
+    query = (
+        "SELECT t.id, t.instructor_id, t.assignee_id, t.task_name, t.due_ts, t.status FROM tasks t "
+        f"WHERE {' AND '.join(conditions)} ORDER BY t.due_ts LIMIT ?"
+    )
+    params.append(TASK_SEARCH_LIMIT + 1)
+    return await DatabaseManager.fetch_query(query, tuple(params))
+
+@bot.command(name='タスク検索', aliases=['search'])
+async def search_command(ctx, *args):
+    """タスク名の全文検索（状態・担当者・期間で絞り込み可能）"""
+    user_id = ctx.author.id
+    guild_id = ctx.guild.id
+    
+    keywords = []
+    status = None
+    assignee_id = None
+    due_from = due_to = None
+    
+    for arg in args:
+        key, _, value = arg.partition(':')
+        if key in ('状態', 'status') and value:
+            status = TASK_STATUS_ALIASES.get(value)
+            if status is None:
+                await ctx.send("❌ 状態は 未受託/受託済み/完了/辞退/問題発生 のいずれかで指定してください。")
+                return
+        elif key in ('担当', 'assignee') and value:
+            match = re.fullmatch(r'<@!?(\d+)>', value)
+            if not match:
+                await ctx.send("❌ 担当者は `担当:@ユーザー` の形式で指定してください。")
+                return
+            assignee_id = int(match.group(1))
+        elif key in ('期間', 'period') and value:
+            start, _, end = value.partition('~')
+            due_from = parse_date(start, guild_tz(ctx.guild.id)) if start else None
+            due_to = parse_date(end, guild_tz(ctx.guild.id)) if end else None
+            if (start and not due_from) or (end and not due_to):
+                await ctx.send("❌ 期間は `期間:12/1~12/31` の形式で指定してください。")
+                return
+            if due_from:
+                due_from = due_from.replace(hour=0, minute=0)
+            if due_to:
+                due_to = due_to + datetime.timedelta(minutes=1)  # 終了日の23:59を含める
+        else:
+            keywords.append(arg)
+    
+    if not keywords:
+        await ctx.send("❌ 検索キーワードを指定してください。例: `!タスク検索 資料 状態:受託済み 担当:@田中 期間:12/1~12/31`")
+        return
+    
+    # 権限者以外は自分が関係するタスクのみ検索
+    privileged = await DatabaseManager.is_admin(user_id, guild_id) or await DatabaseManager.is_instructor(user_id, guild_id)
+    rows = await search_tasks(
+        guild_id, keywords, status=status, assignee_id=assignee_id,
+        due_from=due_from, due_to=due_to, member_id=None if privileged else user_id
+    )
+    
+    if not rows:
+        await ctx.send("🔍 該当するタスクはありません。")
+        return
+    
+    embed = discord.Embed(
+        title=f"🔍 検索結果: {' '.join(keywords)}",
+        color=discord.Color.blue()
+    )
+    for row in rows[:TASK_SEARCH_LIMIT]:
+        add_task_field(embed, ctx.guild, row)
+    if len(rows) > TASK_SEARCH_LIMIT:
+        embed.set_footer(text=f"上位{TASK_SEARCH_LIMIT}件を表示しています。条件を追加して絞り込んでください。")
     
     await ctx.send(embed=embed)
 
@@ -1524,7 +4178,7 @@ async def help_command(ctx):
         
         embed.add_field(
             name="📝 タスク指示",
-            value="`@bot @ユーザー, 期日, タスク名`\n例: `@bot @田中, 明日, 資料作成`",
+            value="`@bot @ユーザー, 期日, タスク名[, リマインド:1日 3時間]`\n例: `@bot @田中, 明日, 資料作成`",
             inline=False
         )
         
@@ -1532,10 +4186,16 @@ async def help_command(ctx):
             name="📋 コマンド一覧",
             value="`!タスク一覧` - 自分のタスク表示\n"
                   "`!タスク一覧 全て` - 全タスク表示（権限者）\n"
+                  "`!タスク一覧 アーカイブ [全て]` - アーカイブ済みタスク表示\n"
+                  "`!タスク検索 キーワード [状態:] [担当:@] [期間:~]` - タスク検索\n"
                   "`!セットアップ` - 初期設定（管理者）\n"
                   "`!管理者 追加/削除 @ユーザー` - 管理者管理\n"
                   "`!指示者 追加/削除 @ユーザー` - 指示権限付与\n"
-                  "`!個人チャンネル作成 @ユーザー` - 個人チャンネル作成",
+                  "`!指示者 追加/対象削除 @ユーザー @対象...` - 指示対象の追加・削除\n"
+                  "`!個人チャンネル作成 @ユーザー` - 個人チャンネル作成\n"
+                  "`!設定 [リマインド 1日 3時間 15分 / まとめ通知 オン / タイムゾーン Asia/Tokyo / 静音時間 22:00-7:00 / 通知先 タスク管理 DM]` - サーバー設定の表示・変更（管理者）\n"
+                  "`!繰り返し [停止 番号]` - 繰り返しタスクの一覧・停止\n"
+                  "`!個人設定 [まとめ通知 オン/オフ/既定]` - 自分の通知設定",
             inline=False
         )
         
@@ -1545,13 +4205,14 @@ async def help_command(ctx):
                   "**時間指定:** 2時間後、30分後\n"
                   "**曜日指定:** 金曜日、来週、来月、月末\n"
                   "**絶対指定:** 12/25、2024/12/25、12月25日\n"
-                  "**時間付き:** 明日 14:30、金曜日 18:00",
+                  "**時間付き:** 明日 14:30、金曜日 18:00\n"
+                  "**繰り返し:** 毎日、平日 9:00、毎週金曜 18:00、毎月末、毎月15日、2週間ごとの月曜",
             inline=False
         )
         
         embed.add_field(
             name="🔧 管理機能",
-            value="- 重複チェック機能\n- 権限制御\n- 自動リマインダー（期日1時間前・1回のみ）\n- インタラクティブなタスク管理\n- 個人チャンネル自動作成",
+            value="- 重複チェック機能\n- 権限制御\n- 自動リマインダー（既定は期日1時間前・サーバー/タスクごとに変更可）\n- インタラクティブなタスク管理\n- 個人チャンネル自動作成",
             inline=False
         )
         
@@ -1565,11 +4226,11 @@ async def test_command(ctx):
     """タスク作成機能のテスト"""
     try:
         # テスト用のタスク作成
-        tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+        tomorrow = datetime.datetime.now(guild_tz(ctx.guild.id)) + datetime.timedelta(days=1)
         tomorrow = tomorrow.replace(hour=23, minute=59, second=0, microsecond=0)
         
         # タスクをデータベースに追加
-        task_id = DatabaseManager.add_task(
+        task_id = await DatabaseManager.add_task(
             guild_id=ctx.guild.id,
             instructor_id=ctx.author.id,
             assignee_id=ctx.author.id,
@@ -1677,61 +4338,546 @@ async def heartbeat_check():
         # 接続状態をログに記録（5分間隔で出力）
         if heartbeat_check.current_loop % 5 == 0:
             logger.info(f"Heartbeat: Bot is online and ready. Latency: {round(bot.latency * 1000)}ms")
+            logger.info(f"Permission cache: {permission_cache.stats()}")
+            logger.info(f"Write batches: {db.write_stats()}")
+            logger.info(f"Reminder digests: {reminder_digests.stats()}")
+            logger.info(f"Notification outbox: {notification_outbox.stats()}")
         
     except Exception as e:
         logger.error(f"Heartbeat check error: {e}")
 
-# 定期リマインダーチェック（修正版）
+# 終了済みタスクのアーカイブ
+@tasks.loop(hours=1)
+async def archive_finished_tasks():
+    """一定期間が経過した終了済みタスクを小さなバッチでアーカイブへ移動"""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=TASK_ARCHIVE_AFTER_DAYS)
+    archived_count = 0
+    try:
+        while True:
+            moved = await DatabaseManager.archive_finished_tasks(cutoff, TASK_ARCHIVE_BATCH_SIZE)
+            archived_count += moved
+            if moved < TASK_ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(TASK_ARCHIVE_PAUSE_SECONDS)  # 長時間書き込みロックを保持しない
+        
+        if archived_count:
+            logger.info(f"Archived {archived_count} finished tasks older than {TASK_ARCHIVE_AFTER_DAYS} days")
+    except Exception as e:
+        logger.error(f"Task archive error: {e}")
+
+# 期限超過タスクのエスカレーション
+@tasks.loop(minutes=5)
+async def escalate_overdue_tasks():
+    """次の段階に進む時刻を迎えたタスクをインデックスから取り出し、宛先ごとにまとめて通知"""
+    if not OVERDUE_ESCALATION_DELAYS:
+        return
+    try:
+        now_ts = int(time.time())
+        while True:
+            rows = await DatabaseManager.fetch_query(SQL_ESCALATION_DUE, (now_ts, ESCALATION_BATCH_SIZE))
+            if not rows:
+                break
+            
+            # (宛先の種類, サーバーID, 宛先ID) -> タスクの行
+            batches: Dict[tuple, list] = {}
+            updates = []
+            for row in rows:
+                task_id, guild_id, instructor_id, assignee_id, _, due_ts, stage = row
+                # 停止中などで複数の段階を過ぎていれば、到達した段階の宛先すべてに通知する
+                while stage < len(OVERDUE_ESCALATION_DELAYS) and due_ts + OVERDUE_ESCALATION_DELAYS[stage] <= now_ts:
+                    recipient = ESCALATION_RECIPIENTS[stage]
+                    recipient_id = {'assignee': assignee_id, 'instructor': instructor_id, 'channel': guild_id}[recipient]
+                    batches.setdefault((recipient, guild_id, recipient_id), []).append(row)
+                    stage += 1
+                updates.append((stage, next_escalation_ts(due_ts, stage), task_id))
+            
+            # 通知より先に段階を進める（送信失敗時に同じ警告を繰り返さない）
+            await DatabaseManager.advance_escalations(updates)
+            for (recipient, guild_id, recipient_id), batch in batches.items():
+                await send_overdue_notice(recipient, guild_id, recipient_id, batch)
+            
+            if len(rows) < ESCALATION_BATCH_SIZE:
+                break
+    except Exception as e:
+        logger.error(f"Overdue escalation error: {e}")
+
+def build_overdue_lines(guild, rows, with_assignee: bool) -> str:
+    lines = []
+    for _, _, _, assignee_id, task_name, due_ts, _ in rows[:ESCALATION_MAX_LINES]:
+        line = f"• {task_name}（期日: {from_epoch(due_ts, guild_tz(guild.id)).strftime('%Y/%m/%d %H:%M')}"
+        if with_assignee:
+            assignee = guild.get_member(assignee_id)
+            line += f"、担当: {assignee.mention if assignee else 'Unknown'}"
+        lines.append(line + "）")
+    if len(rows) > ESCALATION_MAX_LINES:
+        lines.append(f"他{len(rows) - ESCALATION_MAX_LINES}件")
+    return "\n".join(lines)
+
+async def send_overdue_notice(recipient: str, guild_id: int, recipient_id: int, rows):
+    """期限超過タスクの一覧を1通にまとめて送信"""
+    guild = bot.get_guild(guild_id)
+    if not guild:
+        return
+    try:
+        if recipient == 'assignee':
+            assignee = guild.get_member(recipient_id)
+            if not assignee:
+                return
+            embed = discord.Embed(
+                title="⚠️ 期限を過ぎたタスクがあります",
+                description=build_overdue_lines(guild, rows, with_assignee=False),
+                color=discord.Color.red()
+            )
+            await deliver_reminder(guild, assignee, embed)
+        
+        elif recipient == 'instructor':
+            instructor = guild.get_member(recipient_id)
+            if not instructor:
+                return
+            embed = discord.Embed(
+                title="⚠️ 指示したタスクが期限を過ぎています",
+                description=build_overdue_lines(guild, rows, with_assignee=True),
+                color=discord.Color.red()
+            )
+            await instructor.send(embed=embed)
+        
+        else:
+            task_channel = await channel_directory.get_management(guild)
+            if not task_channel or not isinstance(task_channel, discord.TextChannel):
+                return
+            embed = discord.Embed(
+                title="🚨 期限超過タスク",
+                description=build_overdue_lines(guild, rows, with_assignee=True),
+                color=discord.Color.dark_red()
+            )
+            await task_channel.send(embed=embed)
+        
+        logger.info(f"Overdue notice ({recipient}) sent for {len(rows)} tasks in guild {guild_id}")
+    except discord.Forbidden:
+        logger.warning(f"Could not send overdue notice ({recipient}) to {recipient_id}")
+    except Exception as e:
+        logger.error(f"Error sending overdue notice: {e}")
+
+# 繰り返しタスク
+async def create_next_occurrence(recurrence_id: int, expected_due_ts: int):
+    """繰り返しの次回分を作成（担当者への通知は同じトランザクションでアウトボックスに記録）"""
+    created = await DatabaseManager.advance_recurrence(recurrence_id, expected_due_ts)
+    if created:
+        notification_outbox.wake()
+
+async def create_next_occurrence_for(task_id: int):
+    """完了したタスクが繰り返しの最新回なら次回分を作成"""
+    try:
+        result = await DatabaseManager.fetch_query(
+            "SELECT recurrence_id, due_ts FROM tasks WHERE id = ?",
+            (task_id,)
+        )
+        if result and result[0][0] is not None:
+            await create_next_occurrence(*result[0])
+    except Exception as e:
+        logger.error(f"Recurring task error for {task_id}: {e}")
+
 @tasks.loop(minutes=5)
-async def check_reminders():
-    """定期的にリマインダーをチェック（1回のみ送信）"""
-    now = datetime.datetime.now()
-    
-    # 期日1時間前のリマインダー（未送信のもののみ）
-    one_hour_later = now + datetime.timedelta(hours=1)
-    upcoming_tasks = DatabaseManager.execute_query(
-        "SELECT id, guild_id, instructor_id, assignee_id, task_name, due_date FROM tasks WHERE status = 'accepted' AND due_date BETWEEN ? AND ? AND due_date > ? AND reminder_sent = 0",
-        (now, one_hour_later, now)
+async def advance_recurring_tasks():
+    """最新回の期日を過ぎた繰り返しの次回分を作成（インデックス上の範囲のみ読む）"""
+    try:
+        now_ts = int(time.time())
+        while True:
+            rows = await DatabaseManager.fetch_query(SQL_RECURRENCES_DUE, (now_ts, RECURRENCE_BATCH_SIZE))
+            for recurrence_id, current_due_ts in rows:
+                await create_next_occurrence(recurrence_id, current_due_ts)
+            if len(rows) < RECURRENCE_BATCH_SIZE:
+                break
+    except Exception as e:
+        logger.error(f"Recurring task sweep error: {e}")
+
+# リマインダースケジューラ
+class ReminderScheduler:
+    """リマインダージョブの発火時刻を最小ヒープで管理し、次の発火時刻まで正確にスリープするスケジューラ
+    
+    ヒープにはREMINDER_HORIZON_SECONDS先までのジョブだけを保持し、それ以降はDBのfire_tsインデックスから順次読み込む。
+    """
+    
+    def __init__(self):
+        self._heap = []  # (fire_at, job_id)
+        self._scheduled: Dict[int, int] = {}  # job_id -> fire_at（ヒープ内の古い要素は取り出し時に破棄）
+        self._loaded_until = 0  # この時刻までに発火するジョブはヒープに読み込み済み
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+    
+    def schedule(self, job_id: int, fire_at: int):
+        """発火時刻を登録（既に登録済みなら置き換え）"""
+        if fire_at > self._loaded_until:
+            # 読み込み範囲外のジョブは範囲を進めたときにDBから読み込まれる
+            self.cancel(job_id)
+            return
+        self._scheduled[job_id] = fire_at
+        heapq.heappush(self._heap, (fire_at, job_id))
+        if self._heap[0] == (fire_at, job_id):
+            self._wakeup.set()  # 最も早い発火時刻が変わったのでスリープし直す
+    
+    def cancel(self, job_id: int):
+        self._scheduled.pop(job_id, None)
+    
+    async def schedule_task(self, task_id: int):
+        """タスクの現在の状態からリマインダージョブを登録（受託時・期日変更時に呼び出す）"""
+        for job_id, fire_ts in await DatabaseManager.schedule_reminder_jobs(task_id):
+            self.schedule(job_id, fire_ts)
+    
+    async def cancel_task(self, task_id: int):
+        """タスクの送信待ちリマインダーを取り消す（完了・辞退・問題発生時に呼び出す）"""
+        for job_id in await DatabaseManager.cancel_reminder_jobs(task_id):
+            self.cancel(job_id)
+    
+    async def load(self, start_ts: int, end_ts: int):
+        """start_tsより後、end_ts以前に発火する送信待ちジョブをDBから読み込む"""
+        # 先に範囲を進めておき、読み込み中に登録されたジョブもヒープに入るようにする（重複は発火時に除外）
+        self._loaded_until = max(self._loaded_until, end_ts)
+        rows = await DatabaseManager.fetch_query(SQL_SCHEDULED_REMINDER_JOBS, (start_ts, end_ts))
+        for job_id, fire_ts in rows:
+            self.schedule(job_id, fire_ts)
+        logger.info(f"Reminder scheduler loaded {len(rows)} pending reminders")
+    
+    def start(self):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+    
+    def _pop_due(self, now: float) -> List[int]:
+        """発火時刻を過ぎたジョブIDを取り出す"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, job_id = heapq.heappop(self._heap)
+            if self._scheduled.get(job_id) == fire_at:
+                del self._scheduled[job_id]
+                due.append(job_id)
+        return due
+    
+    async def _run(self):
+        # 停止中に取りこぼしたジョブを処理してから、以降のジョブを読み込む
+        started_ts = int(time.time())
+        self._loaded_until = started_ts + REMINDER_HORIZON_SECONDS
+        try:
+            await catch_up_missed_reminders(started_ts)
+        except Exception as e:
+            logger.error(f"Reminder catch-up failed: {e}")
+        await self.load(started_ts, self._loaded_until)
+        
+        while True:
+            # 読み込み範囲の残りが半分を切ったら次の範囲を読み込む
+            now = time.time()
+            if now >= self._loaded_until - REMINDER_HORIZON_SECONDS / 2:
+                loaded_until = self._loaded_until
+                try:
+                    await self.load(loaded_until, int(now) + REMINDER_HORIZON_SECONDS)
+                except Exception as e:
+                    # 範囲を戻して少し待ってから再試行
+                    self._loaded_until = loaded_until
+                    logger.error(f"Reminder scheduler load failed: {e}")
+                    await asyncio.sleep(5)
+            
+            # キャンセル・再登録された古い要素を先頭から取り除く
+            while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            
+            self._wakeup.clear()
+            refill_at = self._loaded_until - REMINDER_HORIZON_SECONDS / 2
+            next_at = min(self._heap[0][0], refill_at) if self._heap else refill_at
+            timeout = next_at - time.time()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            for job_id in self._pop_due(time.time()):
+                spawn_background(send_task_reminder(job_id))
+
+reminder_scheduler = ReminderScheduler()
+
+async def deliver_reminder(guild, assignee, embed, view=None):
+    """担当者の個人チャンネル、無ければDMにリマインダーを送信し、送信したメッセージを返す"""
+    channel = await channel_directory.get_personal(guild, assignee)
+    kwargs = {'embed': embed}
+    if view:
+        kwargs['view'] = view
+    
+    if channel:
+        return await channel.send(f"{assignee.mention}", **kwargs)
+    # 個人チャンネルがない場合はDMで送信
+    return await assignee.send(**kwargs)
+
+async def defer_for_quiet_hours(guild_id: int, job_ids: List[int]) -> bool:
+    """静音時間中ならジョブを終了時刻まで後ろ倒しにしてTrueを返す"""
+    quiet_end = quiet_hours_end(guild_id, datetime.datetime.now(datetime.timezone.utc))
+    if quiet_end is None:
+        return False
+    fire_ts = to_epoch(quiet_end)
+    for job_id in job_ids:
+        if await DatabaseManager.defer_reminder_job(job_id, fire_ts):
+            reminder_scheduler.schedule(job_id, fire_ts)
+    return True
+
+async def send_task_reminder(job_id: int, late: bool = False):
+    """リマインダージョブを1件送信し、結果をreminder_jobsに記録"""
+    result = await DatabaseManager.fetch_query(
+        f"SELECT reminder_jobs.state, tasks.guild_id, tasks.assignee_id, tasks.task_name, {SQL_TASK_DUE_TS}, tasks.status, "
+        "COALESCE(user_settings.reminder_digest, guild_settings.reminder_digest), reminder_jobs.deferred "
+        "FROM reminder_jobs LEFT JOIN tasks ON tasks.id = reminder_jobs.task_id "
+        "LEFT JOIN guild_settings ON guild_settings.guild_id = tasks.guild_id "
+        "LEFT JOIN user_settings ON user_settings.guild_id = tasks.guild_id AND user_settings.user_id = tasks.assignee_id "
+        "WHERE reminder_jobs.id = ?",
+        (job_id,)
     )
+    if not result or result[0][0] != 'scheduled':
+        return
+    _, guild_id, assignee_id, task_name, due_ts, status, digest, deferred = result[0]
+    if status != 'accepted':
+        await DatabaseManager.mark_reminder_jobs([job_id], 'missed')
+        return
+    
+    if await defer_for_quiet_hours(guild_id, [job_id]):
+        return
+    
+    # まとめ通知が有効、または静音時間明けのリマインダーなら担当者ごとに集めて送る
+    if not late and (deferred or (REMINDER_DIGEST_DEFAULT if digest is None else digest)):
+        reminder_digests.add(guild_id, assignee_id)
+        return
+    
+    guild = bot.get_guild(guild_id)
+    assignee = guild.get_member(assignee_id) if guild else None
+    if not assignee:
+        await DatabaseManager.mark_reminder_jobs([job_id], 'missed', 'guild or member not found')
+        return
+    
+    due_date = from_epoch(due_ts, guild_tz(guild_id))
+    try:
+        embed = discord.Embed(
+            title=f"⏰ {task_name}",
+            description=f"**期日: {due_date.strftime('%Y/%m/%d %H:%M')}**",
+            color=discord.Color.orange()
+        )
+        if late:
+            embed.set_footer(text="Bot停止中に送信予定だったリマインダーです")
+        
+        await deliver_reminder(guild, assignee, embed, view=ReminderView(job_id))
+        await DatabaseManager.mark_reminder_jobs([job_id], 'sent')
+        logger.info(f"Reminder sent to {assignee.id} for job {job_id}")
+        
+    except discord.Forbidden:
+        logger.warning(f"Could not send reminder to {assignee.id}")
+        await DatabaseManager.mark_reminder_jobs([job_id], 'failed', 'forbidden')
+    except Exception as e:
+        logger.error(f"Error sending reminder: {e}")
+        await DatabaseManager.mark_reminder_jobs([job_id], 'failed', str(e))
+
+class ReminderDigestView(discord.ui.View):
+    """まとめ通知のページ切り替え"""
+    
+    def __init__(self, pages: List[Any]):
+        super().__init__(timeout=3600)
+        self.pages = pages
+        self.page_index = 0
+        self.message = None
+        self.previous_page.disabled = True
+    
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+    
+    async def show(self, interaction):
+        self.previous_page.disabled = self.page_index == 0
+        self.next_page.disabled = self.page_index >= len(self.pages) - 1
+        await interaction.response.edit_message(embed=self.pages[self.page_index], view=self)
+    
+    @discord.ui.button(label="◀ 前へ", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        self.page_index = max(0, self.page_index - 1)
+        await self.show(interaction)
+    
+    @discord.ui.button(label="次へ ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        self.page_index = min(len(self.pages) - 1, self.page_index + 1)
+        await self.show(interaction)
+
+class ReminderDigestBuffer:
+    """発火したリマインダーを (サーバー, 担当者) ごとに短時間集め、1通にまとめて送信"""
+    
+    def __init__(self):
+        self._pending: Dict[tuple, asyncio.Task] = {}
+        self.digests_sent = 0
+        self.reminders_sent = 0
+    
+    def add(self, guild_id: int, assignee_id: int):
+        key = (guild_id, assignee_id)
+        if key not in self._pending:
+            self._pending[key] = asyncio.create_task(self._flush_later(key))
     
-    for task in upcoming_tasks:
-        task_id, guild_id, instructor_id, assignee_id, task_name, due_date = task
+    def stats(self) -> Dict[str, int]:
+        return {
+            'digests': self.digests_sent,
+            'reminders': self.reminders_sent,
+            'messages_saved': self.reminders_sent - self.digests_sent,
+        }
+    
+    async def _flush_later(self, key: tuple):
+        await asyncio.sleep(REMINDER_DIGEST_WAIT_SECONDS)
+        del self._pending[key]
+        try:
+            await self._flush(*key)
+        except Exception as e:
+            logger.error(f"Reminder digest error: {e}")
+    
+    async def _flush(self, guild_id: int, assignee_id: int):
+        # 集めている間に発火したもの＋もうすぐ発火するものをまとめて取得
+        rows = await DatabaseManager.fetch_query(
+            SQL_ASSIGNEE_DUE_REMINDER_JOBS,
+            (guild_id, assignee_id, int(time.time()) + REMINDER_DIGEST_LOOKAHEAD_SECONDS)
+        )
+        if not rows:
+            return
+        job_ids = [row[0] for row in rows]
+        for job_id in job_ids:
+            reminder_scheduler.cancel(job_id)  # 前倒しした分はスケジューラから外す
         
         guild = bot.get_guild(guild_id)
-        if not guild:
-            continue
-        
-        assignee = guild.get_member(assignee_id)
+        assignee = guild.get_member(assignee_id) if guild else None
         if not assignee:
-            continue
+            await DatabaseManager.mark_reminder_jobs(job_ids, 'missed', 'guild or member not found')
+            return
         
-        try:
+        # 同じタスクの複数のリマインダーは1行にまとめる
+        tasks_by_due = list(dict.fromkeys((task_name, due_ts) for _, task_name, due_ts in rows))
+        page_count = (len(tasks_by_due) + REMINDER_DIGEST_PAGE_SIZE - 1) // REMINDER_DIGEST_PAGE_SIZE
+        pages = []
+        for page in range(page_count):
+            chunk = tasks_by_due[page * REMINDER_DIGEST_PAGE_SIZE:(page + 1) * REMINDER_DIGEST_PAGE_SIZE]
             embed = discord.Embed(
-                title=f"⏰ {task_name}",
-                description=f"**期日: {due_date.strftime('%Y/%m/%d %H:%M')}**",
+                title=f"⏰ もうすぐ期日のタスク（{len(tasks_by_due)}件）",
+                description="\n".join(
+                    f"• {task_name}（期日: {from_epoch(due_ts, guild_tz(guild.id)).strftime('%Y/%m/%d %H:%M')}）"
+                    for task_name, due_ts in chunk
+                ),
                 color=discord.Color.orange()
             )
-            
-            # 個人チャンネルに送信を試行
-            channel_name = f"{assignee.display_name}のタスク"
-            channel = discord.utils.get(guild.channels, name=channel_name)
-            
-            if channel:
-                await channel.send(f"{assignee.mention}", embed=embed)
-            else:
-                # 個人チャンネルがない場合はDMで送信
-                await assignee.send(embed=embed)
-            
-            # リマインダー送信済みフラグを設定
-            DatabaseManager.mark_reminder_sent(task_id)
-            logger.info(f"Reminder sent to {assignee.id} for task {task_id}")
-            
+            if page_count > 1:
+                embed.set_footer(text=f"ページ {page + 1}/{page_count}")
+            pages.append(embed)
+        
+        try:
+            view = ReminderDigestView(pages) if len(pages) > 1 else None
+            message = await deliver_reminder(guild, assignee, pages[0], view=view)
+            if view:
+                view.message = message
+            await DatabaseManager.mark_reminder_jobs(job_ids, 'sent')
+            self.digests_sent += 1
+            self.reminders_sent += len(job_ids)
+            logger.info(f"Reminder digest sent to {assignee.id} ({len(job_ids)} reminders)")
         except discord.Forbidden:
-            logger.warning(f"Could not send reminder to {assignee.id}")
-            # 送信に失敗してもフラグは立てる（無限リトライを防ぐため）
-            DatabaseManager.mark_reminder_sent(task_id)
+            logger.warning(f"Could not send reminder digest to {assignee.id}")
+            await DatabaseManager.mark_reminder_jobs(job_ids, 'failed', 'forbidden')
         except Exception as e:
-            logger.error(f"Error sending reminder: {e}")
+            logger.error(f"Error sending reminder digest: {e}")
+            await DatabaseManager.mark_reminder_jobs(job_ids, 'failed', str(e))
+
+reminder_digests = ReminderDigestBuffer()
+
+async def send_reminder_digest(guild, assignee, rows):
+    """停止中に取りこぼしたリマインダーを1通にまとめて送信"""
+    job_ids = [row[0] for row in rows]
+    lines = [
+        f"• {task_name}（期日: {from_epoch(due_ts, guild_tz(guild.id)).strftime('%Y/%m/%d %H:%M')}）"
+        for _, _, _, _, task_name, due_ts, _ in rows
+    ]
+    try:
+        embed = discord.Embed(
+            title="⏰ 送信できなかったリマインダー",
+            description="\n".join(lines),
+            color=discord.Color.orange()
+        )
+        embed.set_footer(text="Bot停止中に送信予定だったリマインダーです")
+        
+        await deliver_reminder(guild, assignee, embed)
+        await DatabaseManager.mark_reminder_jobs(job_ids, 'sent')
+        logger.info(f"Reminder digest sent to {assignee.id} ({len(job_ids)} jobs)")
+        
+    except discord.Forbidden:
+        logger.warning(f"Could not send reminder digest to {assignee.id}")
+        await DatabaseManager.mark_reminder_jobs(job_ids, 'failed', 'forbidden')
+    except Exception as e:
+        logger.error(f"Error sending reminder digest: {e}")
+        await DatabaseManager.mark_reminder_jobs(job_ids, 'failed', str(e))
+
+async def catch_up_missed_reminders(started_ts: int):
+    """停止中に発火時刻を過ぎたジョブをREMINDER_CATCHUP_POLICYに従って少しずつ処理"""
+    policy = REMINDER_CATCHUP_POLICY
+    if policy not in ('late', 'digest', 'drop'):
+        logger.warning(f"Unknown REMINDER_CATCHUP_POLICY {policy!r}, falling back to 'late'")
+        policy = 'late'
+    
+    oldest_ts = started_ts - REMINDER_CATCHUP_MAX_AGE_SECONDS
+    counts = {'late': 0, 'missed': 0}
+    while True:
+        rows = await DatabaseManager.fetch_query(
+            SQL_OVERDUE_REMINDER_JOBS, (started_ts, started_ts, REMINDER_CATCHUP_BATCH_SIZE)
+        )
+        if not rows:
+            break
+        
+        # 終了済みタスク・古すぎるジョブは送らずにmissedとして記録
+        missed = {
+            row[0] for row in rows
+            if policy == 'drop' or row[6] != 'accepted' or row[1] < oldest_ts
+        }
+        await DatabaseManager.mark_reminder_jobs(list(missed), 'missed', 'bot was offline')
+        counts['missed'] += len(missed)
+        
+        pending = [row for row in rows if row[0] not in missed]
+        counts['late'] += len(pending)
+        if policy == 'late':
+            for row in pending:
+                await send_task_reminder(row[0], late=True)
+        else:
+            # 担当者ごとに1通へまとめる
+            groups: Dict[tuple, list] = {}
+            for row in pending:
+                groups.setdefault((row[2], row[3]), []).append(row)
+            for (guild_id, assignee_id), group in groups.items():
+                guild = bot.get_guild(guild_id)
+                assignee = guild.get_member(assignee_id) if guild else None
+                if not assignee:
+                    await DatabaseManager.mark_reminder_jobs([row[0] for row in group], 'missed', 'guild or member not found')
+                    continue
+                if await defer_for_quiet_hours(guild_id, [row[0] for row in group]):
+                    continue
+                await send_reminder_digest(guild, assignee, group)
+        
+        await asyncio.sleep(REMINDER_CATCHUP_PAUSE_SECONDS)
+    
+    if counts['late'] or counts['missed']:
+        logger.info(f"Reminder catch-up ({policy}): {counts['late']} delivered late, {counts['missed']} marked missed")
+
+# チャンネル管理
+@bot.event
+async def on_guild_channel_create(channel):
+    """新しいチャンネルを次回の検索対象にする"""
+    channel_directory.clear_missing(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """登録済みチャンネルがテキストチャンネルでなくなったら登録解除、名前変更なら探し直す"""
+    if channel_directory.is_registered(after.id) and not isinstance(after, discord.TextChannel):
+        await channel_directory.forget(after.id)
+    elif before.name != after.name:
+        channel_directory.clear_missing(after.guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    """削除されたチャンネルの登録を解除（次回の通知時に作り直すかDMで送る）"""
+    await channel_directory.forget(channel.id)
 
 # 接続管理
 @bot.event
@@ -1776,4 +4922,6 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"Bot crashed: {e}")
         exit(1)
+    finally:
+        db.close()
 
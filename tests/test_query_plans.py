@@ -0,0 +1,38 @@
+"""頻出クエリの実行計画テスト
+
+全マイグレーションを適用した一時データベースで QUERY_PLAN_CHECKS の各クエリを EXPLAIN し、
+インデックスを使わず全件スキャンになったクエリが無いことを確認する。
+
+使い方: python -m pytest tests
+"""
+import sqlite3
+
+import pytest
+
+pytest.importorskip("discord")
+
+import mybot  # noqa: E402
+
+
+@pytest.fixture
+def migrated_conn(tmp_path):
+    """起動時と同じ手順でスキーマを最新バージョンにし、管理対象インデックスを作成したデータベース"""
+    conn = sqlite3.connect(tmp_path / 'query_plans.db')
+    mybot._ensure_migration_tables(conn)
+    conn.commit()
+    for version, description, migrate in mybot.MIGRATIONS:
+        mybot._apply_migration(conn, version, description, migrate)
+        conn.commit()
+    for name in mybot._sync_task_indexes(conn):
+        mybot._create_task_index(conn, name)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_frequent_queries_use_indexes(migrated_conn):
+    assert mybot.find_full_scans(migrated_conn) == []
+
+
+def test_all_task_indexes_created(migrated_conn):
+    assert mybot._sync_task_indexes(migrated_conn) == []